@@ -0,0 +1,39 @@
+# %%
+"""
+Benchmark of the outlier annotation of bar plots, from 100 to 10k bars.
+
+Run with ``python benchmarks/bench_annotate_outliers.py``.
+"""
+import time
+import numpy as np
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+from myfigure.myfigure import _annotate_outliers_to_ax  # noqa: E402
+
+
+def bench_annotate_outliers(n_bars: int, outlier_fraction: float = 0.1, repeat: int = 3) -> float:
+    """
+    Return the best time (s) to annotate the outliers of an axis with n_bars bars.
+    """
+    rng = np.random.default_rng(0)
+    ave = rng.uniform(0, 1, n_bars)
+    outliers = rng.choice(n_bars, int(n_bars * outlier_fraction), replace=False)
+    ave[outliers] = rng.choice([-5.0, 5.0], outliers.size)
+    std = rng.uniform(0, 0.1, n_bars)
+    best = np.inf
+    for _ in range(repeat):
+        fig, ax = plt.subplots()
+        ax.bar(np.arange(n_bars), ave, yerr=std)
+        ax.set_ylim(-1, 2)
+        start = time.perf_counter()
+        _annotate_outliers_to_ax(ax, decimal_places=2)
+        best = min(best, time.perf_counter() - start)
+        plt.close(fig)
+    return best
+
+
+if __name__ == "__main__":
+    for n in [100, 1_000, 10_000]:
+        print(f"{n:>6} bars: {bench_annotate_outliers(n):.3f} s")
@@ -0,0 +1,275 @@
+# %%
+"""
+Benchmark suite of MyFigure: construction, post-data processing and export.
+
+Each case is run for every combination of its parameters (grid size, twinx, number of
+bars/series, points per line, output format), recording the best and median time over the
+repeats and the peak memory allocated during one extra run (measured with tracemalloc).
+
+Run with::
+
+    python benchmarks/run.py                          # print the results
+    python benchmarks/run.py --quick                  # smaller sweep
+    python benchmarks/run.py --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json --tolerance 1.3
+
+With ``--compare`` the results are compared with a stored baseline and the exit code is 1
+if any case is slower (best time) than the baseline by more than the tolerance factor.
+Baselines are only comparable on the same machine and environment, which are stored with
+the results.
+"""
+from __future__ import annotations
+import argparse
+import gc
+import io
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import numpy as np
+import matplotlib
+
+matplotlib.use("Agg")
+import pandas as pd  # noqa: E402
+import seaborn as sns  # noqa: E402
+from myfigure.myfigure import MyFigure  # noqa: E402
+
+
+def case_construct(rows: int, cols: int, twinx: bool) -> Callable[[], None]:
+    """
+    Create a figure with a rows x cols grid of axes, optionally with twin axes.
+    """
+
+    def run() -> None:
+        MyFigure(rows=rows, cols=cols, twinx=twinx, use_pyplot=False, x_lab="x", y_lab="y")
+
+    return run
+
+
+def case_post_data(n_bars: int, n_series: int, twinx: bool) -> Callable[[], None]:
+    """
+    Apply the post-data updates (hatches, outliers, legends) to a grouped bar plot.
+    """
+    rng = np.random.default_rng(0)
+    n_groups = max(n_bars // n_series, 1)
+    ave = pd.DataFrame(rng.uniform(0, 1, (n_groups, n_series)))
+    ave.iloc[0, 0] = 5  # an outlier to annotate
+    std = pd.DataFrame(rng.uniform(0, 0.1, (n_groups, n_series)))
+
+    def run() -> None:
+        myfig = MyFigure(
+            twinx=twinx, use_pyplot=False, y_lim=(0, 2), annotate_outliers=True, legend=False
+        )
+        ave.plot(ax=myfig.axs[0], kind="bar", yerr=std, legend=False)
+        if twinx:
+            myfig.axts[0].plot(np.arange(n_groups), ave.iloc[:, 0].to_numpy())
+        myfig.update_axes_props_post_data()
+
+    return run
+
+
+def case_save(n_points: int, fmt: str, n_lines: int = 4) -> Callable[[], None]:
+    """
+    Save a figure with n_lines lines of n_points points each to one format in memory.
+    """
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 10, n_points)
+    ys = np.cumsum(rng.normal(0, 1, (n_lines, n_points)), axis=1)
+    myfig = MyFigure(use_pyplot=False, x_lab="x", y_lab="y")
+    for y in ys:
+        myfig.axs[0].plot(x, y)
+
+    def run() -> None:
+        myfig.save_figure_to_bytes(fmt, dpi=150)
+
+    return run
+
+
+def case_large_grid(n: int, twinx: bool) -> Callable[[], None]:
+    """
+    Create, plot and save an n x n grid of small multiples in large_grid mode.
+
+    Scaling target: a few seconds for a 20 x 20 grid, not reached: it takes about 10 s
+    (against about 2 min with the default constrained layout), close to the time matplotlib
+    alone needs to create and draw the 400 axes (see case_large_grid_matplotlib). The
+    per-axes updates of MyFigure take about 0.5 s of it.
+    """
+    x = np.linspace(0, 10, 100)
+
+    def run() -> None:
+        myfig = MyFigure(
+            rows=n,
+            cols=n,
+            width=n,
+            height=n,
+            twinx=twinx,
+            large_grid=True,
+            use_pyplot=False,
+            x_lab="x",
+            y_lab="y",
+        )
+        for i, ax in enumerate(myfig.axs):
+            ax.plot(x, np.sin(x + i), label="sin")
+        myfig.save_figure_to_bytes("png", dpi=100)
+
+    return run
+
+
+def case_large_grid_matplotlib(n: int) -> Callable[[], None]:
+    """
+    Create, plot and save an n x n grid with matplotlib only, without layout engine or
+    styling: the floor of case_large_grid.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    x = np.linspace(0, 10, 100)
+
+    def run() -> None:
+        fig = Figure(figsize=(n, n))
+        FigureCanvasAgg(fig)
+        for i, ax in enumerate(fig.subplots(n, n).flat):
+            ax.plot(x, np.sin(x + i), label="sin")
+        fig.savefig(io.BytesIO(), format="png", dpi=100)
+
+    return run
+
+
+# the cases and their parameter sweeps, the --quick sweeps use the first values only
+SUITE: dict[str, tuple[Callable[..., Callable[[], None]], dict[str, list[Any]]]] = {
+    "construct": (case_construct, {"rows": [1, 3, 6], "cols": [1, 3, 6], "twinx": [False, True]}),
+    "post_data": (
+        case_post_data,
+        {"n_bars": [10, 100, 1000], "n_series": [1, 5], "twinx": [False, True]},
+    ),
+    "save": (case_save, {"n_points": [1_000, 100_000], "fmt": ["png", "pdf", "svg", "tif"]}),
+    "large_grid": (case_large_grid, {"n": [5, 10, 20], "twinx": [False, True]}),
+    "large_grid_matplotlib": (case_large_grid_matplotlib, {"n": [5, 10, 20]}),
+}
+QUICK_SIZES = {
+    "rows": 2,
+    "cols": 2,
+    "n_bars": 2,
+    "n_series": 1,
+    "n_points": 1,
+    "fmt": 2,
+    "n": 1,
+}
+
+
+def iter_cases(quick: bool = False, only: list[str] | None = None):
+    """
+    Yield the name, parameters and factory of each case of the suite.
+    """
+    for name, (factory, sweep) in SUITE.items():
+        if only and name not in only:
+            continue
+        if quick:
+            sweep = {k: v[: QUICK_SIZES.get(k, len(v))] for k, v in sweep.items()}
+        for values in itertools.product(*sweep.values()):
+            yield name, dict(zip(sweep, values)), factory
+
+
+def measure(run: Callable[[], None], repeat: int) -> dict[str, float]:
+    """
+    Time run() repeat times (after a warm-up run) and measure its peak memory once.
+    """
+    run()  # warm-up: imports, font and text caches
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"best": min(times), "median": statistics.median(times), "peak_mb": peak / 2**20}
+
+
+def case_id(name: str, params: dict[str, Any]) -> str:
+    """
+    Return a stable identifier of a case, e.g. ``construct[rows=3,cols=1,twinx=True]``.
+    """
+    return f"{name}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+
+
+def environment() -> dict[str, str]:
+    """
+    Return the versions and machine the results were obtained with.
+    """
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "matplotlib": matplotlib.__version__,
+        "seaborn": sns.__version__,
+    }
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> bool:
+    """
+    Print the ratio of each result to the baseline and return True if none is slower
+    than the baseline by more than the tolerance factor.
+    """
+    ok = True
+    for key, result in results.items():
+        if key not in baseline:
+            print(f"{key:<55} not in baseline")
+            continue
+        ratio = result["best"] / baseline[key]["best"]
+        mem_ratio = result["peak_mb"] / max(baseline[key]["peak_mb"], 1e-9)
+        flag = ""
+        if ratio > tolerance:
+            flag = "  SLOWER"
+            ok = False
+        elif ratio < 1 / tolerance:
+            flag = "  faster"
+        print(f"{key:<55} time x{ratio:5.2f}  memory x{mem_ratio:5.2f}{flag}")
+    return ok
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--quick", action="store_true", help="run a smaller sweep")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--only", nargs="*", choices=list(SUITE), help="cases to run")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare the results with this JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, params, factory in iter_cases(args.quick, args.only):
+        key = case_id(name, params)
+        results[key] = measure(factory(**params), args.repeat)
+        r = results[key]
+        print(
+            f"{key:<55} {r['best'] * 1e3:9.2f} ms {r['median'] * 1e3:9.2f} ms "
+            f"{r['peak_mb']:8.2f} MB"
+        )
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored["environment"] != environment():
+            print("warning: the baseline was recorded in a different environment")
+        if not compare(results, stored["results"], args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
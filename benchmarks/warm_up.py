@@ -0,0 +1,78 @@
+# %%
+"""
+Benchmark of myfigure.warm_up on label-heavy multi-panel figures.
+
+The first figure of a process pays for loading the fonts, building the mathtext parser and
+parsing the math labels, so it is measured in fresh processes: each run starts a new Python
+process, optionally calls warm_up, then times the first and the second figure (the second
+shows the steady state). The reported times exclude the interpreter start and the imports.
+
+Run with::
+
+    python benchmarks/warm_up.py --repeat 5
+"""
+from __future__ import annotations
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# a 3 x 3 grid with math in the axis labels, legend title and legend entries
+FIGURE_KWARGS = {
+    "rows": 3,
+    "cols": 3,
+    "x_lab": r"x_lab$\int^1_2 \alpha_{ij}$",
+    "y_lab": r"y_lab$\frac{\partial u}{\partial t}$",
+    "legend_title": r"$\sum_i x_i^2$",
+}
+DPI = 300
+
+_CHILD = """
+import json, sys, time
+import matplotlib
+matplotlib.use("Agg")
+from myfigure.myfigure import MyFigure, warm_up
+
+kwargs, dpi, warm = json.loads(sys.argv[1]), int(sys.argv[2]), sys.argv[3] == "1"
+times = {"warm_up": warm_up(dpi=dpi, **kwargs) if warm else 0.0}
+for name in ("first", "second"):
+    start = time.perf_counter()
+    myfig = MyFigure(use_pyplot=False, **kwargs)
+    for ax in myfig.axs:
+        ax.plot([0, 1], [0, 1], label=r"$\\beta_1$")
+    myfig.save_figure_to_bytes("png", dpi=dpi)
+    times[name] = time.perf_counter() - start
+print(json.dumps(times))
+"""
+
+
+def run_child(warm: bool) -> dict[str, float]:
+    """
+    Time the first and second figure of a fresh process, with or without warm_up.
+    """
+    args = [json.dumps(FIGURE_KWARGS), str(DPI), "1" if warm else "0"]
+    output = subprocess.run(
+        [sys.executable, "-c", _CHILD, *args], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--repeat", type=int, default=3, help="fresh processes per mode")
+    args = parser.parse_args(argv)
+
+    for warm in (False, True):
+        runs = [run_child(warm) for _ in range(args.repeat)]
+        medians = {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+        print(
+            f"{'warm_up' if warm else 'cold':<8} warm_up {medians['warm_up'] * 1e3:8.1f} ms  "
+            f"first figure {medians['first'] * 1e3:8.1f} ms  "
+            f"second figure {medians['second'] * 1e3:8.1f} ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# %%
+import pathlib as plib
+import numpy as np
+import pandas as pd
+from myfigure.batch import render_many
+
+# Define the output path for saving figures
+out_path = plib.Path(__file__).resolve().parent / "output"
+out_path.mkdir(parents=True, exist_ok=True)
+
+# data shared by all the figures, sent once to each worker process
+data = {
+    "x0": np.linspace(0, 10, 10),
+    "y0": np.linspace(0, 10, 10),
+    "y1": np.linspace(15, 5, 10),
+    "df_ave": pd.DataFrame(data=[[1, 2, 3], [6, 5, 4]], columns=["1", "2", "3"]),
+    "df_std": pd.DataFrame(data=[[0.1, 0.2, 0.3], [0.6, 0.5, 0.4]], columns=["1", "2", "3"]),
+}
+# %%
+# one spec per figure: MyFigure kwargs, plotting calls and save_figure kwargs
+specs = []
+for i in range(20):
+    specs.append(
+        {
+            "kwargs": {"filename": f"batch_line_{i}", "out_path": out_path, "twinx": True},
+            "plots": [
+                {"method": "plot", "data": ["x0", "y0"], "kwargs": {"label": "y0"}},
+                {"method": "plot", "twinx": True, "data": ["x0", "y1"], "kwargs": {"label": "y1"}},
+            ],
+        }
+    )
+    specs.append(
+        {
+            "kwargs": {"filename": f"batch_bar_{i}", "out_path": out_path, "y_lim": [0, 5]},
+            "plots": [
+                {
+                    "method": "dataframe",
+                    "data": ["df_ave"],
+                    "data_kwargs": {"yerr": "df_std"},
+                    "kwargs": {"kind": "bar", "capsize": 2},
+                }
+            ],
+            "save": {"save_as_pdf": True},
+        }
+    )
+# %%
+if __name__ == "__main__":  # needed by the worker processes on Windows and macOS
+    results = render_many(specs, data, n_workers=4)
+    for result in results:
+        if not result.ok:
+            print(result.filename, result.error)
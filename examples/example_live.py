@@ -0,0 +1,25 @@
+# %%
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from myfigure.myfigure import MyFigure
+
+# a twinx figure updated in place, only the lines are redrawn at each frame
+myfig = MyFigure(rows=2, twinx=True, x_lab="time", y_lab="signal", yt_lab="noise")
+t = np.linspace(0, 10, 500)
+series = {}
+for i in range(2):
+    series[f"signal{i}"] = myfig.axs[i].plot(t, np.sin(t + i), label="signal")[0]
+    series[f"noise{i}"] = myfig.axts[i].plot(t, np.zeros_like(t), color="r", label="noise")[0]
+plt.show(block=False)
+myfig.start_live(series)
+# %%
+rng = np.random.default_rng(0)
+for frame in range(100):
+    for i in range(2):
+        myfig.update(f"signal{i}", t, np.sin(t + i + frame / 10), redraw=False)
+        myfig.update(f"noise{i}", t, rng.normal(0, 0.1, t.size), redraw=False)
+    myfig.redraw()
+    time.sleep(0.05)
+myfig.stop_live()
+# %%
@@ -0,0 +1,5 @@
+import sys
+
+from myfigure.cli import main
+
+sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+Render many MyFigure specs in parallel on a pool of worker processes.
+
+A spec is a dict describing one figure:
+
+.. code-block:: python
+
+    spec = {
+        "kwargs": {"filename": "f1", "out_path": out_path, "x_lab": "x"},  # MyFigure kwargs
+        "plots": [  # plotting calls, in order
+            {"method": "plot", "ax": 0, "data": ["x0", "y0"], "kwargs": {"label": "y0"}},
+            {"method": "scatter", "ax": 0, "twinx": True, "data": ["x0", "y1"]},
+            {"method": "dataframe", "data": ["df_ave"], "data_kwargs": {"yerr": "df_std"},
+             "kwargs": {"kind": "bar", "capsize": 2}},
+        ],
+        "save": {"save_as_pdf": True},  # save_figure kwargs
+    }
+
+Each plotting call is applied to ``myfig.axs[ax]`` (or ``myfig.axts[ax]`` if ``twinx``).
+The names in ``data`` are looked up in the data mapping and passed as the leading positional
+arguments, followed by the literal ``args``; ``data_kwargs`` are looked up in the same way and
+merged with the literal ``kwargs``. The method ``"dataframe"`` calls ``frame.plot(ax=ax, ...)``
+on the first data entry, as in ``df.plot(ax=myfig.axs[0], kind="bar")``.
+A spec can also provide ``"plot"``, a picklable callable ``plot(myfig, data)`` that is run
+after the ``plots`` calls, ``"data"``, a mapping merged with the shared data, and
+``"bytes"``, a list of formats: the figure is then exported with save_figure_to_bytes (with
+the ``save`` kwargs) and the file contents are returned in the result instead of files.
+
+``"sources"`` maps data names to files that the worker loads before plotting, reading only
+the needed columns: ``{"path": "data.parquet", "column": "t"}`` gives a column (a Series),
+``"columns": [...]`` a DataFrame and no column the whole file. ``.npy`` files are opened as
+memmaps (``"column"`` is then a column index), ``.parquet``, ``.csv``, ``.xlsx`` and ``.xls``
+files are read with pandas, with the optional ``"read_kwargs"``.
+"""
+
+from __future__ import annotations
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Mapping
+
+import numpy as np
+
+# data shared by all the specs rendered by this process, set once per worker
+_worker_data: dict[str, Any] = {}
+
+
+@dataclass
+class RenderResult:
+    """
+    The outcome of rendering one spec.
+
+    :ivar index: Position of the spec in the list passed to render_many.
+    :ivar filename: The filename of the figure, if known.
+    :ivar paths: The saved files.
+    :ivar data: The file content of each format, for specs with ``"bytes"``.
+    :ivar error: The formatted traceback if rendering failed, None otherwise.
+    :ivar duration: Wall time spent on the spec, in seconds.
+    """
+
+    index: int
+    filename: str | None = None
+    paths: list[str] = field(default_factory=list)
+    data: dict[str, bytes] = field(default_factory=dict)
+    error: str | None = None
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """True if the figure was rendered and saved without errors."""
+        return self.error is None
+
+
+def render_many(
+    specs: Iterable[Mapping[str, Any]],
+    data: Mapping[str, Any] | None = None,
+    n_workers: int | None = None,
+    chunksize: int = 1,
+    mp_context: Any = None,
+    warm_up: Mapping[str, Any] | None = None,
+) -> list[RenderResult]:
+    """
+    Render and save many figures across a pool of worker processes.
+
+    Each worker imports matplotlib and myfigure once and receives the shared data once, when
+    it starts. Errors are reported per figure and do not stop the other figures.
+
+    :param specs: The figure specs (see the module documentation).
+    :type specs: Iterable[Mapping[str, Any]]
+    :param data: Named arrays and dataframes that the plotting calls refer to.
+    :type data: Mapping[str, Any] | None
+    :param n_workers: Number of worker processes, defaults to the number of CPUs.
+        With 1 (or 0) the specs are rendered in the current process.
+    :type n_workers: int | None
+    :param chunksize: Number of specs sent to a worker at a time.
+    :type chunksize: int
+    :param mp_context: The multiprocessing context used to start the workers.
+    :type mp_context: Any
+    :param warm_up: Keyword arguments of myfigure.warm_up (the MyFigure kwargs of typical
+        figures and dpi), run once by each worker when it starts, so that fonts and math
+        labels are loaded before the first figure.
+    :type warm_up: Mapping[str, Any] | None
+    :return: One result per spec, in the same order as the specs.
+    :rtype: list[RenderResult]
+    """
+    specs = list(specs)
+    data = dict(data) if data is not None else {}
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = min(n_workers, len(specs))
+    if n_workers <= 1:
+        _init_worker(data, None, warm_up)
+        return [render_spec(i, spec) for i, spec in enumerate(specs)]
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(data, "Agg", warm_up),
+    ) as executor:
+        return list(executor.map(render_spec, range(len(specs)), specs, chunksize=chunksize))
+
+
+def render_spec(index: int, spec: Mapping[str, Any]) -> RenderResult:
+    """
+    Render and save a single spec using the data of the current process.
+
+    :param index: Position of the spec, reported in the result.
+    :type index: int
+    :param spec: The figure spec.
+    :type spec: Mapping[str, Any]
+    :return: The result of the rendering.
+    :rtype: RenderResult
+    """
+    from myfigure.myfigure import MyFigure
+
+    start = time.perf_counter()
+    kwargs = dict(spec.get("kwargs", {}))
+    # the figures are only saved, keep them out of pyplot so that they are freed on close
+    kwargs.setdefault("use_pyplot", False)
+    result = RenderResult(index=index, filename=kwargs.get("filename"))
+    myfig = None
+    try:
+        data = {**_worker_data, **load_sources(spec.get("sources", {})), **spec.get("data", {})}
+        myfig = MyFigure(**kwargs)
+        for call in spec.get("plots", []):
+            _apply_plot_call(myfig, call, data)
+        if spec.get("plot") is not None:
+            spec["plot"](myfig, data)
+        if spec.get("bytes"):
+            images = myfig.save_figure_to_bytes(spec["bytes"], **spec.get("save", {}))
+            result.data = {fmt: bytes(content) for fmt, content in images.items()}
+        else:
+            result.paths = [str(p) for p in myfig.save_figure(**spec.get("save", {}))]
+    except Exception:  # pylint: disable=broad-except
+        result.error = traceback.format_exc()
+    finally:
+        if myfig is not None and getattr(myfig, "fig", None) is not None:
+            myfig.close()
+    result.duration = time.perf_counter() - start
+    return result
+
+
+def load_sources(sources: Mapping[str, Mapping[str, Any]]) -> dict[str, Any]:
+    """
+    Load the data sources of a spec, see the module documentation.
+
+    :param sources: The file, columns and read kwargs of each data name.
+    :type sources: Mapping[str, Mapping[str, Any]]
+    :return: The loaded arrays, Series and DataFrames, by name.
+    :rtype: dict[str, Any]
+    """
+    data = {}
+    for name, source in sources.items():
+        path = str(source["path"])
+        columns = source.get("columns")
+        if source.get("column") is not None:
+            columns = [source["column"]]
+        read_kwargs = dict(source.get("read_kwargs", {}))
+        if path.endswith(".npy"):
+            values = np.load(path, mmap_mode="r")
+            if columns is not None:
+                values = values[:, columns]
+        else:
+            import pandas as pd
+
+            if path.endswith((".parquet", ".pq")):
+                values = pd.read_parquet(path, columns=columns, **read_kwargs)
+            elif path.endswith(".csv"):
+                values = pd.read_csv(path, usecols=columns, **read_kwargs)
+            elif path.endswith((".xlsx", ".xls")):
+                values = pd.read_excel(path, usecols=columns, **read_kwargs)
+            else:
+                raise ValueError(f"Unsupported data source: '{path}'.")
+            if columns is not None:
+                values = values[columns]
+        if source.get("column") is not None:
+            values = values[:, 0] if isinstance(values, np.ndarray) else values.iloc[:, 0]
+        data[name] = values
+    return data
+
+
+def _init_worker(
+    data: Mapping[str, Any],
+    backend: str | None = None,
+    warm_up: Mapping[str, Any] | None = None,
+) -> None:
+    """
+    Warm up a worker: select the backend (if given), import myfigure, store the data and
+    load the fonts and math labels of the figures to come (if warm_up is given).
+    """
+    if backend is not None:
+        import matplotlib
+
+        matplotlib.use(backend)
+    # myfigure imports its heavy dependencies lazily, load them here once per worker
+    import matplotlib.pyplot  # noqa: F401  pylint: disable=unused-import,import-outside-toplevel
+    import seaborn  # noqa: F401  pylint: disable=unused-import,import-outside-toplevel
+    import myfigure.myfigure  # pylint: disable=import-outside-toplevel
+
+    _worker_data.clear()
+    _worker_data.update(data)
+    if warm_up is not None:
+        myfigure.myfigure.warm_up(**warm_up)
+
+
+def _apply_plot_call(myfig: Any, call: Mapping[str, Any], data: Mapping[str, Any]) -> Any:
+    """
+    Apply one plotting call of a spec to the target axis of the figure.
+    """
+    axes = myfig.axts if call.get("twinx", False) else myfig.axs
+    if axes is None:
+        raise ValueError("The plotting call targets twin axes but 'twinx' is not enabled.")
+    ax = axes[call.get("ax", 0)]
+    args = [data[name] for name in call.get("data", [])] + list(call.get("args", []))
+    kwargs = {key: data[name] for key, name in call.get("data_kwargs", {}).items()}
+    kwargs.update(call.get("kwargs", {}))
+    method = call["method"]
+    if method == "dataframe":
+        frame, *args = args
+        return frame.plot(*args, ax=ax, **kwargs)
+    return getattr(ax, method)(*args, **kwargs)
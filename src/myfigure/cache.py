@@ -0,0 +1,383 @@
+"""
+Content-addressed cache of saved figures, to skip figures that did not change.
+
+The key of a figure is a hash of its configuration (the MyFigure kwargs, without filename
+and out_path), of the data and properties of the plotted artists and of the save options.
+When a file with the same key and format is in the cache directory, save_figure copies (or
+links) it to the output path instead of drawing the figure again:
+
+.. code-block:: python
+
+    cache = RenderCache(out_path / ".figure_cache", max_bytes=500 * 2**20)
+    myfig = MyFigure(filename="fig1", out_path=out_path)
+    myfig.axs[0].plot(x, y)
+    myfig.save_figure(cache=cache)  # drawn the first time, copied from the cache afterwards
+    print(cache.hits, cache.misses)
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import pathlib as plib
+import shutil
+import tempfile
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from matplotlib.artist import Artist
+    from matplotlib.axes import Axes
+    from myfigure.myfigure import MyFigure
+
+# change it when the content of the key changes, so that old entries are not reused
+_KEY_VERSION = 2
+
+# artist properties that can change the output, read with the get_<name>() methods
+_ARTIST_PROPS: tuple[str, ...] = (
+    "visible",
+    "zorder",
+    "alpha",
+    "label",
+    "xydata",
+    "offsets",
+    "sizes",
+    "array",
+    "paths",
+    "verts",
+    "color",
+    "facecolor",
+    "edgecolor",
+    "linestyle",
+    "linewidth",
+    "marker",
+    "markersize",
+    "markerfacecolor",
+    "markeredgecolor",
+    "drawstyle",
+    "hatch",
+    "cmap",
+    "clim",
+    "text",
+    "position",
+    "rotation",
+    "fontsize",
+    "fontfamily",
+    "fontweight",
+    "horizontalalignment",
+    "verticalalignment",
+    "rasterized",
+    "clip_on",
+)
+
+# attributes of the formatters that are set when the figure is drawn (from the tick
+# locations), and are not part of their configuration
+_FORMATTER_DRAW_STATE = frozenset(
+    ["locs", "_locs", "offset", "_orderOfMagnitude", "orderOfMagnitude", "_format", "format"]
+    + ["_sublabels", "offset_string"]
+)
+
+
+class RenderCache:
+    """
+    A directory of saved figures, addressed by the hash of their content.
+
+    Files are kept up to max_bytes in total, the least recently used ones are removed first.
+    The total is tracked by each instance, files stored by other processes are counted at
+    the next scan of the directory.
+
+    :ivar directory: The cache directory.
+    :type directory: pathlib.Path
+    :ivar max_bytes: Maximum total size of the cached files.
+    :type max_bytes: int
+    :ivar link: Hard link the cached files to the outputs instead of copying them.
+    :type link: bool
+    :ivar hits: Number of saves served from the cache.
+    :type hits: int
+    :ivar misses: Number of saves that drew the figure.
+    :type misses: int
+    """
+
+    def __init__(
+        self, directory: plib.Path | str, max_bytes: int = 2**30, link: bool = False
+    ) -> None:
+        """
+        Open (or create) a cache directory.
+
+        :param directory: The cache directory.
+        :type directory: pathlib.Path | str
+        :param max_bytes: Maximum total size of the cached files.
+        :type max_bytes: int
+        :param link: Hard link the cached files to the outputs instead of copying them
+            (falls back to copying across file systems). Linked outputs must not be
+            modified in place, or the cached files change too.
+        :type link: bool
+        """
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive.")
+        self.directory = plib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+        # running total of the cached sizes, None until the directory is first scanned
+        self._total_bytes: int | None = None
+
+    def key(self, myfig: MyFigure, **save_options: Any) -> str:
+        """
+        Return the key of a figure saved with the given options.
+
+        :param myfig: The figure, before the post-data updates of save_figure.
+        :type myfig: MyFigure
+        :param save_options: The options of save_figure that change the output.
+        :type save_options: Any
+        :return: The hexadecimal hash of the figure and options.
+        :rtype: str
+        """
+        return figure_key(myfig, **save_options)
+
+    def restore(self, key: str, paths: dict[str, plib.Path]) -> bool:
+        """
+        Copy (or link) the cached files of a key to the output paths, if all are cached.
+
+        :param key: The key of the figure.
+        :type key: str
+        :param paths: The output path of each format.
+        :type paths: dict[str, pathlib.Path]
+        :return: True if all the outputs were restored (a hit), False otherwise.
+        :rtype: bool
+        """
+        cached = {fmt: self._path(key, fmt) for fmt in paths}
+        if not all(path.exists() for path in cached.values()):
+            self.misses += 1
+            return False
+        try:
+            for fmt, path in paths.items():
+                _replace_file(cached[fmt], path, self.link)
+                os.utime(cached[fmt])  # the modification time orders the eviction
+        except FileNotFoundError:  # not cached, or evicted (e.g. by another process)
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key: str, paths: dict[str, plib.Path]) -> None:
+        """
+        Add the saved outputs of a figure to the cache and evict the oldest files if the
+        cache is larger than max_bytes. The directory is only scanned when the running total
+        of the stored sizes exceeds max_bytes (or at the first store), and is then reduced
+        to 3/4 of max_bytes, so that the following stores do not scan it again.
+
+        :param key: The key of the figure.
+        :type key: str
+        :param paths: The saved file of each format.
+        :type paths: dict[str, pathlib.Path]
+        """
+        n_bytes = 0
+        for fmt, path in paths.items():
+            _replace_file(path, self._path(key, fmt), link=False)
+            n_bytes += os.path.getsize(path)
+        if self._total_bytes is not None:
+            self._total_bytes += n_bytes  # overestimated when an entry is replaced
+        if self._total_bytes is None:
+            self.evict()
+        elif self._total_bytes > self.max_bytes:
+            self.evict(self.max_bytes * 3 // 4)
+
+    def evict(self, target_bytes: int | None = None) -> None:
+        """
+        Remove the least recently used files until the cache fits in target_bytes.
+
+        :param target_bytes: The size to reduce the cache to, defaults to max_bytes.
+        :type target_bytes: int | None
+        """
+        if target_bytes is None:
+            target_bytes = self.max_bytes
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total_bytes = total
+
+    def clear(self) -> None:
+        """
+        Remove all the cached files and reset the counters.
+        """
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                os.remove(entry.path)
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = 0
+
+    def _path(self, key: str, fmt: str) -> plib.Path:
+        return self.directory / f"{key}.{fmt}"
+
+
+def figure_key(myfig: MyFigure, **save_options: Any) -> str:
+    """
+    Hash the configuration, the plotted artists and the save options of a figure.
+
+    :param myfig: The figure.
+    :type myfig: MyFigure
+    :param save_options: The options of save_figure that change the output.
+    :type save_options: Any
+    :return: The hexadecimal SHA-256 hash.
+    :rtype: str
+    """
+    import matplotlib
+    from myfigure.myfigure import _kwargs_key
+
+    h = hashlib.sha256()
+    _feed(h, (_KEY_VERSION, matplotlib.__version__))
+    kwargs = {k: v for k, v in myfig.kwargs.items() if k not in ("filename", "out_path")}
+    _feed(h, _kwargs_key(kwargs))
+    _feed(h, _kwargs_key(save_options))
+    fig = myfig.fig
+    _feed(h, (tuple(fig.get_size_inches()), fig.dpi))
+    for artist in [*fig.texts, *fig.legends, *fig.images, *fig.patches, *fig.lines]:
+        _feed_artist(h, artist)
+    for ax in fig.axes:  # includes the twin axes
+        _feed_axes(h, ax)
+    return h.hexdigest()
+
+
+def _feed_axes(h: Any, ax: Axes) -> None:
+    """
+    Add the position, limits, labels, ticks and artists of an axis to the hash.
+    """
+    _feed(h, ("axes", ax.get_xlim(), ax.get_ylim()))
+    if ax.figure.get_layout_engine() is None or not ax.get_in_layout():
+        # otherwise the position is set by the layout engine when the figure is drawn
+        _feed(h, tuple(ax.get_position().bounds))
+    _feed(h, (ax.get_xscale(), ax.get_yscale(), ax.get_title(), ax.get_xlabel(), ax.get_ylabel()))
+    _feed(h, (ax.axison, ax.get_facecolor(), ax.xaxis.get_label_position()))
+    _feed(h, (ax.get_aspect(), ax.get_adjustable(), ax.get_box_aspect(), ax.get_anchor()))
+    for name, spine in ax.spines.items():
+        _feed(h, ("spine", name, spine.get_visible(), spine.get_position(), spine.get_bounds()))
+        _feed(h, (spine.get_edgecolor(), spine.get_linewidth(), spine.get_linestyle()))
+    for axis in (ax.xaxis, ax.yaxis):
+        # tick params (sizes, colors, label sizes, grid lines) are kept as keyword arguments
+        # for the ticks created at draw time
+        _feed(h, sorted(getattr(axis, "_major_tick_kw", {}).items()))
+        _feed(h, sorted(getattr(axis, "_minor_tick_kw", {}).items()))
+        _feed(h, (axis.get_ticks_position(), axis.get_inverted()))
+        for ticker in (
+            axis.get_major_locator(),
+            axis.get_major_formatter(),
+            axis.get_minor_locator(),
+            axis.get_minor_formatter(),
+        ):
+            _feed_state(h, ticker)
+    artists = [*ax.lines, *ax.collections, *ax.patches, *ax.texts, *ax.images, *ax.tables]
+    artists += list(ax.artists)
+    if ax.get_legend() is not None:
+        artists.append(ax.get_legend())
+    for artist in artists:
+        _feed_artist(h, artist)
+    for child in ax.child_axes:
+        _feed_axes(h, child)
+
+
+def _feed_artist(h: Any, artist: Artist) -> None:
+    """
+    Add the type and the output-changing properties of an artist to the hash.
+    """
+    _feed(h, type(artist).__name__)
+    for prop in _ARTIST_PROPS:
+        getter = getattr(artist, f"get_{prop}", None)
+        if getter is None:
+            continue
+        try:
+            value = getter()
+        except Exception:  # pylint: disable=broad-except
+            continue  # e.g. properties that need a renderer
+        _feed(h, (prop, value))
+    if hasattr(artist, "get_texts"):  # legends
+        for text in artist.get_texts():
+            _feed_artist(h, text)
+
+
+def _feed_state(h: Any, obj: Any, depth: int = 0) -> None:
+    """
+    Add the type and the attributes of an object (e.g. a locator or formatter) to the hash,
+    recursing into the attributes that are plain objects.
+    """
+    from matplotlib.artist import Artist
+    from matplotlib.ticker import Formatter
+
+    skipped = _FORMATTER_DRAW_STATE if isinstance(obj, Formatter) else ()
+    _feed(h, type(obj).__name__)
+    for name, value in sorted(vars(obj).items()):
+        if name in skipped or isinstance(value, Artist):  # e.g. the axis of the ticker
+            continue
+        if name == "ndivs" and value is None and getattr(obj, "axis", None) is not None:
+            # AutoMinorLocator reads its default from the rcParams when first called
+            import matplotlib
+
+            value = matplotlib.rcParams[f"{obj.axis.axis_name}tick.minor.ndivs"]
+        _feed(h, name)
+        if hasattr(value, "__dict__") and not callable(value) and depth < 2:
+            _feed_state(h, value, depth + 1)
+        else:
+            _feed(h, value)
+
+
+def _feed(h: Any, value: Any) -> None:
+    """
+    Add a value to the hash, arrays by content and other values by their repr.
+    """
+    if isinstance(value, (list, tuple)):
+        h.update(b"(")
+        for item in value:
+            _feed(h, item)
+        h.update(b")")
+    elif isinstance(value, np.ndarray) or hasattr(value, "vertices"):
+        if hasattr(value, "vertices"):  # matplotlib paths
+            _feed(h, (value.vertices, value.codes))
+            return
+        array = np.ascontiguousarray(np.ma.filled(value, np.nan) if np.ma.isMA(value) else value)
+        h.update(f"{array.dtype.str}{array.shape}".encode())
+        if array.dtype.kind == "O":
+            h.update(repr(array.tolist()).encode())
+        else:
+            h.update(array.tobytes())
+    elif hasattr(value, "name") and hasattr(value, "N"):  # colormaps
+        h.update(f"cmap:{value.name}".encode())
+    else:
+        h.update(repr(value).encode())
+        h.update(b";")
+
+
+def _replace_file(source: plib.Path, target: plib.Path, link: bool) -> None:
+    """
+    Atomically replace target with a copy (or a hard link) of source.
+    """
+    target = plib.Path(target)
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".", suffix=target.suffix)
+    os.close(fd)
+    try:
+        if link:
+            os.remove(tmp)
+            try:
+                os.link(source, tmp)
+            except OSError:
+                shutil.copyfile(source, tmp)
+        else:
+            shutil.copyfile(source, tmp)
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
@@ -0,0 +1,255 @@
+"""
+The ``myfigure`` command: render declarative spec files in parallel.
+
+A spec file (JSON or TOML) describes one figure with the keys of the myfigure.batch specs,
+``kwargs`` (MyFigure kwargs), ``sources`` (data files), ``plots`` (plotting calls) and
+``save`` (save_figure kwargs), or several figures in a ``figures`` list, whose entries are
+merged with the keys given at the top level:
+
+.. code-block:: toml
+
+    # fig_temperature.toml
+    [kwargs]
+    x_lab = "time [s]"
+    y_lab = "T [°C]"
+
+    [sources.t]
+    path = "run1.parquet"
+    column = "time"
+
+    [sources.temp]
+    path = "run1.parquet"
+    column = "temperature"
+
+    [[plots]]
+    method = "plot"
+    data = ["t", "temp"]
+    kwargs = { label = "run 1" }
+
+    [save]
+    save_as_pdf = true
+
+.. code-block:: bash
+
+    myfigure render figures/*.toml -j 8
+
+Relative source paths and ``out_path`` (in ``kwargs`` or ``save``) are relative to the spec
+file, not to the working directory; ``out_path`` defaults to the directory of the spec file
+and ``filename`` to its name (with the index of the figure for files with several figures).
+Figures whose outputs are newer than their spec file and data sources are skipped, unless
+``--force`` is given. The command prints the time of each figure and a summary, and exits
+with status 1 if any figure failed.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import pathlib as plib
+import sys
+import time
+from typing import Any, Sequence
+
+from myfigure.batch import RenderResult, render_many
+
+# the save_figure formats and whether they are saved by default
+_SAVE_FORMATS: dict[str, bool] = {
+    "png": True,
+    "pdf": False,
+    "svg": False,
+    "eps": False,
+    "tif": False,
+}
+
+# spec keys holding mappings, merged key by key with the top level of the file
+_MERGED_KEYS = ("kwargs", "sources", "save")
+
+
+def read_spec_file(path: plib.Path | str) -> list[dict[str, Any]]:
+    """
+    Read a spec file and return its figure specs, with the paths resolved and the filename
+    and out_path defaults applied.
+
+    :param path: A .json or .toml spec file.
+    :type path: pathlib.Path | str
+    :raises ValueError: If the file is not JSON or TOML, or a spec is not a table.
+    :return: The specs, ready for myfigure.batch.render_many.
+    :rtype: list[dict[str, Any]]
+    """
+    path = plib.Path(path)
+    if path.suffix == ".json":
+        with open(path, encoding="utf-8") as file:
+            document = json.load(file)
+    elif path.suffix == ".toml":
+        document = _load_toml(path)
+    else:
+        raise ValueError(f"Spec files must be .json or .toml, got '{path}'.")
+    if not isinstance(document, dict):
+        raise ValueError(f"The spec file '{path}' must contain a table.")
+
+    figures = document.pop("figures", None)
+    if figures is None:
+        entries = [({}, path.stem)]
+    else:
+        entries = [(figure, f"{path.stem}_{i}") for i, figure in enumerate(figures)]
+    specs = []
+    for figure, default_name in entries:
+        if not isinstance(figure, dict):
+            raise ValueError(f"The figures of '{path}' must be tables.")
+        spec = {**document, **figure}
+        for key in _MERGED_KEYS:
+            spec[key] = {**document.get(key, {}), **figure.get(key, {})}
+        kwargs = spec["kwargs"]
+        kwargs.setdefault("filename", default_name)
+        kwargs["out_path"] = path.parent / kwargs.get("out_path", ".")
+        if "out_path" in spec["save"]:
+            spec["save"]["out_path"] = path.parent / spec["save"]["out_path"]
+        spec["sources"] = {
+            name: {**source, "path": path.parent / source["path"]}
+            for name, source in spec["sources"].items()
+        }
+        specs.append(spec)
+    return specs
+
+
+def spec_outputs(spec: dict[str, Any]) -> list[plib.Path]:
+    """
+    Return the files that save_figure writes for a spec.
+
+    :param spec: A spec returned by read_spec_file.
+    :type spec: dict[str, Any]
+    :return: The output paths.
+    :rtype: list[pathlib.Path]
+    """
+    kwargs, save = spec["kwargs"], spec["save"]
+    filename = save.get("filename", kwargs["filename"])
+    out_path = plib.Path(save.get("out_path", kwargs["out_path"]))
+    return [
+        out_path / f"{filename}.{fmt}"
+        for fmt, default in _SAVE_FORMATS.items()
+        if save.get(f"save_as_{fmt}", default)
+    ]
+
+
+def is_up_to_date(spec: dict[str, Any], spec_path: plib.Path | str) -> bool:
+    """
+    Return True if all the outputs of a spec exist and are newer than the spec file and
+    the data sources of the spec.
+
+    :param spec: A spec returned by read_spec_file.
+    :type spec: dict[str, Any]
+    :param spec_path: The spec file.
+    :type spec_path: pathlib.Path | str
+    :return: True if the spec does not need to be rendered again.
+    :rtype: bool
+    """
+    inputs = [plib.Path(spec_path), *(plib.Path(s["path"]) for s in spec["sources"].values())]
+    try:
+        newest_input = max(os.stat(p).st_mtime for p in inputs)
+        oldest_output = min(os.stat(p).st_mtime for p in spec_outputs(spec))
+    except (FileNotFoundError, ValueError):
+        return False
+    return oldest_output >= newest_input
+
+
+def render(
+    spec_paths: Sequence[plib.Path | str],
+    n_workers: int | None = None,
+    force: bool = False,
+    quiet: bool = False,
+) -> int:
+    """
+    Render the figures of spec files that are not up to date and print a timing summary.
+
+    :param spec_paths: The spec files.
+    :type spec_paths: Sequence[pathlib.Path | str]
+    :param n_workers: Number of worker processes, defaults to the number of CPUs.
+    :type n_workers: int | None
+    :param force: Render all the figures, even those that are up to date.
+    :type force: bool
+    :param quiet: Only print the summary and the errors.
+    :type quiet: bool
+    :return: The exit status, 1 if a spec file could not be read or a figure failed.
+    :rtype: int
+    """
+    start = time.perf_counter()
+    status = 0
+    specs, n_up_to_date = [], 0
+    for spec_path in spec_paths:
+        try:
+            file_specs = read_spec_file(spec_path)
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            print(f"error    {spec_path}: {type(error).__name__}: {error}", file=sys.stderr)
+            status = 1
+            continue
+        for spec in file_specs:
+            if not force and is_up_to_date(spec, spec_path):
+                n_up_to_date += 1
+                if not quiet:
+                    print(f"skipped  {spec['kwargs']['filename']} (up to date)")
+                continue
+            for output in spec_outputs(spec):
+                output.parent.mkdir(parents=True, exist_ok=True)
+            specs.append(spec)
+
+    results: list[RenderResult] = render_many(specs, n_workers=n_workers) if specs else []
+    for result in results:
+        if not result.ok:
+            status = 1
+            print(f"failed   {result.filename} ({result.duration:.2f} s)", file=sys.stderr)
+            print(result.error, file=sys.stderr)
+        elif not quiet:
+            print(f"rendered {result.filename} ({result.duration:.2f} s)")
+    n_failed = sum(not result.ok for result in results)
+    busy = sum(result.duration for result in results)
+    print(
+        f"{len(results) - n_failed} rendered, {n_up_to_date} up to date, {n_failed} failed "
+        f"in {time.perf_counter() - start:.2f} s (figures {busy:.2f} s)"
+    )
+    return status
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="myfigure", description="myfigure command line.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    render_parser = commands.add_parser("render", help="render JSON or TOML spec files")
+    render_parser.add_argument("specs", nargs="+", help="spec files")
+    render_parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="worker processes (default: CPUs)"
+    )
+    render_parser.add_argument(
+        "-f", "--force", action="store_true", help="render figures that are up to date"
+    )
+    render_parser.add_argument(
+        "-q", "--quiet", action="store_true", help="only print the summary and errors"
+    )
+    serve_parser = commands.add_parser(
+        "serve", help="run a render server, see python -m myfigure.server --help"
+    )
+    serve_parser.add_argument("server_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        from myfigure.server import main as serve
+
+        return serve(args.server_args)
+    return render(args.specs, n_workers=args.jobs, force=args.force, quiet=args.quiet)
+
+
+def _load_toml(path: plib.Path) -> dict[str, Any]:
+    """
+    Read a TOML file with tomllib (Python 3.11+) or, on older Pythons, tomli.
+    """
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError as error:
+            raise ValueError("Reading TOML spec files requires Python 3.11+ or tomli.") from error
+    with open(path, "rb") as file:
+        return tomllib.load(file)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,42 @@
 from __future__ import annotations
 import string
+import time
+import functools
+import numbers
+import threading
+import weakref
 import pathlib as plib
-from typing import Any, Dict
+from collections import OrderedDict
+from types import MappingProxyType
+from contextlib import ExitStack, contextmanager, nullcontext
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    Mapping,
+)
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from matplotlib.figure import Figure
-from matplotlib.axes import Axes
-from matplotlib.transforms import blended_transform_factory
-from matplotlib.collections import LineCollection
-import seaborn as sns
-import pandas as pd
+
+# matplotlib, seaborn and pandas are imported where they are needed, so that importing
+# this module (e.g. only for colors, linestyles or markers) stays cheap
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from matplotlib.artist import Artist
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
+    from matplotlib.transforms import Bbox
+    from myfigure.cache import RenderCache
 
 
 letters: list[str] = list(string.ascii_lowercase)
 
-# list with colors
-colors: list[tuple] = sns.color_palette("deep", 30)
+# list with colors (module attribute "colors", computed with seaborn on first access)
+_lazy_attributes = {"colors": lambda: _import_seaborn().color_palette("deep", 30)}
 
 # list with linestyles for plotting
 linestyles: list[tuple] = [
@@ -120,6 +140,59 @@ hatches: list[str] = [
     ".....",
 ]
 
+# formats that are encoded from the Agg RGBA buffer (value is the PIL format name)
+_RASTER_FORMATS: dict[str, str] = {"png": "png", "tif": "tiff"}
+
+# the tif_compression options of the saves, and the corresponding PIL compressions
+_TIF_COMPRESSIONS: dict[str | None, str] = {
+    None: "raw",
+    "lzw": "tiff_lzw",
+    "deflate": "tiff_adobe_deflate",
+    "packbits": "packbits",
+}
+
+# background saves of save_figure_async: the thread pool (created on first use), the slots
+# bounding the number of pending saves and the saves not yet written
+_save_executor: ThreadPoolExecutor | None = None
+_save_max_workers = 2
+_save_slots = threading.BoundedSemaphore(8)
+_pending_saves: set[Future] = set()
+_pending_saves_lock = threading.Lock()
+
+# functions called with the measurements of the figures that collect stats (add_stats_hook)
+_stats_hooks: list[Callable[[MyFigure, str, float], None]] = []
+# stage context used when a figure does not collect stats
+_NO_STAGE = nullcontext()
+
+
+def _styled(method: Callable) -> Callable:
+    """
+    Run a MyFigure method inside the style context of the figure.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: MyFigure, *args: Any, **kwargs: Any) -> Any:
+        with self.style_context():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _timed(method: Callable) -> Callable:
+    """
+    Record the wall time of a MyFigure method as a stage, if the figure collects stats.
+    """
+    stage = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self: MyFigure, *args: Any, **kwargs: Any) -> Any:
+        if self.stats is None:
+            return method(self, *args, **kwargs)
+        with _StageTimer(self, stage):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
 
 class MyFigure:
     """
@@ -137,33 +210,139 @@ class MyFigure:
     :type axts: list[matplotlib.axes.Axes] or None
     :ivar n_axs: Number of axes/subplots.
     :type n_axs: int
+    :ivar stats: Timings and counters of the figure if collect_stats is True, else None.
+    :type stats: FigureStats or None
+
+    With use_pyplot=False the figure is not registered with pyplot and is drawn on its own
+    Agg canvas, so it is freed as soon as it is closed (or no longer referenced). MyFigure
+    can be used as a context manager that closes the figure on exit:
+
+    .. code-block:: python
+
+        with MyFigure(filename="f", out_path=out_path, use_pyplot=False) as myfig:
+            myfig.axs[0].plot(x, y)
+            myfig.save_figure()
+
+    With the default scoped_style=False, creating a figure also applies its style to the
+    global rcParams, so that what is plotted afterwards gets it. This is not thread-safe when
+    threads make figures with different styles: use scoped_style=True and style_context()
+    there.
     """
 
-    def __init__(self, **kwargs: Any) -> None:
+    def __init__(self, spec: FigureSpec | None = None, **kwargs: Any) -> None:
         """
         Initialize a MyFigure object with optional configuration.
 
+        :param spec: A precompiled configuration, validated and broadcasted once for all the
+            figures made from it. filename and out_path can still be given as kwargs,
+            other kwargs give a new spec with these options replaced.
+        :type spec: FigureSpec | None
         :param kwargs: Configuration options as keyword arguments.
         :type kwargs: Any
         """
 
+        self.fig: Figure | None = None
         self.axs: list[Axes] | None = None
         self.axts: list[Axes] | None = None
-        self.kwargs = self.default_kwargs()
-        self.kwargs.update(kwargs)  # Override defaults with any kwargs provided
-        self.process_kwargs()
+        self._bar_indexes: dict[Axes, _BarIndex] = {}
+        # the FigurePool that handed out the figure and its key in that pool
+        self._pool_owner: tuple[FigurePool, Hashable] | None = None
+        # live mode: the updated artists, the cached background and the draw_event handler
+        self._live_series: dict[Hashable, Artist] = {}
+        self._live_background: Any = None
+        self._live_cid: int | None = None
+        self._live_canvas: Any = None
+        broad_props = None
+        if spec is not None:
+            file_kwargs = {k: kwargs.pop(k) for k in ("filename", "out_path") if k in kwargs}
+            if kwargs:
+                spec = spec.replace(**kwargs)
+            _process_file_kwargs(file_kwargs)
+            self.kwargs = {**spec.kwargs, **file_kwargs}
+            broad_props = dict(spec.broad_props)
+            self._style_rc = spec.style_rc
+        else:
+            defaults = self.default_kwargs()
+            self.kwargs = {**defaults, **kwargs}  # Override defaults with any kwargs provided
+            self.process_kwargs(defaults.keys())
+            # the style is applied only while the figure is created, updated and saved
+            self._style_rc = _get_style_rc(
+                self.kwargs["color_palette"],
+                self.kwargs["color_palette_n_colors"],
+                self.kwargs["sns_style"],
+                self.kwargs["text_font"],
+                self.kwargs["text_font_size"],
+            )
+        self.stats: FigureStats | None = FigureStats() if self.kwargs["collect_stats"] else None
+        with self.style_context():
+            self.create_figure()
+            if self.stats is not None:
+                # the callbacks belong to the figure, draws for any output format are counted
+                self.fig.canvas.mpl_connect("draw_event", self._count_draw)
+
+            if broad_props is None:
+                broad_props = self.broadcast_all_kwargs()
+            self.broad_props = broad_props  # broadcasted properties for each axis
+
+            self.update_axes_props_pre_data()
+            # state of the axes before any data is plotted, restored by reset()
+            self._pre_data_axes_state = [_get_axes_state(ax) for ax in self._all_axes()]
+        if not self.kwargs["scoped_style"]:
+            # keep the style for what is plotted afterwards (e.g. pandas reads the palette
+            # from the global rcParams), use scoped_style=True to leave them untouched
+            _STYLE_GATE.update_globals(self._style_rc)
+
+    def __enter__(self) -> MyFigure:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close the figure and release its memory.
 
-        self.create_figure()
+        The figure is removed from pyplot (if it was created with it) and the references to
+        the figure and its axes are dropped. Calling close() again has no effect.
+        """
+        if self.fig is None:
+            return
+        self.stop_live()
+        if self.kwargs["use_pyplot"]:
+            import matplotlib.pyplot as plt
+
+            plt.close(self.fig)
+        self.fig.clear()
+        self.fig = None
+        self.axs = []
+        self.axts = None
+        self._bar_indexes.clear()
+        self._pre_data_axes_state = []
+
+    @contextmanager
+    def style_context(self) -> Iterator[None]:
+        """
+        Apply the style of the figure (palette, seaborn style, font and font size) to
+        matplotlib inside the context, without changing the global style.
 
-        self.broad_props = self.broadcast_all_kwargs()  # broadcasted properties for each axis
+        Creating, updating and saving the figure already use it. With scoped_style=True
+        the global style is not changed, so use it when plotting to give the same style to
+        the plotted artists (e.g. when figures are made from several threads).
 
-        sns.set_palette(self.kwargs["color_palette"], self.kwargs["color_palette_n_colors"])
-        sns.set_style(self.kwargs["sns_style"], {"font.family": self.kwargs["text_font"]})
-        plt.rcParams.update({"font.size": self.kwargs["text_font_size"]})
+        The style is applied to the global rcParams, so the threads whose figures have the
+        same style run their contexts together, while a thread with another style waits for
+        them to end.
 
-        self.update_axes_props_pre_data()
+        .. code-block:: python
+
+            with myfig.style_context():
+                df.plot(ax=myfig.axs[0], kind="bar")
+        """
+        with _STYLE_GATE.applied(self._style_rc):
+            yield
 
-    def default_kwargs(self) -> Dict[str, Any]:
+    @staticmethod
+    def default_kwargs() -> Dict[str, Any]:
         """
         Define default keyword arguments for the figure.
 
@@ -215,83 +394,40 @@ class MyFigure:
             "annotate_outliers_decimal_places": 2,
             "mask_insignificant_data": False,
             "mask_insignificant_data_alpha": 0.3,
+            "decimate_lines": False,
+            "rasterize_threshold": None,
+            "scoped_style": False,
+            "use_pyplot": True,
+            "collect_stats": False,
+            "large_grid": False,
         }
         return defaults
 
-    def process_kwargs(self) -> None:
+    def process_kwargs(self, valid_kwargs: Iterable[str] | None = None) -> None:
         """
         Process and validate keyword arguments.
 
         Raises a ValueError if an invalid keyword argument is provided.
+
+        :param valid_kwargs: The valid keyword arguments, defaults to those in
+            default_kwargs().
+        :type valid_kwargs: Iterable[str] | None
+        """
+        if valid_kwargs is None:
+            valid_kwargs = self.default_kwargs().keys()
+        _process_kwargs(self.kwargs, valid_kwargs)
+
+    def broadcast_all_kwargs(self) -> dict[str, list]:
+        """
+        Broadcast the per-axis properties to one value per axis.
+
+        :return: The broadcasted properties.
+        :rtype: dict[str, list]
         """
-        valid_kwargs = set(self.default_kwargs().keys())
-
-        # Check for any invalid keyword arguments
-        for kwarg in self.kwargs:
-            if kwarg not in valid_kwargs:
-                raise ValueError(f"Invalid keyword argument: '{kwarg}' \n {valid_kwargs = }")
-
-        if self.kwargs["out_path"] is not None:
-            self.kwargs["out_path"] = plib.Path(self.kwargs["out_path"])
-
-        if self.kwargs["filename"] is not None:
-            if not isinstance(self.kwargs["filename"], str):
-                raise ValueError("filename must be a str.")
-
-        self.kwargs["rows"] = int(self.kwargs["rows"])
-        self.kwargs["cols"] = int(self.kwargs["cols"])
-        self.kwargs["width"] = float(self.kwargs["width"])
-        self.kwargs["height"] = float(self.kwargs["height"])
-        self.kwargs["legend_ncols"] = int(self.kwargs["legend_ncols"])
-
-        if self.kwargs["rows"] <= 0:
-            raise ValueError("Number of rows must be positive.")
-        if self.kwargs["cols"] <= 0:
-            raise ValueError("Number of cols must be positive.")
-        if self.kwargs["width"] <= 0:
-            raise ValueError("Width must be positive.")
-        if self.kwargs["height"] <= 0:
-            raise ValueError("Height must be positive.")
-        if self.kwargs["legend_ncols"] <= 0:
-            raise ValueError("Number of legend columns must be positive.")
-
-    def broadcast_all_kwargs(self) -> None:
-        """ """
-        broad_props: dict[str, list] = {}
-        # single props (one value per axis)
-        for sprop in [
-            "x_lab",
-            "y_lab",
-            "yt_lab",
-            "grid",
-            "x_ticklabels_rotation",
-            "legend",
-            "legend_loc",
-            "legend_ncols",
-            "legend_title",
-            "annotate_outliers",
-            "annotate_outliers_decimal_places",
-            "annotate_letters",
-            "mask_insignificant_data",
-        ]:
-            broad_props[sprop] = _broadcast_value_prop(self.kwargs[sprop], sprop, self.n_axs)
-        # list props (a list per axis)
-        for lprop in [
-            "x_lim",
-            "y_lim",
-            "yt_lim",
-            "x_ticks",
-            "y_ticks",
-            "yt_ticks",
-            "x_ticklabels",
-            "y_ticklabels",
-            "yt_ticklabels",
-            "legend_bbox_xy",
-            "annotate_letters_xy",
-        ]:
-            broad_props[lprop] = _broadcast_list_prop(self.kwargs[lprop], lprop, self.n_axs)
-        return broad_props
+        return _broadcast_kwargs(self.kwargs, self.n_axs)
 
+    @_timed
+    @_styled
     def update_axes_props_pre_data(self) -> None:
         """
         Update properties that are applied to each axis individually.
@@ -329,6 +465,8 @@ class MyFigure:
                 if self.broad_props["yt_ticklabels"][i] is not None:
                     axt.set_yticklabels(self.broad_props["yt_ticklabels"][i])
 
+    @_timed
+    @_styled
     def create_figure(self) -> MyFigure:
         """
         Creates the figure and its axes.
@@ -339,29 +477,56 @@ class MyFigure:
         self.fig: Figure
         self.axs: Axes
         self.axts: Axes | None = None
-        self.fig, axes = plt.subplots(
-            self.kwargs["rows"],
-            self.kwargs["cols"],
-            figsize=(self.kwargs["width"], self.kwargs["height"]),
-            constrained_layout=True,
-        )
+        figsize = (self.kwargs["width"], self.kwargs["height"])
+        large_grid = self.kwargs["large_grid"]
+        # a large grid uses fixed margins instead of constrained_layout
+        layout = None if large_grid else "constrained"
+        if self.kwargs["use_pyplot"]:
+            import matplotlib.pyplot as plt
+
+            self.fig, axes = plt.subplots(
+                self.kwargs["rows"],
+                self.kwargs["cols"],
+                figsize=figsize,
+                layout=layout,
+            )
+        else:
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from matplotlib.figure import Figure
+
+            self.fig = Figure(figsize=figsize, layout=layout)
+            FigureCanvasAgg(self.fig)
+            axes = self.fig.subplots(self.kwargs["rows"], self.kwargs["cols"], squeeze=False)
         # Ensure ax is always an array, even if it's just one subplot
         self.axs: list[Axes] = np.atleast_1d(axes).flatten().tolist()
         if self.kwargs["twinx"]:
             self.axts: list[Axes] = [a.twinx() for a in self.axs]
+        if large_grid:
+            self._set_fixed_grid_layout()
+        for ax in self._all_axes():
+            _create_first_ticks(ax)
 
         self.n_axs = len(self.axs)
         return self
 
+    @_timed
+    @_styled
     def update_axes_props_post_data(self) -> None:
+        # in a large grid only the bottom row shows the x tick labels, if the x limits are shared
+        x_outer = self.kwargs["large_grid"] and _limits_shared(self.axs, "x")
         for i, ax in enumerate(self.axs):
+            bar_index = self._get_bar_index(ax, i)
             if self.kwargs["auto_apply_hatches_to_bars"]:
-                _apply_hatch_patterns_to_ax(ax)
+                with self._stage("hatches"):
+                    _apply_hatch_patterns_to_ax(ax, bar_index)
             if self.broad_props["annotate_outliers"][i]:
-                _annotate_outliers_to_ax(
-                    ax, self.broad_props["annotate_outliers_decimal_places"][i]
-                )
-            if self.broad_props["x_ticklabels_rotation"][i] is not None:
+                with self._stage("outliers"):
+                    _annotate_outliers_to_ax(
+                        ax, self.broad_props["annotate_outliers_decimal_places"][i], bar_index
+                    )
+            if self.broad_props["x_ticklabels_rotation"][i] is not None and (
+                not x_outer or ax.get_subplotspec().is_last_row()
+            ):
                 _rotate_x_labels_ax(ax, self.broad_props["x_ticklabels_rotation"][i])
             if self.broad_props["annotate_letters"][i]:
                 _annotate_letters_to_ax(
@@ -371,42 +536,59 @@ class MyFigure:
                     font_size=self.kwargs["annotate_letters_font_size"],
                 )
             if self.broad_props["mask_insignificant_data"][i]:
-                _mask_insignificant_data_in_ax(
-                    ax, alpha=self.kwargs["mask_insignificant_data_alpha"]
-                )
+                with self._stage("mask"):
+                    _mask_insignificant_data_in_ax(
+                        ax, alpha=self.kwargs["mask_insignificant_data_alpha"], bar_index=bar_index
+                    )
 
         if self.kwargs["twinx"]:
             for i, axt in enumerate(self.axts):
+                bar_index = self._get_bar_index(axt, i)
                 if self.kwargs["auto_apply_hatches_to_bars"]:
-                    _apply_hatch_patterns_to_ax(axt)
+                    with self._stage("hatches"):
+                        _apply_hatch_patterns_to_ax(axt, bar_index)
                 if self.broad_props["annotate_outliers"][i]:
-                    _annotate_outliers_to_ax(
-                        axt, self.broad_props["annotate_outliers_decimal_places"][i]
-                    )
+                    with self._stage("outliers"):
+                        _annotate_outliers_to_ax(
+                            axt, self.broad_props["annotate_outliers_decimal_places"][i], bar_index
+                        )
                 if self.broad_props["mask_insignificant_data"][i]:
-                    _mask_insignificant_data_in_ax(
-                        axt, alpha=self.kwargs["mask_insignificant_data_alpha"]
-                    )
-
+                    with self._stage("mask"):
+                        _mask_insignificant_data_in_ax(
+                            axt,
+                            alpha=self.kwargs["mask_insignificant_data_alpha"],
+                            bar_index=bar_index,
+                        )
+
+        if self.kwargs["large_grid"]:
+            with self._stage("share_limits"):
+                self._share_grid_axes()
+            if self.broad_props["legend"][0]:
+                with self._stage("legend"):
+                    self._add_figure_legend()
+            return
         for i, ax in enumerate(self.axs):
             if self.kwargs["twinx"]:
                 axt = self.axts[i]
             else:
                 axt = None
             if self.broad_props["legend"][i]:
-                _add_legend_to_ax(
-                    ax,
-                    axt,
-                    loc=self.broad_props["legend_loc"][i],
-                    ncol=self.broad_props["legend_ncols"][i],
-                    title=self.broad_props["legend_title"][i],
-                    bbox_xy=self.broad_props["legend_bbox_xy"][i],
-                    font_size=self.kwargs["legend_font_size"],
-                    borderpad=self.kwargs["legend_borderpad"],
-                    handlelength=self.kwargs["legend_handlelength"],
-                    masked_values=self.broad_props["mask_insignificant_data"][i],
-                )
+                with self._stage("legend"):
+                    _add_legend_to_ax(
+                        ax,
+                        axt,
+                        loc=self.broad_props["legend_loc"][i],
+                        ncol=self.broad_props["legend_ncols"][i],
+                        title=self.broad_props["legend_title"][i],
+                        bbox_xy=self.broad_props["legend_bbox_xy"][i],
+                        font_size=self.kwargs["legend_font_size"],
+                        borderpad=self.kwargs["legend_borderpad"],
+                        handlelength=self.kwargs["legend_handlelength"],
+                        masked_values=self.broad_props["mask_insignificant_data"][i],
+                    )
 
+    @_timed
+    @_styled
     def save_figure(
         self,
         filename: str | None = None,
@@ -420,7 +602,14 @@ class MyFigure:
         png_transparency: bool = False,
         dpi: int = 300,
         update_all_axis_props: bool = True,
-    ) -> None:
+        single_draw: bool = False,
+        close: bool = False,
+        cache: RenderCache | None = None,
+        png_compress_level: int = 6,
+        tif_compression: str | None = None,
+        quantize_colors: int | None = None,
+        encode_workers: int = 1,
+    ) -> list[plib.Path]:
         """
         Save the figure to a file.
 
@@ -440,11 +629,149 @@ class MyFigure:
         :type save_as_eps: bool
         :param png_transparency: PNG transparency.
         :type png_transparency: bool
+        :param single_draw: Lay out and draw the figure only once for all the formats,
+            PNG and TIF are encoded from the same RGBA buffer. With tight_layout, the raster
+            outputs are cropped from the full drawing: they have the size and placement of
+            the savefig ones, but the antialiased edges can differ slightly, as savefig draws
+            the cropped figure with a sub-pixel offset.
+        :type single_draw: bool
+        :param close: Close the figure after saving it, to release its memory.
+        :type close: bool
+        :param cache: A render cache: if the figure, its data and the save options did not
+            change since they were last saved with this cache, the cached files are copied to
+            the outputs and the figure is not drawn (nor are the post-data updates applied).
+        :type cache: RenderCache | None
+        :param png_compress_level: zlib compression level of PNG images, from 0 (fastest,
+            largest) to 9 (slowest, smallest).
+        :type png_compress_level: int
+        :param tif_compression: Compression of TIF images: None (uncompressed), "lzw",
+            "deflate" or "packbits".
+        :type tif_compression: str | None
+        :param quantize_colors: Reduce PNG and TIF images to a palette of this many colors
+            (at most 256), which makes them much smaller for plots with few colors.
+        :type quantize_colors: int | None
+        :param encode_workers: Number of threads compressing each PNG image, in blocks of
+            rows (ignored with quantize_colors).
+        :type encode_workers: int
+        :return: The paths of the saved files.
+        :rtype: list[pathlib.Path]
         """
+        encoding = _raster_encoding(
+            png_compress_level, tif_compression, quantize_colors, encode_workers
+        )
+        formats = {
+            "png": save_as_png,
+            "pdf": save_as_pdf,
+            "svg": save_as_svg,
+            "eps": save_as_eps,
+            "tif": save_as_tif,
+        }
+        paths = self._output_paths(filename, out_path, formats)
+        cache_key = None
+        if cache is not None:
+            with self._stage("cache"):
+                cache_key = cache.key(
+                    self,
+                    tight_layout=tight_layout,
+                    png_transparency=png_transparency,
+                    dpi=dpi,
+                    update_all_axis_props=update_all_axis_props,
+                    single_draw=single_draw,
+                    **encoding,
+                )
+                hit = cache.restore(cache_key, paths)
+            if hit:
+                if close:
+                    self.close()
+                return list(paths.values())
         if update_all_axis_props:
             self.update_axes_props_post_data()
-            self.fig.align_labels()  # align labels of subplots, needed only for multi plot
+            if not self.kwargs["large_grid"]:
+                with self._stage("align_labels"):
+                    self.fig.align_labels()  # align labels of subplots, needed only for multi plot
         # Saving the figure
+        if self.kwargs["large_grid"]:
+            tight_layout = False  # the fixed margins of a large grid already fit the labels
+        with self._export_context(paths, dpi):
+            if single_draw:
+                # draw and lay out the figure once for all formats, PNG and TIF are encoded
+                # from the same RGBA buffer
+                with self._stage("render"):
+                    rgba, vector_data = _render_figure_outputs(
+                        self.fig,
+                        list(paths),
+                        dpi=dpi,
+                        transparent=png_transparency,
+                        tight_layout=tight_layout,
+                    )
+                with self._stage("write"):
+                    _write_figure_outputs(paths, rgba, vector_data, dpi, encoding)
+            else:
+                for fmt, full_path in paths.items():
+                    with self._stage(f"savefig.{fmt}"):
+                        if encoding and fmt in _RASTER_FORMATS:
+                            rgba, _ = _render_figure_outputs(
+                                self.fig, [fmt], dpi, png_transparency, tight_layout
+                            )
+                            _encode_raster(full_path, rgba, fmt, dpi, **encoding)
+                            continue
+                        self.fig.savefig(
+                            full_path,
+                            dpi=dpi,
+                            transparent=png_transparency,
+                            bbox_inches="tight" if tight_layout else None,
+                        )
+        if cache_key is not None:
+            cache.store(cache_key, paths)
+        if self.stats is not None:
+            self._record_bytes(paths)
+        if close:
+            self.close()
+        return list(paths.values())
+
+    @_timed
+    @_styled
+    def save_figure_async(
+        self,
+        filename: str | None = None,
+        out_path: plib.Path | None = None,
+        tight_layout: bool = True,
+        save_as_png: bool = True,
+        save_as_pdf: bool = False,
+        save_as_svg: bool = False,
+        save_as_eps: bool = False,
+        save_as_tif: bool = False,
+        png_transparency: bool = False,
+        dpi: int = 300,
+        update_all_axis_props: bool = True,
+        close: bool = False,
+        png_compress_level: int = 6,
+        tif_compression: str | None = None,
+        quantize_colors: int | None = None,
+        encode_workers: int = 1,
+    ) -> Future[list[plib.Path]]:
+        """
+        Save the figure in the background, the arguments are the same as save_figure.
+
+        The figure is drawn once in the calling thread (as with single_draw=True) and the
+        vector formats are rendered to memory; encoding the PNG and TIF images and writing
+        all the files is then done by a background thread. The figure can be modified,
+        reset or closed as soon as this method returns.
+
+        At most a fixed number of saves (see set_async_save_limits) are pending at a time,
+        further calls block until one of them is written, which bounds the memory used.
+
+        :return: A future with the paths of the saved files.
+        :rtype: concurrent.futures.Future[list[pathlib.Path]]
+        """
+        encoding = _raster_encoding(
+            png_compress_level, tif_compression, quantize_colors, encode_workers
+        )
+        if update_all_axis_props:
+            self.update_axes_props_post_data()
+            if not self.kwargs["large_grid"]:
+                with self._stage("align_labels"):
+                    self.fig.align_labels()
         formats = {
             "png": save_as_png,
             "pdf": save_as_pdf,
@@ -452,152 +779,1355 @@ class MyFigure:
             "eps": save_as_eps,
             "tif": save_as_tif,
         }
-        if filename is None:
-            filename = self.kwargs["filename"]
-        if out_path is None:
-            out_path = self.kwargs["out_path"]
-
-        for fmt, should_save in formats.items():
-            if should_save:
-                full_path = plib.Path(out_path, f"{filename}.{fmt}")
-                self.fig.savefig(
-                    full_path,
+        paths = self._output_paths(filename, out_path, formats)
+        if self.kwargs["large_grid"]:
+            tight_layout = False  # the fixed margins of a large grid already fit the labels
+        slots = _save_slots
+        slots.acquire()  # pylint: disable=consider-using-with
+        try:
+            with self._export_context(paths, dpi), self._stage("render"):
+                rgba, vector_data = _render_figure_outputs(
+                    self.fig,
+                    list(paths),
                     dpi=dpi,
                     transparent=png_transparency,
-                    bbox_inches="tight" if tight_layout else None,
+                    tight_layout=tight_layout,
                 )
+            future = _get_save_executor().submit(
+                _write_figure_outputs, paths, rgba, vector_data, dpi, encoding
+            )
+        except BaseException:
+            slots.release()
+            raise
+        with _pending_saves_lock:
+            _pending_saves.add(future)
+        future.add_done_callback(functools.partial(_save_done, slots))
+        if self.stats is not None:
+            future.add_done_callback(
+                lambda f: self._record_bytes(paths) if f.exception() is None else None
+            )
+        if close:
+            self.close()
+        return future
 
+    @_timed
+    @_styled
+    def save_figure_to_bytes(
+        self,
+        formats: str | Iterable[str] = "png",
+        buffers: Mapping[str, BinaryIO] | None = None,
+        tight_layout: bool = True,
+        png_transparency: bool = False,
+        dpi: int = 300,
+        update_all_axis_props: bool = True,
+        png_compress_level: int = 6,
+        tif_compression: str | None = None,
+        quantize_colors: int | None = None,
+        encode_workers: int = 1,
+    ) -> dict[str, memoryview]:
+        """
+        Export the figure to memory instead of files, e.g. to serve it over HTTP.
 
-def create_inset(
-    ax: Axes,
-    x_loc: tuple[float],
-    y_loc: tuple[float],
-    x_lim: tuple[float] | None = None,
-    y_lim: tuple[float] | None = None,
-) -> Axes:
-    """
-    Create an inset plot within an existing axis.
+        The figure goes through the same post-data updates as save_figure and is drawn
+        only once for all the formats.
 
-    :param ax: The parent axis.
-    :type ax: Axes
-    :param x_loc: X location for the inset.
-    :type x_loc: tuple[float, float]
-    :param y_loc: Y location for the inset.
-    :type y_loc: tuple[float, float]
-    :param x_lim: X limits for the inset.
-    :type x_lim: tuple[float, float] | None
-    :param y_lim: Y limits for the inset.
-    :type y_lim: tuple[float, float] | None
-    :return: The inset axes.
-    :rtype: Axes
-    """
-    wdt = x_loc[1] - x_loc[0]
-    hgt = y_loc[1] - y_loc[0]
-    inset = ax.inset_axes([x_loc[0], y_loc[0], wdt, hgt])
-    if x_lim is not None:
-        inset.set_xlim(_adjust_lims(x_lim))
-    if y_lim is not None:
-        inset.set_ylim(_adjust_lims(y_lim))
-    return inset
+        .. code-block:: python
 
+            images = myfig.save_figure_to_bytes(["png", "svg"])
+            response = bytes(images["png"])
 
-def _adjust_lims(lims: tuple[float] | None, gap=0.05) -> tuple[float] | None:
-    """
-    Adjust axis limits with a specified gap.
+        :param formats: The formats to export, among png, pdf, svg, eps and tif.
+        :type formats: str | Iterable[str]
+        :param buffers: Binary file-like objects (e.g. io.BytesIO) to write some formats
+            into, by format. These formats are not included in the returned dict. For pdf,
+            a matplotlib PdfPages can be given to add the figure to it as a new page.
+        :type buffers: Mapping[str, BinaryIO] | None
+        :param tight_layout: Whether to use a tight layout.
+        :type tight_layout: bool
+        :param png_transparency: PNG transparency.
+        :type png_transparency: bool
+        :param dpi: Resolution of the raster formats.
+        :type dpi: int
+        :param update_all_axis_props: Apply the post-data updates before exporting.
+        :type update_all_axis_props: bool
+        :param png_compress_level: See save_figure.
+        :type png_compress_level: int
+        :param tif_compression: See save_figure.
+        :type tif_compression: str | None
+        :param quantize_colors: See save_figure.
+        :type quantize_colors: int | None
+        :param encode_workers: See save_figure.
+        :type encode_workers: int
+        :return: The encoded file content of each format not written to a buffer.
+        :rtype: dict[str, memoryview]
+        """
+        import io
 
-    :param lims: Axis limits to adjust.
-    :type lims: tuple[float, float] | None
-    :param gap: Percentage gap to add to the limits.
-    :type gap: float, optional
-    :return: Adjusted axis limits.
-    :rtype: tuple[float, float] | None
-    """
-    if lims is None:
-        return None
-    else:
-        new_lims = (
-            lims[0] * (1 + gap) - gap * lims[1],
-            lims[1] * (1 + gap) - gap * lims[0],
+        encoding = _raster_encoding(
+            png_compress_level, tif_compression, quantize_colors, encode_workers
         )
-        return new_lims
+        formats = [formats] if isinstance(formats, str) else list(formats)
+        buffers = dict(buffers) if buffers is not None else {}
+        for fmt in {*formats, *buffers}:
+            if fmt not in ("png", "pdf", "svg", "eps", "tif"):
+                raise ValueError(f"Unsupported format: '{fmt}'.")
+        targets = {fmt: io.BytesIO() for fmt in formats if fmt not in buffers}
+        targets.update(buffers)
+        if self.kwargs["large_grid"]:
+            tight_layout = False  # the fixed margins of a large grid already fit the labels
+        if update_all_axis_props:
+            self.update_axes_props_post_data()
+            if not self.kwargs["large_grid"]:
+                with self._stage("align_labels"):
+                    self.fig.align_labels()
+        with self._export_context(targets, dpi), self._stage("render"):
+            rgba, vector_data = _render_figure_outputs(
+                self.fig,
+                list(targets),
+                dpi=dpi,
+                transparent=png_transparency,
+                tight_layout=tight_layout,
+                vector_targets={fmt: buffers[fmt] for fmt in buffers if fmt not in _RASTER_FORMATS},
+            )
+        with self._stage("write"):
+            _write_figure_outputs(targets, rgba, vector_data, dpi, encoding)
+        if self.stats is not None:
+            self._record_bytes(targets)
+        return {fmt: targets[fmt].getbuffer() for fmt in formats if fmt not in buffers}
+
+    @_timed
+    @_styled
+    def bar(
+        self,
+        ax_index: int,
+        ave: Any,
+        std: Any = None,
+        twinx: bool = False,
+        labels: Iterable[str] | None = None,
+        group_labels: Iterable[Any] | None = None,
+        width: float = 0.5,
+        capsize: float = 2,
+        **kwargs: Any,
+    ) -> list[Any]:
+        """
+        Plot grouped bars with error bars from their averages and standard deviations.
+
+        Like ``df_ave.plot(ax=ax, kind="bar", yerr=df_std)``, the groups (rows) are placed at
+        0, 1, ... with their labels as x tick labels and the series (columns) side by side
+        within each group. The averages and standard deviations are kept with the bars, so
+        hatches, outlier annotation and masking of insignificant data use them directly
+        instead of reading them back from the bars and error bars.
+
+        :param ax_index: The index of the axis in axs (or axts if twinx).
+        :type ax_index: int
+        :param ave: The averages, a DataFrame, a Series or an array with one row per group
+            and one column per series.
+        :type ave: pandas.DataFrame | pandas.Series | np.ndarray
+        :param std: The standard deviations, with the same shape as ave, or None.
+        :type std: pandas.DataFrame | pandas.Series | np.ndarray | None
+        :param twinx: Plot on the twin axis.
+        :type twinx: bool
+        :param labels: The label of each series, defaults to the columns of ave.
+        :type labels: Iterable[str] | None
+        :param group_labels: The x tick label of each group, defaults to the index of ave.
+        :type group_labels: Iterable[Any] | None
+        :param width: The width of each group of bars, 0.5 as in pandas.
+        :type width: float
+        :param capsize: The size of the error bar caps.
+        :type capsize: float
+        :param kwargs: Other keyword arguments passed to Axes.bar for every series.
+        :type kwargs: Any
+        :return: The BarContainer of each series.
+        :rtype: list[matplotlib.container.BarContainer]
+        """
+        axes = self.axts if twinx else self.axs
+        if axes is None:
+            raise ValueError("twinx=True requires a figure created with twinx=True.")
+        ax = axes[ax_index]
+        previous = self._bar_indexes.get(ax)
+        ave_values, labels, group_labels = _bar_table(ave, labels, group_labels)
+        n_groups, n_series = ave_values.shape
+        if std is None:
+            std_values = np.zeros_like(ave_values)
+        else:
+            std_values = _bar_table(std, None, None)[0]
+            if std_values.shape != ave_values.shape:
+                raise ValueError("ave and std must have the same shape.")
+        bar_width = width / n_series
+        groups = np.arange(n_groups, dtype=float)
+        containers = []
+        for s in range(n_series):
+            containers.append(
+                ax.bar(
+                    groups + (s - (n_series - 1) / 2) * bar_width,
+                    ave_values[:, s],
+                    width=bar_width,
+                    yerr=None if std is None else std_values[:, s],
+                    capsize=capsize if std is not None else None,
+                    label=labels[s],
+                    **kwargs,
+                )
+            )
+        ax.set_xticks(groups, [str(g) for g in group_labels])
+        # series by series, as the bars in ax.patches
+        bars = [bar for container in containers for bar in container.patches]
+        heights, std_values = ave_values.T.ravel(), std_values.T.ravel()
+        group_ids = np.tile(np.arange(n_groups), n_series)
+        series_ids = np.repeat(np.arange(n_series), n_groups)
+        if previous is not None and previous.is_current(ax, before=containers):
+            # a previous call on this axis, its series come first
+            bars = previous.bars + bars
+            heights = np.concatenate([previous.heights, heights])
+            std_values = np.concatenate([previous.std, std_values])
+            group_ids = np.concatenate([previous.group_ids, group_ids])
+            series_ids = np.concatenate([previous.series_ids, series_ids + previous.n_series])
+        self._bar_indexes[ax] = _BarIndex.from_stats(
+            ax, bars, heights, std_values, group_ids, series_ids
+        )
+        return containers
 
+    @_timed
+    @_styled
+    def plot_columns(
+        self,
+        ax_index: int,
+        source: Any,
+        y: str | int | Iterable[str | int],
+        x: str | int | None = None,
+        twinx: bool = False,
+        dpi: int = 300,
+        chunk_rows: int = 1_000_000,
+        x_range: tuple[float, float] | None = None,
+        **kwargs: Any,
+    ) -> list[Any]:
+        """
+        Plot lines from columns of a Parquet file or of (memory-mapped) arrays larger than
+        memory, reading only the needed columns, chunk by chunk.
+
+        Each chunk is reduced to the first, last, minimum and maximum point of every pixel
+        column of the axis at the given dpi (as with decimate_lines), so the plotted lines
+        look the same as with all the points while the memory stays bounded by chunk_rows.
+        The x values must be non-decreasing.
+
+        .. code-block:: python
+
+            myfig.plot_columns(0, "data.parquet", y=["p1", "p2"], x="time")
+            myfig.plot_columns(0, "signal.npy", y=1, x=0)  # columns of a 2D .npy memmap
+
+        :param ax_index: The index of the axis in axs (or axts if twinx).
+        :type ax_index: int
+        :param source: A Parquet file path, a .npy file path (opened as a memmap), a 2D or
+            structured array or memmap, or a mapping of names to 1D arrays.
+        :type source: str | pathlib.Path | np.ndarray | Mapping[str, np.ndarray]
+        :param y: The column (or columns) to plot, one line each. Columns of 2D arrays are
+            given by index, the others by name.
+        :type y: str | int | Iterable[str | int]
+        :param x: The column of the x values, None to use the row number.
+        :type x: str | int | None
+        :param twinx: Plot on the twin axis.
+        :type twinx: bool
+        :param dpi: The resolution the figure will be saved with, which sets the number
+            of pixel columns.
+        :type dpi: int
+        :param chunk_rows: Number of rows read at a time.
+        :type chunk_rows: int
+        :param x_range: The range of the x values, defaults to the Parquet statistics or
+            to the first and last x values.
+        :type x_range: tuple[float, float] | None
+        :param kwargs: Keyword arguments passed to Axes.plot for every line, the label
+            defaults to the column name.
+        :type kwargs: Any
+        :return: The plotted lines.
+        :rtype: list[matplotlib.lines.Line2D]
+        """
+        axes = self.axts if twinx else self.axs
+        if axes is None:
+            raise ValueError("twinx=True requires a figure created with twinx=True.")
+        if chunk_rows <= 0:
+            raise ValueError("chunk_rows must be positive.")
+        ax = axes[ax_index]
+        ys = [y] if isinstance(y, (str, numbers.Integral)) else list(y)
+        # column indices can be numpy integers, e.g. from np.arange or np.flatnonzero
+        ys = [int(c) if isinstance(c, numbers.Integral) else c for c in ys]
+        if isinstance(x, numbers.Integral):
+            x = int(x)
+        columns = ys if x is None else [x, *ys]
+        table = _ColumnSource(source)
+        n_pixels = max(int(ax.get_position().width * self.fig.get_figwidth() * dpi), 1)
+        if x_range is None:
+            x_range = table.range(x)
+        transform = ax.xaxis.get_transform()
+        x_view = transform.transform(np.asarray(x_range, dtype=float))
+        span = np.ptp(x_view) or 1.0
+        kept = {name: ([], []) for name in ys}
+        offset, last_x, is_date = 0, -np.inf, False
+        for chunk in table.chunks(columns, chunk_rows):
+            n_rows = len(chunk[columns[0]])
+            if x is None:
+                x_values = np.arange(offset, offset + n_rows, dtype=float)
+            else:
+                x_values, is_date = _numeric_column(chunk[x])
+            offset += n_rows
+            if n_rows == 0:
+                continue
+            if x_values[0] < last_x or np.any(np.diff(x_values) < 0):
+                raise ValueError("The x values must be non-decreasing.")
+            last_x = x_values[-1]
+            pixels = np.floor((transform.transform(x_values) - x_view.min()) / span * n_pixels)
+            pixels = np.clip(np.nan_to_num(pixels, nan=-1), -1, n_pixels).astype(np.int64)
+            for name in ys:
+                y_values = _numeric_column(chunk[name])[0]
+                keep = _minmax_indices(pixels, y_values)
+                kept[name][0].append(x_values[keep])
+                kept[name][1].append(y_values[keep])
+        lines = []
+        for name in ys:
+            x_kept, y_kept = (np.concatenate(v) if v else np.empty(0) for v in kept[name])
+            lines += ax.plot(x_kept, y_kept, **{"label": str(name), **kwargs})
+        if is_date:
+            ax.xaxis_date()
+        return lines
+
+    @_timed
+    @_styled
+    def reset(self) -> MyFigure:
+        """
+        Remove all the plotted data and restore the axes to their state after creation.
 
-def _add_legend_to_ax(
-    ax: Axes,
-    axt: Axes | None = None,
-    loc: str = "best",
-    ncol: int = 1,
-    title: str | None = None,
-    bbox_xy: tuple[float] | None = None,
-    font_size: int = 10,
-    borderpad: float = 0.3,
-    handlelength: float = 1.5,
-    masked_values: bool = False,
-):
-    hnd_ax, lab_ax = ax.get_legend_handles_labels()
-    if axt is not None:
-        hnd_axt, lab_axt = axt.get_legend_handles_labels()
-    else:
-        hnd_axt = []
-        lab_axt = []
-    ax.legend(
-        hnd_ax + hnd_axt,
-        lab_ax + lab_axt,
-        loc=loc,
-        ncol=ncol,
-        title=title,
-        bbox_to_anchor=(bbox_xy if bbox_xy is not None else None),
-        fontsize=font_size,
-        borderpad=borderpad,
-        handlelength=handlelength,
-    )
-    if masked_values:
-        for handle in ax.legend().legendHandles:
-            handle.set_alpha(1)  # Set alpha of each legend handle to fully opaque
+        Lines, collections, patches, texts, images, insets and legends are removed, while
+        labels, limits, ticks and the style set by the configuration are kept, so the
+        figure can be reused for new data with the same configuration.
+
+        :return: The reset figure.
+        :rtype: MyFigure
+        """
+        self.stop_live()
+        for ax, state in zip(self._all_axes(), self._pre_data_axes_state):
+            _clear_data_from_ax(ax)
+            _set_axes_state(ax, state)
+            _create_first_ticks(ax)
+        self._bar_indexes.clear()
+        for legend in list(self.fig.legends):
+            legend.remove()
+        return self
 
+    @_styled
+    def start_live(
+        self, series: Mapping[Hashable, Artist], update_all_axis_props: bool = True
+    ) -> MyFigure:
+        """
+        Start the live mode, in which only the given artists are redrawn when updated.
 
-def _mask_insignificant_data_in_ax(ax, alpha: float = 0.3) -> None:
-    bars = [b for b in ax.patches if isinstance(b, mpatches.Rectangle)]
+        The figure is drawn once without the artists and the result (axes, labels, ticks,
+        legends) is kept as background. Each redraw restores the background and draws
+        only the artists on top of it (blitting), so frames take milliseconds.
 
-    if not bars:
-        return
+        .. code-block:: python
 
-    df_ave, df_std = _extract_ave_std_from_ax(ax)
-    ave_values = df_ave.T.to_numpy().ravel().tolist()
-    std_values = df_std.T.to_numpy().ravel().tolist()
+            line = myfig.axs[0].plot(x, y, label="y")[0]
+            myfig.start_live({"y": line})
+            while True:
+                myfig.update("y", x, read_new_values())
 
-    # Iterate over bars and their corresponding error bars
-    for i, bar in enumerate(bars):
-        std = std_values[i]
-        ave = ave_values[i]
-        if std > ave:
-            bar.set_alpha(alpha)
+        :param series: The artists to update (lines or scatter collections), by series id.
+        :type series: Mapping[Hashable, Artist]
+        :param update_all_axis_props: Apply the post-data updates (legends, letters, ...)
+            before drawing the background.
+        :type update_all_axis_props: bool
+        :return: The figure in live mode.
+        :rtype: MyFigure
+        """
+        self.stop_live()
+        if update_all_axis_props:
+            self.update_axes_props_post_data()
+            if not self.kwargs["large_grid"]:
+                with self._stage("align_labels"):
+                    self.fig.align_labels()
+        self._live_series = dict(series)
+        for artist in self._live_series.values():
+            artist.set_animated(True)
+        # interactive backends redraw the figure on resize, the background is then refreshed
+        self._live_canvas = self.fig.canvas
+        self._live_cid = self.fig.canvas.mpl_connect("draw_event", self._on_live_draw)
+        self.fig.canvas.draw()
+        self.redraw()
+        return self
+
+    def stop_live(self) -> None:
+        """
+        Leave the live mode, the artists are drawn again as part of the whole figure.
+        """
+        if self._live_cid is not None:
+            self.fig.canvas.mpl_disconnect(self._live_cid)
+        for artist in self._live_series.values():
+            artist.set_animated(False)
+        self._live_series = {}
+        self._live_background = None
+        self._live_cid = None
+        self._live_canvas = None
+
+    def update(
+        self,
+        series_id: Hashable,
+        x: np.ndarray,
+        y: np.ndarray,
+        redraw: bool = True,
+        rescale: bool = False,
+    ) -> None:
+        """
+        Replace the data of a live series and redraw the data layer.
+
+        :param series_id: The id of the series given to start_live.
+        :type series_id: Hashable
+        :param x: The new x values.
+        :type x: np.ndarray
+        :param y: The new y values.
+        :type y: np.ndarray
+        :param redraw: Redraw the figure now, use False to update several series and then
+            call redraw() once.
+        :type redraw: bool
+        :param rescale: Adapt the axis limits to the new data, which redraws the whole
+            figure and its background.
+        :type rescale: bool
+        """
+        if series_id not in self._live_series:
+            raise KeyError(f"Unknown live series: {series_id!r}.")
+        artist = self._live_series[series_id]
+        if hasattr(artist, "set_data"):
+            artist.set_data(x, y)
         else:
-            bar.set_alpha(1.0)
+            artist.set_offsets(np.column_stack([x, y]))
+        if rescale:
+            artist.axes.relim()
+            artist.axes.autoscale_view()
+            self.redraw(full=True)
+        elif redraw:
+            self.redraw()
+
+    @_styled
+    def redraw(self, full: bool = False) -> None:
+        """
+        Redraw the live series over the cached background.
 
+        :param full: Draw the whole figure again and refresh the background, needed when
+            something other than the live series has changed (e.g. limits or labels).
+        :type full: bool
+        """
+        canvas = self._live_canvas if self._live_canvas is not None else self.fig.canvas
+        if full or self._live_background is None:
+            # the draw_event handler stores the new background and draws the series
+            canvas.draw()
+            return
+        canvas.restore_region(self._live_background)
+        for artist in self._live_series.values():
+            self.fig.draw_artist(artist)
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+    def _on_live_draw(self, event: Any) -> None:
+        """
+        Keep the just drawn figure (without the live series) as background.
+        """
+        canvas = self._live_canvas
+        # exports draw on other canvases (PDF, SVG, temporary Agg) or at another dpi
+        if canvas is None or (event is not None and event.canvas is not canvas):
+            return
+        self._live_background = canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self._live_series.values():
+            self.fig.draw_artist(artist)
+        canvas.blit(self.fig.bbox)
+
+    def _set_fixed_grid_layout(self) -> None:
+        """
+        Place the axes of a large grid with fixed margins (in inches), leaving room for the
+        outer labels, the twin axis labels and a figure legend at the top.
+        """
+        width, height = self.kwargs["width"], self.kwargs["height"]
+        right = 0.8 if self.kwargs["twinx"] else 0.2
+        top = 0.2 + (0.4 if self.kwargs["legend"] else 0)
+        self.fig.subplots_adjust(
+            left=0.8 / width,
+            right=1 - right / width,
+            bottom=0.6 / height,
+            top=1 - top / height,
+            wspace=0.08,
+            hspace=0.08,
+        )
 
-def _annotate_letters_to_ax(ax, letter: str, xy: tuple[float], font_size: int) -> None:
-    """
-    Annotate the subplots with letters.
-    """
-    ax.annotate(
-        f"({letter})",
-        xycoords="axes fraction",
-        xy=(0, 0),
-        xytext=xy,
-        size=font_size,
-        weight="bold",
-    )
+    def _share_grid_axes(self) -> None:
+        """
+        Give the same limits and ticks to the axes of a large grid and keep the labels and
+        tick labels only on the outer axes, for each of x, y and the twin y whose limits are
+        the same on all the axes. The other axes keep their labels and get more room.
+        """
+        groups = [(self.axs, "x"), (self.axs, "y")]
+        if self.kwargs["twinx"]:
+            groups.append((self.axts, "y"))
+        spaces = {"x": 0.08, "y": 0.08}
+        for axes, name in groups:
+            if not _limits_shared(axes, name):
+                spaces[name] = 0.6 if name == "y" and self.kwargs["twinx"] else 0.35
+                continue
+            _share_limits_and_ticks(axes, name)
+            for ax in axes:
+                _label_outer(ax, name)
+        self.fig.subplots_adjust(hspace=spaces["x"], wspace=spaces["y"])
+
+    def _add_figure_legend(self) -> None:
+        """
+        Add a single legend above the axes of a large grid, with one entry per label.
+        """
+        entries = {}
+        for ax in self._all_axes():
+            for handle, label in zip(*ax.get_legend_handles_labels()):
+                entries.setdefault(label, handle)
+        if not entries:
+            return
+        ncol = self.kwargs["legend_ncols"]
+        legend = self.fig.legend(
+            list(entries.values()),
+            list(entries),
+            loc="upper center",
+            ncol=len(entries) if ncol == 1 else ncol,
+            title=self.broad_props["legend_title"][0],
+            fontsize=self.kwargs["legend_font_size"],
+            borderpad=self.kwargs["legend_borderpad"],
+            handlelength=self.kwargs["legend_handlelength"],
+            frameon=False,
+        )
+        if self.broad_props["mask_insignificant_data"][0]:
+            for handle in getattr(legend, "legend_handles", None) or legend.legendHandles:
+                handle.set_alpha(1)
 
+    def _stage(self, name: str) -> Any:
+        """
+        Return a context manager recording the wall time of a stage, if stats are collected.
+        """
+        if self.stats is None:
+            return _NO_STAGE
+        return _StageTimer(self, name)
 
-def _broadcast_value_prop(
-    prop: list | str | float | int | bool, prop_name: str, number_of_axis: int
-) -> list:
-    """
-    Broadcast a single value property to a list applicable to all subplots.
+    def _emit(self, metric: str, value: float) -> None:
+        """
+        Pass a measurement to the stats hooks.
+        """
+        for hook in _stats_hooks:
+            hook(self, metric, value)
 
-    :param prop: The property to broadcast.
-    :type prop: Union[list, str, float, int, bool]
+    def _count_draw(self, event: Any) -> None:
+        self.stats.add_draw()
+        self._emit("draws", 1)
+
+    def _record_bytes(self, targets: dict[str, plib.Path | BinaryIO]) -> None:
+        """
+        Record the size of the outputs written to files or buffers, by format.
+        """
+        for fmt, target in targets.items():
+            if isinstance(target, (str, plib.PurePath)):
+                n_bytes = plib.Path(target).stat().st_size
+            elif hasattr(target, "getbuffer"):
+                n_bytes = target.getbuffer().nbytes
+            elif hasattr(target, "tell"):
+                n_bytes = target.tell()
+            else:
+                continue  # e.g. the pages of a PdfPages
+            self.stats.add_bytes(fmt, n_bytes)
+            self._emit(f"bytes.{fmt}", n_bytes)
+
+    def _output_paths(
+        self, filename: str | None, out_path: plib.Path | None, formats: dict[str, bool]
+    ) -> dict[str, plib.Path]:
+        """
+        Return the output path of each selected format, defaulting to the figure kwargs.
+        """
+        if filename is None:
+            filename = self.kwargs["filename"]
+        if out_path is None:
+            out_path = self.kwargs["out_path"]
+        return {
+            fmt: plib.Path(out_path, f"{filename}.{fmt}")
+            for fmt, should_save in formats.items()
+            if should_save
+        }
+
+    @contextmanager
+    def _export_context(self, formats: Iterable[str], dpi: int) -> Iterator[None]:
+        """
+        Apply the line decimation and, for vector outputs, the rasterization of dense
+        artists while the figure is exported.
+        """
+        vector_output = any(fmt not in _RASTER_FORMATS for fmt in formats)
+        with self._live_suspended(), self._decimated_lines(dpi), ExitStack() as stack:
+            if vector_output and self.kwargs["rasterize_threshold"] is not None:
+                stack.enter_context(
+                    _rasterized_dense_artists(self.fig, self.kwargs["rasterize_threshold"])
+                )
+            yield
+
+    @contextmanager
+    def _live_suspended(self) -> Iterator[None]:
+        """
+        Export the live series as regular artists and keep the draws of the export from
+        replacing the live background, which is drawn again afterwards (the export may have
+        changed the layout).
+        """
+        if self._live_cid is None:
+            yield
+            return
+        self._live_canvas.mpl_disconnect(self._live_cid)
+        for artist in self._live_series.values():
+            artist.set_animated(False)
+        try:
+            yield
+        finally:
+            for artist in self._live_series.values():
+                artist.set_animated(True)
+            self._live_cid = self._live_canvas.mpl_connect("draw_event", self._on_live_draw)
+            self._live_canvas.draw()
+
+    @contextmanager
+    def _decimated_lines(self, dpi: int) -> Iterator[None]:
+        """
+        Temporarily downsample the lines of the axes with decimate_lines enabled.
+
+        Each line with more points than the axis has pixel columns at the given dpi is
+        reduced, column by column, to its first, last, minimum and maximum points, so that
+        the rendered line looks the same. The original data are restored on exit.
+        """
+        decimated = []
+        for i, ax in enumerate(self.axs):
+            if not self.broad_props["decimate_lines"][i]:
+                continue
+            n_pixels = int(np.ceil(ax.get_window_extent().width / self.fig.dpi * dpi))
+            axes = [ax, self.axts[i]] if self.kwargs["twinx"] else [ax]
+            for line in [line for a in axes for line in a.lines]:
+                original = (line.get_xdata(orig=True), line.get_ydata(orig=True))
+                if _decimate_line(line, n_pixels):
+                    decimated.append((line, original))
+        try:
+            yield
+        finally:
+            for line, (x, y) in decimated:
+                line.set_data(x, y)
+
+    def _get_bar_index(self, ax: Axes, i: int) -> _BarIndex | None:
+        """
+        Return the bar index of an axis, shared by the post-data passes.
+
+        The index is cached and built again only if the patches or collections of the
+        axis have changed. None is returned if no pass on bars is enabled for the axis.
+        """
+        if not (
+            self.kwargs["auto_apply_hatches_to_bars"]
+            or self.broad_props["annotate_outliers"][i]
+            or self.broad_props["mask_insignificant_data"][i]
+        ):
+            return None
+        bar_index = self._bar_indexes.get(ax)
+        if bar_index is None or not bar_index.is_current(ax):
+            bar_index = _BarIndex(ax)
+            self._bar_indexes[ax] = bar_index
+        return bar_index
+
+    def _all_axes(self) -> list[Axes]:
+        """
+        Return the axes followed by the twin axes, if any.
+        """
+        return self.axs + (self.axts if self.axts is not None else [])
+
+
+class FigureSpec:
+    """
+    A validated, broadcasted and immutable MyFigure configuration.
+
+    The options are validated, the per-axis properties broadcasted and the style computed
+    once, when the spec is created; MyFigure(spec) then skips all of that. A spec is
+    hashable and compares by value, so it can be used as a cache key.
+
+    .. code-block:: python
+
+        spec = FigureSpec(rows=2, twinx=True, x_lab="time", out_path=out_path)
+        for name, data in datasets.items():
+            myfig = MyFigure(spec, filename=name)
+
+    :ivar kwargs: All the options, defaults included (lists are converted to tuples).
+    :type kwargs: Mapping[str, Any]
+    :ivar broad_props: The properties broadcasted to each axis.
+    :type broad_props: Mapping[str, tuple]
+    :ivar style_rc: The matplotlib settings of the style of the figure.
+    :type style_rc: Mapping[str, Any]
+    """
+
+    __slots__ = ("kwargs", "broad_props", "style_rc", "_key", "_hash")
+
+    def __init__(self, **kwargs: Any) -> None:
+        """
+        Validate and broadcast the options.
+
+        :param kwargs: MyFigure configuration options.
+        :type kwargs: Any
+        :raises ValueError: If an option is not valid.
+        """
+        defaults = MyFigure.default_kwargs()
+        full_kwargs = {**defaults, **{k: _freeze(v) for k, v in kwargs.items()}}
+        _process_kwargs(full_kwargs, defaults.keys())
+        n_axs = full_kwargs["rows"] * full_kwargs["cols"]
+        broad_props = {
+            name: tuple(values) for name, values in _broadcast_kwargs(full_kwargs, n_axs).items()
+        }
+        style_rc = _get_style_rc(
+            full_kwargs["color_palette"],
+            full_kwargs["color_palette_n_colors"],
+            full_kwargs["sns_style"],
+            full_kwargs["text_font"],
+            full_kwargs["text_font_size"],
+        )
+        key = _kwargs_key(full_kwargs)
+        object.__setattr__(self, "kwargs", MappingProxyType(full_kwargs))
+        object.__setattr__(self, "broad_props", MappingProxyType(broad_props))
+        object.__setattr__(self, "style_rc", style_rc)
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_hash", hash(key))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("FigureSpec is immutable, use replace() to change options.")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("FigureSpec is immutable, use replace() to change options.")
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FigureSpec):
+            return NotImplemented
+        return self._hash == other._hash and self._key == other._key
+
+    def __repr__(self) -> str:
+        defaults = MyFigure.default_kwargs()
+        changed = {
+            k: v
+            for k, v in self.kwargs.items()
+            if _kwargs_key({k: v}) != _kwargs_key({k: defaults[k]})
+        }
+        return f"FigureSpec({', '.join(f'{k}={v!r}' for k, v in changed.items())})"
+
+    def __reduce__(self) -> tuple:
+        return (_figure_spec_from_kwargs, (dict(self.kwargs),))
+
+    def replace(self, **changes: Any) -> FigureSpec:
+        """
+        Return a new spec with some options changed.
+
+        :param changes: The options to change.
+        :type changes: Any
+        :return: The new spec.
+        :rtype: FigureSpec
+        """
+        return FigureSpec(**{**self.kwargs, **changes})
+
+
+def _figure_spec_from_kwargs(kwargs: Dict[str, Any]) -> FigureSpec:
+    """
+    Rebuild a FigureSpec from its options, used to pickle specs.
+    """
+    return FigureSpec(**kwargs)
+
+
+def _freeze(value: Any) -> Any:
+    """
+    Convert lists (also nested) to tuples so that the option cannot be changed in place.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class FigureStats:
+    """
+    Timings and counters collected by a MyFigure created with collect_stats=True.
+
+    Stages are the MyFigure methods (create_figure, update_axes_props_pre_data,
+    update_axes_props_post_data, save_figure, ...) and the steps inside them (hatches,
+    outliers, mask, legend, align_labels, savefig.<format>, render, write). The stats of a
+    figure reused by a FigurePool accumulate over the uses, until clear() is called.
+
+    :ivar times: Total wall time of each stage, in seconds.
+    :type times: dict[str, float]
+    :ivar calls: Number of times each stage ran.
+    :type calls: dict[str, int]
+    :ivar draws: Number of full draws of the figure, for any output format.
+    :type draws: int
+    :ivar bytes_written: Bytes written to files or buffers, by format.
+    :type bytes_written: dict[str, int]
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        """
+        Reset all the timings and counters.
+        """
+        with self._lock:
+            self.times: dict[str, float] = {}
+            self.calls: dict[str, int] = {}
+            self.draws = 0
+            self.bytes_written: dict[str, int] = {}
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.times[stage] = self.times.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def add_draw(self) -> None:
+        with self._lock:
+            self.draws += 1
+
+    def add_bytes(self, fmt: str, n_bytes: int) -> None:
+        with self._lock:
+            self.bytes_written[fmt] = self.bytes_written.get(fmt, 0) + n_bytes
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Return a copy of the stats as a plain dict, e.g. to log it as JSON.
+        """
+        with self._lock:
+            return {
+                "times": dict(self.times),
+                "calls": dict(self.calls),
+                "draws": self.draws,
+                "bytes_written": dict(self.bytes_written),
+            }
+
+
+class _StageTimer:
+    """
+    Context manager adding the wall time of a stage to the stats of a figure.
+    """
+
+    __slots__ = ("myfig", "stage", "start")
+
+    def __init__(self, myfig: MyFigure, stage: str) -> None:
+        self.myfig = myfig
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        seconds = time.perf_counter() - self.start
+        self.myfig.stats.add_time(self.stage, seconds)
+        self.myfig._emit(f"time.{self.stage}", seconds)  # pylint: disable=protected-access
+
+
+class _StyleGate:
+    """
+    Applies figure styles to the global rcParams for the threads that use them.
+
+    The threads using the style that is applied share it, a thread with another style waits
+    until they are done. The lock is only held to apply and restore the rcParams, not while
+    the figures are created or drawn. A thread can nest the style of another figure inside
+    its own once the other threads using the outer style are done or waiting in the gate
+    (and so not drawing).
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        # the applied styles, with the rcParams they replaced and the number of users below
+        self._frames: list[tuple[Mapping[str, Any], dict[str, Any], int]] = []
+        self._users = 0
+        # the uses of the styles held by the threads waiting in the gate
+        self._parked = 0
+
+    def _wait(self, depth: int) -> None:
+        self._parked += depth
+        if depth:  # this may let a thread waiting to nest a style go on
+            self._condition.notify_all()
+        self._condition.wait()
+        self._parked -= depth
+
+    def _alone(self, depth: int) -> bool:
+        return self._users - depth == self._parked
+
+    @contextmanager
+    def applied(self, style_rc: Mapping[str, Any]) -> Iterator[None]:
+        """
+        Apply a style inside the context, waiting for the threads using another style.
+        """
+        import matplotlib as mpl
+
+        depth = getattr(self._local, "depth", 0)
+        with self._condition:
+            while True:
+                top = self._frames[-1][0] if self._frames else None
+                # other threads only join a style that is not nested
+                if top is not None and (top is style_rc or top == style_rc):
+                    if len(self._frames) == 1 or self._users == depth:
+                        break
+                if self._alone(depth):
+                    # as in matplotlib.rc_context, the backend is left as it is on exit
+                    snapshot = dict(mpl.rcParams.copy())
+                    del snapshot["backend"]
+                    mpl.rcParams.update(style_rc)
+                    self._frames.append((style_rc, snapshot, self._users))
+                    break
+                self._wait(depth)
+            self._users += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            with self._condition:
+                self._users -= 1
+                # the last user of a style restores the rcParams it replaced
+                while self._frames and self._frames[-1][2] >= self._users:
+                    dict.update(mpl.rcParams, self._frames.pop()[1])
+                self._condition.notify_all()
+
+    def update_globals(self, style_rc: Mapping[str, Any]) -> None:
+        """
+        Update the global rcParams with a style, once no other thread applies a style.
+        """
+        import matplotlib as mpl
+
+        depth = getattr(self._local, "depth", 0)
+        with self._condition:
+            while not self._alone(depth):
+                self._wait(depth)
+            mpl.rcParams.update(style_rc)
+
+
+_STYLE_GATE = _StyleGate()
+
+
+def add_stats_hook(hook: Callable[[MyFigure, str, float], None]) -> Callable:
+    """
+    Register a function called with every measurement of the figures that collect stats.
+
+    The hook is called as ``hook(myfig, metric, value)`` where metric is
+    ``"time.<stage>"`` (value in seconds), ``"draws"`` (value 1) or ``"bytes.<format>"``
+    (value in bytes), e.g. to forward them to a metrics system:
+
+    .. code-block:: python
+
+        add_stats_hook(lambda myfig, metric, value: statsd.timing(metric, value))
+
+    :param hook: The function to call.
+    :type hook: Callable[[MyFigure, str, float], None]
+    :return: The hook, so that it can be used as a decorator.
+    :rtype: Callable
+    """
+    _stats_hooks.append(hook)
+    return hook
+
+
+def remove_stats_hook(hook: Callable[[MyFigure, str, float], None]) -> None:
+    """
+    Unregister a hook added with add_stats_hook.
+
+    :param hook: The function to remove.
+    :type hook: Callable[[MyFigure, str, float], None]
+    """
+    _stats_hooks.remove(hook)
+
+
+def warm_up(dpi: int | Iterable[int] = 300, texts: Iterable[str] = (), **kwargs: Any) -> float:
+    """
+    Prepare the current process for figures with the given configuration.
+
+    The first figure of a process is about twice as slow as the following ones, because
+    matplotlib loads the fonts, builds the mathtext parser and parses each math string
+    the first time they are needed. warm_up makes, exports and closes a figure with the
+    same kwargs (with a legend, so that legend_title is included) at each dpi, so that the
+    style, the fonts of text_font and of the math text and the parsed labels (x_lab, y_lab,
+    yt_lab, legend_title and texts) are cached for the figures made afterwards, e.g. in a
+    worker or a server before the first request.
+
+    .. code-block:: python
+
+        warm_up(dpi=300, x_lab=r"x_lab$\\int^1_2$", y_lab=r"$\\alpha$", rows=2)
+
+    :param dpi: The resolution (or resolutions) the figures will be saved with.
+    :type dpi: int | Iterable[int]
+    :param texts: Other strings (e.g. annotations) to parse and lay out.
+    :type texts: Iterable[str]
+    :param kwargs: The MyFigure keyword arguments of the figures to come.
+    :type kwargs: Any
+    :return: The time spent, in seconds.
+    :rtype: float
+    """
+    start = time.perf_counter()
+    kwargs = {k: v for k, v in kwargs.items() if k not in ("filename", "out_path")}
+    kwargs["use_pyplot"] = False
+    dpis = [dpi] if isinstance(dpi, int) else list(dpi)
+    with MyFigure(**kwargs) as myfig:
+        with myfig.style_context():
+            for ax in myfig._all_axes():
+                ax.plot([0, 1], [0, 1], label="warm-up")
+            for text in texts:
+                myfig.fig.text(0, 0, text)
+        for i, resolution in enumerate(dpis):
+            myfig.save_figure_to_bytes("png", dpi=resolution, update_all_axis_props=i == 0)
+    return time.perf_counter() - start
+
+
+class FigurePool:
+    """
+    A pool of configured MyFigure objects that are reused instead of created again.
+
+    A figure released to the pool is reset (data removed, axes setup kept) and handed out
+    again by acquire() when the same configuration is requested. Only filename and
+    out_path can differ between reuses. When the pool is full, the least recently used
+    figures are closed. acquire() and release() can be called from several threads.
+
+    :ivar max_size: Maximum number of idle figures kept in the pool.
+    :type max_size: int
+    :ivar hits: Number of acquire() calls served by a pooled figure.
+    :type hits: int
+    :ivar misses: Number of acquire() calls that created a new figure.
+    :type misses: int
+    """
+
+    def __init__(self, max_size: int = 8) -> None:
+        """
+        Initialize an empty pool.
+
+        :param max_size: Maximum number of idle figures kept in the pool.
+        :type max_size: int
+        """
+        if max_size <= 0:
+            raise ValueError("max_size must be positive.")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._idle: OrderedDict[Hashable, list[MyFigure]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._n_idle()
+
+    def _n_idle(self) -> int:
+        return sum(len(figs) for figs in self._idle.values())
+
+    def acquire(self, spec: FigureSpec | None = None, **kwargs: Any) -> MyFigure:
+        """
+        Get a figure for the given configuration, reusing an idle one if available.
+
+        :param spec: A precompiled configuration, used directly as the key of the pool.
+        :type spec: FigureSpec | None
+        :param kwargs: MyFigure configuration options.
+        :type kwargs: Any
+        :return: A figure with no data, ready to be plotted on.
+        :rtype: MyFigure
+        """
+        options = {k: v for k, v in kwargs.items() if k not in ("filename", "out_path")}
+        if spec is not None:
+            spec = spec.replace(**options) if options else spec
+            key = spec
+        else:
+            key = _kwargs_key(options)
+        myfig = None
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.hits += 1
+                myfig = idle.pop()
+                if not idle:
+                    del self._idle[key]
+            else:
+                self.misses += 1
+        if myfig is None:
+            # the figure is built outside the lock, so that other threads are not blocked
+            if spec is not None:
+                file_kwargs = {k: v for k, v in kwargs.items() if k not in options}
+                myfig = MyFigure(spec, **file_kwargs)
+            else:
+                myfig = MyFigure(**kwargs)
+            myfig._pool_owner = (self, key)
+            return myfig
+        file_kwargs = {"filename": kwargs.get("filename"), "out_path": kwargs.get("out_path")}
+        _process_file_kwargs(file_kwargs)
+        myfig.kwargs.update(file_kwargs)
+        return myfig
+
+    def release(self, myfig: MyFigure) -> None:
+        """
+        Reset a figure obtained from acquire() and keep it for reuse. A figure that was
+        closed in the meantime (e.g. by save_figure(close=True)) is dropped from the pool.
+
+        :param myfig: The figure to give back to the pool.
+        :type myfig: MyFigure
+        :raises ValueError: If the figure was not acquired from this pool or was already
+            released.
+        """
+        owner = myfig._pool_owner
+        if owner is None or owner[0] is not self:
+            raise ValueError("The figure was not acquired from this pool.")
+        key = owner[1]
+        if myfig.fig is None:
+            myfig._pool_owner = None
+            return
+        with self._lock:
+            if any(idle is myfig for idle in self._idle.get(key, ())):
+                raise ValueError("The figure was already released to this pool.")
+        myfig.reset()
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(key, []).append(myfig)
+            self._idle.move_to_end(key)
+            while self._n_idle() > self.max_size:
+                oldest_key = next(iter(self._idle))
+                evicted.append(self._idle[oldest_key].pop(0))
+                if not self._idle[oldest_key]:
+                    del self._idle[oldest_key]
+        for myfig in evicted:
+            self._close(myfig)
+
+    def clear(self) -> None:
+        """
+        Close all the idle figures.
+        """
+        with self._lock:
+            idle = [myfig for figs in self._idle.values() for myfig in figs]
+            self._idle.clear()
+        for myfig in idle:
+            self._close(myfig)
+
+    def _close(self, myfig: MyFigure) -> None:
+        myfig._pool_owner = None
+        myfig.close()
+
+
+def create_inset(
+    ax: Axes,
+    x_loc: tuple[float],
+    y_loc: tuple[float],
+    x_lim: tuple[float] | None = None,
+    y_lim: tuple[float] | None = None,
+) -> Axes:
+    """
+    Create an inset plot within an existing axis.
+
+    :param ax: The parent axis.
+    :type ax: Axes
+    :param x_loc: X location for the inset.
+    :type x_loc: tuple[float, float]
+    :param y_loc: Y location for the inset.
+    :type y_loc: tuple[float, float]
+    :param x_lim: X limits for the inset.
+    :type x_lim: tuple[float, float] | None
+    :param y_lim: Y limits for the inset.
+    :type y_lim: tuple[float, float] | None
+    :return: The inset axes.
+    :rtype: Axes
+    """
+    wdt = x_loc[1] - x_loc[0]
+    hgt = y_loc[1] - y_loc[0]
+    inset = ax.inset_axes([x_loc[0], y_loc[0], wdt, hgt])
+    if x_lim is not None:
+        inset.set_xlim(_adjust_lims(x_lim))
+    if y_lim is not None:
+        inset.set_ylim(_adjust_lims(y_lim))
+    return inset
+
+
+def _adjust_lims(lims: tuple[float] | None, gap=0.05) -> tuple[float] | None:
+    """
+    Adjust axis limits with a specified gap.
+
+    :param lims: Axis limits to adjust.
+    :type lims: tuple[float, float] | None
+    :param gap: Percentage gap to add to the limits.
+    :type gap: float, optional
+    :return: Adjusted axis limits.
+    :rtype: tuple[float, float] | None
+    """
+    if lims is None:
+        return None
+    else:
+        new_lims = (
+            lims[0] * (1 + gap) - gap * lims[1],
+            lims[1] * (1 + gap) - gap * lims[0],
+        )
+        return new_lims
+
+
+def _add_legend_to_ax(
+    ax: Axes,
+    axt: Axes | None = None,
+    loc: str = "best",
+    ncol: int = 1,
+    title: str | None = None,
+    bbox_xy: tuple[float] | None = None,
+    font_size: int = 10,
+    borderpad: float = 0.3,
+    handlelength: float = 1.5,
+    masked_values: bool = False,
+):
+    hnd_ax, lab_ax = ax.get_legend_handles_labels()
+    if axt is not None:
+        hnd_axt, lab_axt = axt.get_legend_handles_labels()
+    else:
+        hnd_axt = []
+        lab_axt = []
+    legend = ax.legend(
+        hnd_ax + hnd_axt,
+        lab_ax + lab_axt,
+        loc=loc,
+        ncol=ncol,
+        title=title,
+        bbox_to_anchor=(bbox_xy if bbox_xy is not None else None),
+        fontsize=font_size,
+        borderpad=borderpad,
+        handlelength=handlelength,
+    )
+    if masked_values:
+        # legendHandles was renamed legend_handles in matplotlib 3.7
+        handles = getattr(legend, "legend_handles", None) or legend.legendHandles
+        for handle in handles:
+            handle.set_alpha(1)  # Set alpha of each legend handle to fully opaque
+
+
+def _mask_insignificant_data_in_ax(
+    ax, alpha: float = 0.3, bar_index: _BarIndex | None = None
+) -> None:
+    """
+    Make transparent the bars whose standard deviation is larger than their average.
+    """
+    if bar_index is None:
+        bar_index = _BarIndex(ax)
+    if not bar_index.bars:
+        return
+
+    # Iterate over bars and their corresponding error bars
+    for bar, insignificant in zip(bar_index.bars, bar_index.std > bar_index.heights):
+        bar.set_alpha(alpha if insignificant else 1.0)
+
+
+def _annotate_letters_to_ax(ax, letter: str, xy: tuple[float], font_size: int) -> None:
+    """
+    Annotate the subplots with letters.
+    """
+    ax.annotate(
+        f"({letter})",
+        xycoords="axes fraction",
+        xy=(0, 0),
+        xytext=xy,
+        size=font_size,
+        weight="bold",
+    )
+
+
+def _process_kwargs(kwargs: Dict[str, Any], valid_kwargs: Iterable[str]) -> None:
+    """
+    Validate the keyword arguments of a figure and convert them in place.
+
+    :param kwargs: The keyword arguments, including the defaults.
+    :type kwargs: Dict[str, Any]
+    :param valid_kwargs: The valid keyword arguments.
+    :type valid_kwargs: Iterable[str]
+    :raises ValueError: If an argument is not valid.
+    """
+    valid_kwargs = set(valid_kwargs)
+    # Check for any invalid keyword arguments
+    for kwarg in kwargs:
+        if kwarg not in valid_kwargs:
+            raise ValueError(f"Invalid keyword argument: '{kwarg}' \n {valid_kwargs = }")
+
+    _process_file_kwargs(kwargs)
+
+    kwargs["rows"] = int(kwargs["rows"])
+    kwargs["cols"] = int(kwargs["cols"])
+    kwargs["width"] = float(kwargs["width"])
+    kwargs["height"] = float(kwargs["height"])
+    kwargs["legend_ncols"] = int(kwargs["legend_ncols"])
+
+    if kwargs["rows"] <= 0:
+        raise ValueError("Number of rows must be positive.")
+    if kwargs["cols"] <= 0:
+        raise ValueError("Number of cols must be positive.")
+    if kwargs["width"] <= 0:
+        raise ValueError("Width must be positive.")
+    if kwargs["height"] <= 0:
+        raise ValueError("Height must be positive.")
+    if kwargs["legend_ncols"] <= 0:
+        raise ValueError("Number of legend columns must be positive.")
+    if kwargs["rasterize_threshold"] is not None:
+        kwargs["rasterize_threshold"] = int(kwargs["rasterize_threshold"])
+        if kwargs["rasterize_threshold"] <= 0:
+            raise ValueError("rasterize_threshold must be positive.")
+
+
+def _process_file_kwargs(kwargs: Dict[str, Any]) -> None:
+    """
+    Validate filename and convert out_path to a pathlib.Path, in place.
+    """
+    if kwargs.get("out_path") is not None:
+        kwargs["out_path"] = plib.Path(kwargs["out_path"])
+
+    if kwargs.get("filename") is not None:
+        if not isinstance(kwargs["filename"], str):
+            raise ValueError("filename must be a str.")
+
+
+# properties with one value per axis, and with a list (e.g. limits or ticks) per axis
+_VALUE_PROPS: tuple[str, ...] = (
+    "x_lab",
+    "y_lab",
+    "yt_lab",
+    "grid",
+    "x_ticklabels_rotation",
+    "legend",
+    "legend_loc",
+    "legend_ncols",
+    "legend_title",
+    "annotate_outliers",
+    "annotate_outliers_decimal_places",
+    "annotate_letters",
+    "mask_insignificant_data",
+    "decimate_lines",
+)
+_LIST_PROPS: tuple[str, ...] = (
+    "x_lim",
+    "y_lim",
+    "yt_lim",
+    "x_ticks",
+    "y_ticks",
+    "yt_ticks",
+    "x_ticklabels",
+    "y_ticklabels",
+    "yt_ticklabels",
+    "legend_bbox_xy",
+    "annotate_letters_xy",
+)
+
+
+def _broadcast_kwargs(kwargs: Dict[str, Any], n_axs: int) -> dict[str, list]:
+    """
+    Broadcast the per-axis properties of the keyword arguments to the number of axes.
+    """
+    broad_props: dict[str, list] = {}
+    for sprop in _VALUE_PROPS:
+        broad_props[sprop] = _broadcast_value_prop(kwargs[sprop], sprop, n_axs)
+    for lprop in _LIST_PROPS:
+        broad_props[lprop] = _broadcast_list_prop(kwargs[lprop], lprop, n_axs)
+    return broad_props
+
+
+def _broadcast_value_prop(
+    prop: list | str | float | int | bool, prop_name: str, number_of_axis: int
+) -> list:
+    """
+    Broadcast a single value property to a list applicable to all subplots.
+
+    :param prop: The property to broadcast.
+    :type prop: Union[list, str, float, int, bool]
     :param prop_name: The name of the property, used in error messages.
     :type prop_name: str
     :return: A list of the property values broadcasted to match the number of subplots.
@@ -640,28 +2170,157 @@ def _broadcast_list_prop(prop: list | None, prop_name: str, number_of_axis: int)
     return prop
 
 
-def _extract_ave_std_from_ax(ax):
-    bars = [b for b in ax.patches if isinstance(b, mpatches.Rectangle)]
-    ave_values = [bar.get_height() for bar in bars]
-    std_values = [0] * len(bars)  # Initialize a list of zeros for standard deviations
+def _extract_ave_std_from_ax(ax) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Extract the average (bar height) and standard deviation (half the error bar length)
+    of each bar in an axis, in the order of ax.patches.
 
-    # Collect all LineCollections
-    line_collections = [col for col in ax.collections if isinstance(col, LineCollection)]
+    :param ax: The axis with the bar plot.
+    :type ax: Axes
+    :return: The averages and the standard deviations (0 for bars without error bars).
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    bar_index = _BarIndex(ax)
+    return bar_index.heights, bar_index.std
 
-    # Assuming error bars are vertically oriented, extract standard deviations
-    index = 0  # Start index for assigning std values from segments
-    for lc in line_collections:
-        segments = lc.get_segments()
-        for seg in segments:
-            std = (seg[1][1] - seg[0][1]) / 2
-            if index < len(std_values):  # Ensure we do not go out of index range
-                std_values[index] = std
-                index += 1
 
-    df_ave = pd.DataFrame([ave_values], columns=[f"Bar {i+1}" for i in range(len(bars))])
-    df_std = pd.DataFrame([std_values], columns=df_ave.columns)
+def _bar_table(
+    values: Any, labels: Iterable[str] | None, group_labels: Iterable[Any] | None
+) -> tuple[np.ndarray, list, list]:
+    """
+    Return the values of a bar plot as a (groups, series) array, with the series labels and
+    the group labels (from the columns and index of DataFrames and Series if not given).
+    """
+    if hasattr(values, "columns"):  # DataFrame
+        default_labels, default_groups = list(values.columns), list(values.index)
+        table = values.to_numpy(dtype=float)
+    elif hasattr(values, "to_numpy"):  # Series
+        default_labels, default_groups = [values.name], list(values.index)
+        table = values.to_numpy(dtype=float)[:, None]
+    else:
+        table = np.asarray(values, dtype=float)
+        if table.ndim == 1:
+            table = table[:, None]
+        default_labels, default_groups = [None] * table.shape[1], list(range(table.shape[0]))
+    if table.ndim != 2 or table.size == 0:
+        raise ValueError("Bar values must be a non-empty table of groups by series.")
+    labels = list(labels) if labels is not None else default_labels
+    group_labels = list(group_labels) if group_labels is not None else default_groups
+    if len(labels) != table.shape[1] or len(group_labels) != table.shape[0]:
+        raise ValueError("The labels do not match the number of series and groups.")
+    return table, labels, group_labels
+
+
+class _ColumnSource:
+    """
+    Chunked, column-projected reading of a Parquet file, a .npy file (as a memmap), a 2D
+    or structured array or a mapping of names to 1D arrays.
+    """
+
+    def __init__(self, source: Any) -> None:
+        self.parquet = None
+        self.arrays = None
+        if isinstance(source, (str, plib.PurePath)):
+            path = plib.Path(source)
+            if path.suffix == ".npy":
+                source = np.load(path, mmap_mode="r")
+            else:
+                import pyarrow.parquet as pq
+
+                # without pre-buffering, pyarrow reads the row groups in bounded pieces
+                self.parquet = pq.ParquetFile(path, pre_buffer=False, buffer_size=1 << 22)
+        if self.parquet is None:
+            self.arrays = source
+
+    def column(self, name: str | int) -> Any:
+        """
+        Return a column of an array source (without reading it).
+        """
+        if isinstance(self.arrays, np.ndarray) and self.arrays.dtype.names is None:
+            return self.arrays[:, name]
+        return self.arrays[name]
+
+    def chunks(self, columns: list[str | int], chunk_rows: int) -> Iterator[dict[Any, Any]]:
+        """
+        Yield the columns, chunk_rows rows at a time.
+        """
+        if self.parquet is not None:
+            for batch in self.parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+                yield {name: batch.column(name).to_numpy(zero_copy_only=False) for name in columns}
+            return
+        data = {name: self.column(name) for name in columns}
+        n_rows = len(data[columns[0]])
+        for start in range(0, n_rows, chunk_rows):
+            yield {name: np.asarray(col[start : start + chunk_rows]) for name, col in data.items()}
+
+    def range(self, x: str | int | None) -> tuple[float, float]:
+        """
+        Return the range of the x column (of the row numbers if x is None), from the
+        Parquet statistics or the first and last values, reading as little as possible.
+        """
+        if self.parquet is not None:
+            metadata = self.parquet.metadata
+            if x is None:
+                return 0.0, max(metadata.num_rows - 1, 1)
+            index = self.parquet.schema_arrow.get_field_index(x)
+            stats = [
+                metadata.row_group(i).column(index).statistics
+                for i in range(metadata.num_row_groups)
+            ]
+            if stats and all(st is not None and st.has_min_max for st in stats):
+                low = _numeric_column(np.array([st.min for st in stats]))[0].min()
+                high = _numeric_column(np.array([st.max for st in stats]))[0].max()
+                return float(low), float(high)
+            values = [_numeric_column(c[x])[0] for c in self.chunks([x], 1_000_000)]
+            values = [v[[0, -1]] for v in values if v.size]
+            return float(values[0][0]), float(values[-1][-1])
+        if x is None:
+            first = next(iter(self.arrays.values())) if isinstance(self.arrays, Mapping) else None
+            n_rows = len(first) if first is not None else len(self.arrays)
+            return 0.0, max(n_rows - 1, 1)
+        column = self.column(x)
+        return float(_numeric_column(np.asarray(column[:1]))[0][0]), float(
+            _numeric_column(np.asarray(column[-1:]))[0][0]
+        )
+
+
+def _numeric_column(values: Any) -> tuple[np.ndarray, bool]:
+    """
+    Return a column as floats (dates as matplotlib date numbers) and whether it had dates.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == "O":  # e.g. datetimes from Parquet statistics
+        values = values.astype("datetime64[ns]")
+    if values.dtype.kind == "M":
+        from matplotlib.dates import date2num
+
+        return np.asarray(date2num(values), dtype=float), True
+    return values.astype(float, copy=False), False
 
-    return df_ave, df_std
+
+def _container_artists(container: Any) -> list[Artist]:
+    """
+    Return the bars and the error bar collections of a BarContainer.
+    """
+    artists = list(container.patches)
+    if container.errorbar is not None:
+        artists.extend(container.errorbar.lines[2])
+    return artists
+
+
+def _half_segment_lengths(segments: list[np.ndarray]) -> np.ndarray:
+    """
+    Return half the vertical extent of each segment (NaN for segments without two points).
+    """
+    if not segments:
+        return np.empty(0)
+    try:
+        points = np.asarray(segments, dtype=float)
+    except ValueError:  # segments with different number of points
+        points = None
+    if points is not None and points.ndim == 3 and points.shape[1] >= 2:
+        return (points[:, 1, 1] - points[:, 0, 1]) / 2
+    return np.array([(s[1][1] - s[0][1]) / 2 if len(s) >= 2 else np.nan for s in segments])
 
 
 def _rotate_x_labels_ax(ax, rotation: float | int) -> None:
@@ -677,113 +2336,940 @@ def _rotate_x_labels_ax(ax, rotation: float | int) -> None:
             label.set_rotation_mode("anchor")
 
 
-def _annotate_outliers_to_ax(ax, decimal_places=2) -> None:
+def _annotate_outliers_to_ax(ax, decimal_places=2, bar_index: _BarIndex | None = None) -> None:
+    """
+    Annotate the value of the bars that fall outside the y limits of the axis.
+
+    The labels are placed at the bottom (low outliers) or top (high outliers) of the axis,
+    and labels of bars closer than dx are stacked.
+    """
+    from matplotlib.transforms import blended_transform_factory
 
-    bars = [b for b in ax.patches if isinstance(b, mpatches.Rectangle)]
-    if not bars:
+    if bar_index is None:
+        bar_index = _BarIndex(ax)
+    if not bar_index.bars:
         return
 
     # Set dx and dy for text positioning adjustments
-    df_ave, df_std = _extract_ave_std_from_ax(ax)
+    ave, std, xpos = bar_index.heights, bar_index.std, bar_index.x
     y_lim = ax.get_ylim()
-    dx = 0.15 * len(df_ave.index)
-    dy = 0.04
+    dx = 0.15
     tform = blended_transform_factory(ax.transData, ax.transAxes)
-    dfao = pd.DataFrame(columns=["H/L", "xpos", "ypos", "ave", "std", "text"])
-    # Flatten and assign average and standard deviation values
-    dfao["ave"] = df_ave.T.to_numpy().ravel().tolist()
-    dfao["std"] = (
-        df_std.T.to_numpy().ravel().tolist() if not df_std.empty else np.zeros(dfao["ave"].size)
-    )
 
-    # Determine x positions of bars
-    try:
-        dfao["xpos"] = [p.get_x() + p.get_width() / 2 for p in ax.patches]
-    except ValueError:  # Correct for possible duplicates due to masking
-        dfao["xpos"] = [p.get_x() + p.get_width() / 2 for p in ax.patches[: len(ax.patches) // 2]]
-
-    # Drop rows outside of y limits
-    dfao = dfao[(dfao["ave"] < y_lim[0]) | (dfao["ave"] > y_lim[1])]
-    # Loop through bars to set text and H/L values
-    for ao in dfao.index:
-        ave = dfao.at[ao, "ave"]
-        std = dfao.at[ao, "std"]
-        if ave == float("inf"):
-            text = "inf"
-            hl = "H"
-        elif ave == float("-inf"):
-            text = "-inf"
-            hl = "L"
-        elif ave > y_lim[1]:
-            hl = "H"
-            text = f"{ave:.{decimal_places}f}"
-            if std != 0 and not np.isnan(std):
-                text += rf"$\pm${std:.{decimal_places}f}"
-        elif ave < y_lim[0]:
-            hl = "L"
-            text = f"{ave:.{decimal_places}f}"
-            if std != 0:
-                text += rf"$\pm${std:.{decimal_places}f}"
-        else:
-            print("Something is wrong", ave)
-        dfao.loc[ao, "text"] = text
-        dfao.loc[ao, "H/L"] = hl
-
-    for hl, ypos, dy in zip(["L", "H"], [0.02, 0.98], [0.04, -0.04]):
-        dfao1 = dfao[dfao["H/L"] == hl]  # pylint: disable=unsubscriptable-object
-        dfao1["ypos"] = ypos
-        if not dfao1.empty:
-            dfao1 = dfao1.sort_values("xpos", ascending=True)
-            dfao1["diffx"] = np.diff(dfao1["xpos"].values, prepend=dfao1["xpos"].values[0]) < dx
-            dfao1.reset_index(inplace=True)
-
-            for i in dfao1.index.tolist()[1:]:
-                dfao1.loc[i, "ypos"] = ypos
-                for e in range(i, 0, -1):
-                    if dfao1.loc[e, "diffx"]:
-                        dfao1.loc[e, "ypos"] += dy
-                    else:
-                        break
-            for ao in dfao1.index.tolist():
-                ax.annotate(
-                    dfao1.loc[ao, "text"],
-                    xy=(dfao1.loc[ao, "xpos"], 0),
-                    xycoords=tform,
-                    textcoords=tform,
-                    xytext=(dfao1.loc[ao, "xpos"], dfao1.loc[ao, "ypos"]),
-                    fontsize=9,
-                    ha="center",
-                    va="center",
-                    bbox={
-                        "boxstyle": "square,pad=0",
-                        "edgecolor": None,
-                        "facecolor": "white",
-                        "alpha": 0.7,
-                    },
-                )
+    # Keep only the bars outside of y limits
+    outside = (ave < y_lim[0]) | (ave > y_lim[1])
+    ave, std, xpos = ave[outside], std[outside], xpos[outside]
+    if ave.size == 0:
+        return
+    high = ave > y_lim[1]
+    # the std is not shown for infinite values, nor when it is NaN for high values
+    show_std = np.isfinite(ave) & (std != 0) & ~(high & np.isnan(std))
+    text = np.char.mod(f"%.{decimal_places}f", ave)
+    std_text = np.char.mod(rf"$\pm$%.{decimal_places}f", std)
+    text = np.where(show_std, np.char.add(text, std_text), text)
+
+    for is_high, ypos, dy in zip([False, True], [0.02, 0.98], [0.04, -0.04]):
+        group = np.flatnonzero(high == is_high)
+        if group.size == 0:
+            continue
+        group = group[np.argsort(xpos[group], kind="stable")]
+        # each label is shifted by dy once for every following label in its run of labels
+        # that are closer than dx to their previous one (the first label never moves)
+        close = np.diff(xpos[group], prepend=xpos[group][0]) < dx
+        close[0] = False
+        breaks = np.flatnonzero(~close)
+        order = np.arange(group.size)
+        run_end = np.append(breaks, group.size)[np.searchsorted(breaks, order)]
+        ypositions = ypos + dy * (run_end - order)
+        for ao, ypos_ao in zip(group, ypositions):
+            ax.annotate(
+                text[ao],
+                xy=(xpos[ao], 0),
+                xycoords=tform,
+                textcoords=tform,
+                xytext=(xpos[ao], ypos_ao),
+                fontsize=9,
+                ha="center",
+                va="center",
+                bbox={
+                    "boxstyle": "square,pad=0",
+                    "edgecolor": None,
+                    "facecolor": "white",
+                    "alpha": 0.7,
+                },
+            )
 
 
-def _apply_hatch_patterns_to_ax(ax) -> None:
+def _apply_hatch_patterns_to_ax(ax, bar_index: _BarIndex | None = None) -> None:
     """
     Apply hatch patterns to bars in the bar plots of each subplot.
 
     This method iterates over all subplots and applies predefined hatch patterns to each bar,
     enhancing the visual distinction between bars, especially in black and white printouts.
     """
-    # Check if the plot is a bar plot
-    bars = [b for b in ax.patches if isinstance(b, mpatches.Rectangle)]
+    if bar_index is None:
+        bar_index = _BarIndex(ax)
     # If there are no bars, return immediately
-    if not bars:
+    if not bar_index.bars:
+        return
+    # one hatch pattern per series, bars that do not fit the grid of groups are left as is
+    patterns = hatches[: bar_index.n_series]
+    for b, series_id in zip(bar_index.bars, bar_index.series_ids):
+        if 0 <= series_id < len(patterns):
+            b.set_hatch(patterns[series_id])
+            b.set_edgecolor("k")
+
+
+class _BarIndex:
+    """
+    The bars of an axis and their statistics, extracted once and shared by the post-data
+    passes (hatches, outliers, masking).
+
+    Bars are in the order of ax.patches, which for grouped bar plots is series by series.
+
+    :ivar bars: The bar patches.
+    :ivar x: The center of each bar.
+    :ivar heights: The height (average) of each bar.
+    :ivar widths: The width of each bar.
+    :ivar std: Half the length of the error bar of each bar (0 if missing).
+    :ivar n_groups: Number of groups (x ticks).
+    :ivar n_series: Number of bars in each group.
+    :ivar group_ids: The group of each bar (-1 if it does not fit the grid).
+    :ivar series_ids: The series of each bar (-1 if it does not fit the grid).
+    """
+
+    def __init__(self, ax: Axes) -> None:
+        import matplotlib.patches as mpatches
+        from matplotlib.collections import LineCollection
+
+        self._artists = _weak_artists(ax)
+        self.bars = [b for b in ax.patches if isinstance(b, mpatches.Rectangle)]
+        n_bars = len(self.bars)
+        self._geometry = geometry = _bar_geometry(self.bars)
+        self.widths = geometry[:, 1]
+        self.heights = geometry[:, 2]
+        self.x = geometry[:, 0] + self.widths / 2
+
+        # Assuming error bars are vertically oriented, extract standard deviations
+        self.std = np.zeros(n_bars)
+        half_lengths = [
+            _half_segment_lengths(col.get_segments())
+            for col in ax.collections
+            if isinstance(col, LineCollection)
+        ]
+        if half_lengths:
+            half_lengths = np.concatenate(half_lengths)[:n_bars]
+            self.std[: half_lengths.size] = half_lengths
+
+        self.n_groups = len(ax.get_xticks(minor=False)) if n_bars else 0
+        self.n_series = n_bars // self.n_groups if self.n_groups else 0
+        in_grid = np.arange(n_bars) < self.n_groups * self.n_series
+        self.group_ids = np.where(in_grid, np.arange(n_bars) % max(self.n_groups, 1), -1)
+        self.series_ids = np.where(in_grid, np.arange(n_bars) // max(self.n_groups, 1), -1)
+
+    @classmethod
+    def from_stats(
+        cls,
+        ax: Axes,
+        bars: list[Any],
+        heights: np.ndarray,
+        std: np.ndarray,
+        group_ids: np.ndarray,
+        series_ids: np.ndarray,
+    ) -> _BarIndex:
+        """
+        Build the index of bars plotted from known statistics, without reading them back
+        from the artists.
+        """
+        bar_index = cls.__new__(cls)
+        bar_index._artists = _weak_artists(ax)
+        bar_index.bars = bars
+        bar_index._geometry = geometry = _bar_geometry(bars)
+        bar_index.heights = np.asarray(heights, dtype=float)
+        bar_index.std = np.asarray(std, dtype=float)
+        bar_index.widths = geometry[:, 1]
+        bar_index.x = geometry[:, 0] + bar_index.widths / 2
+        bar_index.group_ids = np.asarray(group_ids)
+        bar_index.series_ids = np.asarray(series_ids)
+        bar_index.n_groups = int(bar_index.group_ids.max(initial=-1)) + 1
+        bar_index.n_series = int(bar_index.series_ids.max(initial=-1)) + 1
+        return bar_index
+
+    def is_current(self, ax: Axes, before: list[Any] | None = None) -> bool:
+        """
+        Return True if the patches and collections of the axis did not change (except for
+        the artists of the containers in before, added after the index was built) and the
+        bars were not moved or resized in place.
+        """
+        patches, collections = ax.patches, ax.collections
+        if before:
+            new_ids = {id(a) for container in before for a in _container_artists(container)}
+            patches = [p for p in patches if id(p) not in new_ids]
+            collections = [c for c in collections if id(c) not in new_ids]
+        for refs, artists in zip(self._artists, (patches, collections)):
+            if len(refs) != len(artists) or any(
+                ref() is not artist for ref, artist in zip(refs, artists)
+            ):
+                return False
+        return np.array_equal(self._geometry, _bar_geometry(self.bars))
+
+
+def _weak_artists(ax: Axes) -> tuple[tuple[weakref.ref, ...], tuple[weakref.ref, ...]]:
+    """
+    Weak references to the patches and collections of an axis, which do not keep removed
+    artists alive and cannot match the new artists that reuse their ids.
+    """
+    return tuple(map(weakref.ref, ax.patches)), tuple(map(weakref.ref, ax.collections))
+
+
+def _bar_geometry(bars: list[Any]) -> np.ndarray:
+    """
+    The x, width and height of each bar, as an (n_bars, 3) array.
+    """
+    return np.array(
+        [(b.get_x(), b.get_width(), b.get_height()) for b in bars], dtype=float
+    ).reshape(len(bars), 3)
+
+
+def _render_figure_outputs(
+    fig: Figure,
+    formats: list[str],
+    dpi: int = 300,
+    transparent: bool = False,
+    tight_layout: bool = True,
+    vector_targets: Mapping[str, Any] | None = None,
+) -> tuple[np.ndarray | None, dict[str, bytes]]:
+    """
+    Draw the figure once and render the vector formats to memory (or directly to their
+    targets, if given).
+
+    :param fig: The figure to render.
+    :type fig: Figure
+    :param formats: The output formats.
+    :type formats: list[str]
+    :param dpi: Resolution of the raster output.
+    :type dpi: int
+    :param transparent: Make the figure and axes background transparent.
+    :type transparent: bool
+    :param tight_layout: Crop the output to the tight bounding box of the figure.
+    :type tight_layout: bool
+    :param vector_targets: Binary file-like objects (or a PdfPages for pdf) to save some
+        vector formats into, these are not included in the returned contents.
+    :type vector_targets: Mapping[str, Any] | None
+    :return: The RGBA pixels of the figure (None without raster formats) and the file
+        content of each vector format.
+    :rtype: tuple[np.ndarray | None, dict[str, bytes]]
+    """
+    import io
+
+    vector_targets = vector_targets or {}
+    vector_data = {}
+    with ExitStack() as stack:
+        if transparent:
+            stack.enter_context(_transparent_background(fig))
+        if any(fmt in _RASTER_FORMATS for fmt in formats):
+            rgba, bbox_inches = _render_rgba(fig, dpi=dpi, tight_layout=tight_layout)
+        else:
+            # solve the layout and measure the tight box with one draw without output, the
+            # vector formats are then drawn once each
+            rgba, bbox_inches = None, None
+            fig.draw_without_rendering()
+            if tight_layout:
+                bbox_inches = _padded_tight_bbox(fig, fig.canvas.get_renderer())
+        # the layout has already been solved by the draw above
+        stack.enter_context(_frozen_layout(fig))
+        for fmt in formats:
+            if fmt not in _RASTER_FORMATS:
+                target = vector_targets.get(fmt) or io.BytesIO()
+                fig.savefig(target, format=fmt, dpi=dpi, bbox_inches=bbox_inches)
+                if fmt not in vector_targets:
+                    vector_data[fmt] = target.getvalue()
+    return rgba, vector_data
+
+
+def _write_figure_outputs(
+    paths: dict[str, plib.Path | BinaryIO],
+    rgba: np.ndarray,
+    vector_data: dict[str, bytes],
+    dpi: int,
+    encoding: Mapping[str, Any] | None = None,
+) -> list[plib.Path | BinaryIO]:
+    """
+    Encode the raster formats from the RGBA pixels (with the options of _raster_encoding)
+    and write all the outputs, each to a file path or to a binary file-like object.
+    """
+    for fmt, path in paths.items():
+        if fmt in _RASTER_FORMATS:
+            _encode_raster(path, rgba, fmt, dpi, **(encoding or {}))
+        elif fmt not in vector_data:
+            continue  # already saved into its target while rendering
+        elif isinstance(path, (str, plib.PurePath)):
+            plib.Path(path).write_bytes(vector_data[fmt])
+        else:
+            path.write(vector_data[fmt])
+    return list(paths.values())
+
+
+def _raster_encoding(
+    png_compress_level: int = 6,
+    tif_compression: str | None = None,
+    quantize_colors: int | None = None,
+    encode_workers: int = 1,
+) -> dict[str, Any]:
+    """
+    Validate the raster encoder options and return those that differ from the defaults.
+    """
+    if not 0 <= png_compress_level <= 9:
+        raise ValueError("png_compress_level must be between 0 and 9.")
+    if tif_compression not in _TIF_COMPRESSIONS:
+        raise ValueError(f"tif_compression must be one of {list(_TIF_COMPRESSIONS)}.")
+    if quantize_colors is not None and not 2 <= quantize_colors <= 256:
+        raise ValueError("quantize_colors must be between 2 and 256.")
+    if encode_workers < 1:
+        raise ValueError("encode_workers must be positive.")
+    options = {
+        "png_compress_level": png_compress_level,
+        "tif_compression": tif_compression,
+        "quantize_colors": quantize_colors,
+        "encode_workers": encode_workers,
+    }
+    defaults = {
+        "png_compress_level": 6,
+        "tif_compression": None,
+        "quantize_colors": None,
+        "encode_workers": 1,
+    }
+    return {k: v for k, v in options.items() if v != defaults[k]}
+
+
+def _encode_raster(
+    target: plib.Path | BinaryIO,
+    rgba: np.ndarray,
+    fmt: str,
+    dpi: int,
+    png_compress_level: int = 6,
+    tif_compression: str | None = None,
+    quantize_colors: int | None = None,
+    encode_workers: int = 1,
+) -> None:
+    """
+    Encode RGBA pixels as a PNG or TIF image into a file path or a binary file-like object.
+    """
+    from matplotlib.image import imsave
+
+    if fmt == "png" and encode_workers > 1 and quantize_colors is None:
+        data = _encode_png_parallel(rgba, dpi, png_compress_level, encode_workers)
+        if isinstance(target, (str, plib.PurePath)):
+            plib.Path(target).write_bytes(data)
+        else:
+            target.write(data)
+        return
+    if fmt == "png":
+        pil_kwargs = {"compress_level": png_compress_level}
+    else:
+        pil_kwargs = {"compression": _TIF_COMPRESSIONS[tif_compression]}
+    if quantize_colors is None:
+        imsave(target, rgba, format=_RASTER_FORMATS[fmt], dpi=dpi, pil_kwargs=pil_kwargs)
+        return
+    from PIL import Image, PngImagePlugin
+
+    image = Image.fromarray(np.ascontiguousarray(rgba), "RGBA").quantize(
+        quantize_colors, method=Image.Quantize.FASTOCTREE
+    )
+    if fmt == "png":
+        pil_kwargs["pnginfo"] = PngImagePlugin.PngInfo()
+        pil_kwargs["pnginfo"].add_text("Software", _png_software())
+    image.save(target, format=_RASTER_FORMATS[fmt], dpi=(dpi, dpi), **pil_kwargs)
+
+
+def _encode_png_parallel(rgba: np.ndarray, dpi: int, level: int, workers: int) -> bytes:
+    """
+    Encode RGBA pixels as a PNG image, compressing blocks of rows in parallel threads.
+
+    Each row is filtered with the PNG "Up" filter (difference with the row above), then
+    the blocks are compressed as independent raw deflate streams (zlib releases the GIL),
+    flushed to a byte boundary so that their concatenation is a single valid stream.
+    """
+    import struct
+    import zlib
+    from concurrent.futures import ThreadPoolExecutor
+
+    height, width = rgba.shape[:2]
+    rows = np.ascontiguousarray(rgba, dtype=np.uint8).reshape(height, width * 4)
+    filtered = np.empty((height, width * 4 + 1), dtype=np.uint8)
+    filtered[:, 0] = 2  # filter type "Up"
+    filtered[0, 1:] = rows[0]
+    np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])  # modulo 256
+    data = memoryview(filtered).cast("B")
+    bounds = np.linspace(0, height, min(workers, height) + 1).astype(int) * filtered.shape[1]
+
+    def compress(i: int) -> bytes:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        last = i == len(bounds) - 2
+        block = compressor.compress(data[bounds[i] : bounds[i + 1]])
+        return block + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        blocks = list(executor.map(compress, range(len(bounds) - 1)))
+    stream = b"".join([b"\x78\x9c", *blocks, struct.pack(">I", zlib.adler32(data))])
+
+    def chunk(tag: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + tag + body + struct.pack(">I", zlib.crc32(tag + body))
+
+    pixels_per_meter = int(dpi / 0.0254 + 0.5)
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)),
+            chunk(b"tEXt", b"Software\0" + _png_software().encode("latin-1")),
+            chunk(b"pHYs", struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1)),
+            chunk(b"IDAT", stream),
+            chunk(b"IEND", b""),
+        ]
+    )
+
+
+def _png_software() -> str:
+    """
+    Return the Software text that matplotlib writes in PNG images.
+    """
+    import matplotlib as mpl
+
+    return f"Matplotlib version{mpl.__version__}, https://matplotlib.org/"
+
+
+def _get_save_executor() -> ThreadPoolExecutor:
+    """
+    Return the executor of the background saves, creating it on first use.
+    """
+    global _save_executor  # pylint: disable=global-statement
+    with _pending_saves_lock:
+        if _save_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            _save_executor = ThreadPoolExecutor(
+                max_workers=_save_max_workers, thread_name_prefix="myfigure-save"
+            )
+        return _save_executor
+
+
+def _save_done(slots: threading.BoundedSemaphore, future: Future) -> None:
+    with _pending_saves_lock:
+        _pending_saves.discard(future)
+    slots.release()
+
+
+def wait_all(timeout: float | None = None) -> None:
+    """
+    Wait until all the figures saved with save_figure_async are written.
+
+    :param timeout: Maximum number of seconds to wait, None to wait indefinitely.
+    :type timeout: float | None
+    :raises TimeoutError: If the saves are not done within the timeout.
+    :raises Exception: The first error raised by one of the saves, if any.
+    """
+    from concurrent.futures import wait
+
+    with _pending_saves_lock:
+        pending = list(_pending_saves)
+    _, not_done = wait(pending, timeout=timeout)
+    if not_done:
+        raise TimeoutError(f"{len(not_done)} figures are still being saved.")
+    for future in pending:
+        future.result()
+
+
+def set_async_save_limits(max_workers: int = 2, max_pending: int = 8) -> None:
+    """
+    Set the number of background threads and the maximum number of pending saves used
+    by save_figure_async. The saves already pending are waited for first.
+
+    :param max_workers: Number of threads encoding and writing the files.
+    :type max_workers: int
+    :param max_pending: Maximum number of saves rendered but not yet written, further
+        calls to save_figure_async block until one is done.
+    :type max_pending: int
+    """
+    global _save_executor, _save_max_workers, _save_slots  # pylint: disable=global-statement
+    if max_workers <= 0 or max_pending <= 0:
+        raise ValueError("max_workers and max_pending must be positive.")
+    wait_all()
+    with _pending_saves_lock:
+        if _save_executor is not None:
+            _save_executor.shutdown()
+            _save_executor = None
+        _save_max_workers = max_workers
+        _save_slots = threading.BoundedSemaphore(max_pending)
+
+
+def _render_rgba(
+    fig: Figure, dpi: int = 300, tight_layout: bool = True
+) -> tuple[np.ndarray, Bbox | None]:
+    """
+    Draw the figure once on an Agg canvas and return its RGBA pixels.
+
+    :param fig: The figure to draw.
+    :type fig: Figure
+    :param dpi: Resolution of the drawing.
+    :type dpi: int
+    :param tight_layout: Crop the pixels to the padded tight bounding box, as savefig does.
+    :type tight_layout: bool
+    :return: The RGBA array (rows from top to bottom) and the bounding box in inches
+        (None if tight_layout is False).
+    :rtype: tuple[np.ndarray, Bbox | None]
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.colors import to_rgba
+
+    original_canvas = fig.canvas
+    original_dpi = fig.dpi
+    try:
+        canvas = FigureCanvasAgg(fig)
+        fig.dpi = dpi
+        canvas.draw()
+        rgba = np.asarray(canvas.buffer_rgba())
+        if not tight_layout:
+            return rgba.copy(), None
+        bbox_inches = _padded_tight_bbox(fig, canvas.get_renderer())
+        facecolor = to_rgba(fig.get_facecolor())
+        rgba = _crop_rgba(rgba, bbox_inches, dpi, fig.bbox.height, facecolor)
+    finally:
+        fig.dpi = original_dpi
+        fig.set_canvas(original_canvas)
+    return rgba, bbox_inches
+
+
+def _padded_tight_bbox(fig: Figure, renderer: Any) -> Bbox:
+    """
+    Return the tight bounding box of a drawn figure, in inches, padded as savefig does.
+    """
+    import matplotlib as mpl
+
+    bbox_inches = fig.get_tightbbox(renderer)
+    w_pad = h_pad = mpl.rcParams["savefig.pad_inches"]
+    if w_pad == "layout":
+        engine = fig.get_layout_engine()
+        w_pad, h_pad = (engine.get()["w_pad"], engine.get()["h_pad"]) if engine else (0, 0)
+    return bbox_inches.padded(w_pad, h_pad)
+
+
+def _crop_rgba(
+    rgba: np.ndarray, bbox_inches: Bbox, dpi: float, fig_height_px: float, facecolor: tuple
+) -> np.ndarray:
+    """
+    Crop an RGBA buffer to a bounding box, filling any area outside the figure.
+
+    :param rgba: Pixels of the whole figure, rows from top to bottom.
+    :type rgba: np.ndarray
+    :param bbox_inches: The region to keep, in inches from the bottom-left corner.
+    :type bbox_inches: Bbox
+    :param dpi: Resolution of the buffer.
+    :type dpi: float
+    :param fig_height_px: Height of the figure in pixels.
+    :type fig_height_px: float
+    :param facecolor: Color of the areas of the bounding box outside the figure.
+    :type facecolor: tuple
+    :return: The cropped pixels.
+    :rtype: np.ndarray
+    """
+    width = int(bbox_inches.width * dpi)
+    height = int(bbox_inches.height * dpi)
+    # savefig truncates the size of the cropped canvas and flips the rows at its truncated
+    # height, so the rows are counted from the bottom of the box, as in savefig
+    left = int(round(bbox_inches.x0 * dpi))
+    top = int(round(fig_height_px - bbox_inches.y0 * dpi - height))
+    out = np.empty((height, width, 4), dtype=np.uint8)
+    out[...] = np.round(np.asarray(facecolor) * 255).astype(np.uint8)
+    src_top, src_left = max(top, 0), max(left, 0)
+    src_bottom = min(top + height, rgba.shape[0])
+    src_right = min(left + width, rgba.shape[1])
+    if src_bottom > src_top and src_right > src_left:
+        out[src_top - top : src_bottom - top, src_left - left : src_right - left] = rgba[
+            src_top:src_bottom, src_left:src_right
+        ]
+    return out
+
+
+@contextmanager
+def _transparent_background(fig: Figure) -> Iterator[None]:
+    """
+    Temporarily make the figure and all its axes transparent, as savefig(transparent=True).
+    """
+    patches = [fig.patch]
+    stack_axes = list(fig.axes)
+    while stack_axes:
+        ax = stack_axes.pop()
+        patches.append(ax.patch)
+        stack_axes.extend(ax.child_axes)
+    colors_before = [(p.get_facecolor(), p.get_edgecolor()) for p in patches]
+    for p in patches:
+        p.set_facecolor("none")
+        p.set_edgecolor("none")
+    try:
+        yield
+    finally:
+        for p, (facecolor, edgecolor) in zip(patches, colors_before):
+            p.set_facecolor(facecolor)
+            p.set_edgecolor(edgecolor)
+
+
+@contextmanager
+def _frozen_layout(fig: Figure) -> Iterator[None]:
+    """
+    Temporarily remove the layout engine so that the current layout is kept.
+
+    The engine is removed rather than replaced with "none", whose placeholder engine would
+    still make savefig draw the figure once more before the actual output. Matplotlib
+    versions without the private attribute fall back to the public set_layout_engine.
+    """
+    from matplotlib.layout_engine import LayoutEngine
+
+    engine = fig.get_layout_engine()
+    if engine is None:
+        yield
+        return
+    private = isinstance(getattr(fig, "_layout_engine", None), LayoutEngine)
+    if private:
+        fig._layout_engine = None  # pylint: disable=protected-access
+    else:
+        fig.set_layout_engine("none")
+    try:
+        yield
+    finally:
+        if private:
+            fig._layout_engine = engine  # pylint: disable=protected-access
+        else:
+            fig.set_layout_engine(engine)
+
+
+def _limits_shared(axes: list[Axes], name: str) -> bool:
+    """
+    Return True if the x or y limits of a large grid can be shared: either all the axes are
+    autoscaled, or all have the same fixed limits.
+
+    :param axes: The axes of the grid.
+    :type axes: list[Axes]
+    :param name: The axis, "x" or "y".
+    :type name: str
+    :return: Whether all the axes show the same limits once shared.
+    :rtype: bool
+    """
+    auto = [getattr(ax, f"get_autoscale{name}_on")() for ax in axes]
+    if all(auto):
+        return True
+    if any(auto):
+        return False
+    return len({getattr(ax, f"get_{name}lim")() for ax in axes}) == 1
+
+
+def _label_outer(ax: Axes, name: str) -> None:
+    """
+    Hide the x (or y) label and tick labels of an axes that is not on the bottom or top row
+    (left or right column) of its grid, as Axes.label_outer does for a single axis.
+
+    :param ax: The axes.
+    :type ax: Axes
+    :param name: The axis, "x" or "y".
+    :type name: str
+    """
+    spec = ax.get_subplotspec()
+    axis = getattr(ax, f"{name}axis")
+    if name == "x":
+        sides = [("bottom", spec.is_last_row()), ("top", spec.is_first_row())]
+    else:
+        sides = [("left", spec.is_first_col()), ("right", spec.is_last_col())]
+    for side, outer in sides:
+        if outer:
+            continue
+        axis.set_tick_params(which="both", **{f"label{side}": False})
+        if axis.get_label_position() == side:
+            axis.set_label_text("")
+
+
+def _share_limits_and_ticks(axes: list[Axes], name: str) -> None:
+    """
+    Give the same limits and ticks to the autoscaled x or y axes of a large grid.
+
+    This replaces matplotlib shared axes, whose cost grows with the square of the number of
+    axes in the group. The ticks are computed once and set as fixed ticks on every axis.
+
+    :param axes: The axes of the grid.
+    :type axes: list[Axes]
+    :param name: The axis to share, "x" or "y".
+    :type name: str
+    """
+    from matplotlib.ticker import FixedLocator
+
+    auto = [ax for ax in axes if getattr(ax, f"get_autoscale{name}_on")()]
+    if not auto:
         return
-    num_groups = len(ax.get_xticks(minor=False))
-    # Determine the number of bars in each group
-    bars_in_group = len(bars) // num_groups
-    patterns = hatches[:bars_in_group]  # set hatch patterns in correct order
-    plot_hatches_list = []  # list for hatches in the order of the bars
-    for h in patterns:  # loop over patterns to create bar-ordered hatches
-        for _ in range(int(len(bars) / len(patterns))):
-            plot_hatches_list.append(h)
-    # loop over bars and hatches to set hatches in correct order
-    for b, hatch in zip(bars, plot_hatches_list):
-        b.set_hatch(hatch)
-        b.set_edgecolor("k")
+    lims = np.array([getattr(ax, f"get_{name}lim")() for ax in auto])
+    lims = (lims.min(), lims.max()) if lims[0, 0] <= lims[0, 1] else (lims.max(), lims.min())
+    first = getattr(auto[0], f"{name}axis")
+    getattr(auto[0], f"set_{name}lim")(lims)
+    ticks = first.get_major_locator()()
+    for ax in auto:
+        getattr(ax, f"set_{name}lim")(lims)
+        getattr(ax, f"{name}axis").set_major_locator(FixedLocator(ticks))
+
+
+def _import_seaborn() -> Any:
+    """
+    Import seaborn on demand, it is only needed for palettes and styles.
+    """
+    import seaborn as sns
+
+    return sns
+
+
+def __getattr__(name: str) -> Any:
+    """
+    Compute the lazy module attributes (e.g. colors) on first access and cache them.
+    """
+    if name in _lazy_attributes:
+        value = _lazy_attributes[name]()
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _kwargs_key(kwargs: Dict[str, Any]) -> tuple:
+    """
+    Convert keyword arguments into a hashable key (lists become tuples, paths strings).
+
+    :param kwargs: The keyword arguments.
+    :type kwargs: Dict[str, Any]
+    :return: A hashable representation of the keyword arguments.
+    :rtype: tuple
+    """
+
+    def _hashable(value: Any) -> Any:
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return tuple(_hashable(v) for v in value)
+        if isinstance(value, dict):
+            return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+        if isinstance(value, plib.PurePath):
+            return str(value)
+        if isinstance(value, np.generic):
+            return value.item()
+        try:
+            hash(value)
+        except TypeError:
+            return repr(value)
+        return value
+
+    return tuple(sorted((k, _hashable(v)) for k, v in kwargs.items()))
+
+
+def _get_axes_state(ax: Axes) -> dict[str, Any]:
+    """
+    Record the labels, limits and tick locators/formatters of an axis.
+    """
+    state = {
+        "xlabel": ax.get_xlabel(),
+        "ylabel": ax.get_ylabel(),
+        "xlim": ax.get_xlim(),
+        "ylim": ax.get_ylim(),
+        "autoscalex_on": ax.get_autoscalex_on(),
+        "autoscaley_on": ax.get_autoscaley_on(),
+    }
+    for name, axis in [("x", ax.xaxis), ("y", ax.yaxis)]:
+        state[f"{name}_tickers"] = (
+            axis.get_major_locator(),
+            axis.get_major_formatter(),
+            axis.get_minor_locator(),
+            axis.get_minor_formatter(),
+        )
+    return state
+
+
+def _set_axes_state(ax: Axes, state: dict[str, Any]) -> None:
+    """
+    Restore the labels, limits and tick locators/formatters recorded by _get_axes_state.
+    """
+    for name, axis in [("x", ax.xaxis), ("y", ax.yaxis)]:
+        major_locator, major_formatter, minor_locator, minor_formatter = state[f"{name}_tickers"]
+        axis.set_major_locator(major_locator)
+        axis.set_major_formatter(major_formatter)
+        axis.set_minor_locator(minor_locator)
+        axis.set_minor_formatter(minor_formatter)
+        axis.reset_ticks()
+    ax.set_xlabel(state["xlabel"])
+    ax.set_ylabel(state["ylabel"])
+    ax.relim()
+    ax.set_xlim(state["xlim"])
+    ax.set_ylim(state["ylim"])
+    ax.set_autoscalex_on(state["autoscalex_on"])
+    ax.set_autoscaley_on(state["autoscaley_on"])
+
+
+def _clear_data_from_ax(ax: Axes) -> None:
+    """
+    Remove the data artists, containers, insets and legend from an axis.
+    """
+    artists = [*ax.lines, *ax.collections, *ax.patches, *ax.images, *ax.texts, *ax.tables]
+    artists += list(ax.artists) + list(ax.child_axes)
+    for artist in artists:
+        artist.remove()
+    ax.containers.clear()
+    if ax.get_legend() is not None:
+        ax.get_legend().remove()
+    ax.set_prop_cycle(None)
+
+
+def _decimate_line(line: Any, n_pixels: int) -> bool:
+    """
+    Downsample a line to at most four points (first, last, min, max) per pixel column.
+
+    Only lines without markers, with the default drawstyle and with monotonic x data
+    and more than four points per pixel column are decimated.
+
+    :param line: The line to decimate.
+    :type line: matplotlib.lines.Line2D
+    :param n_pixels: Number of pixel columns of the axis.
+    :type n_pixels: int
+    :return: True if the line data were changed.
+    :rtype: bool
+    """
+    if line.get_marker() not in (None, "None", "none", "", " "):
+        return False
+    if line.get_drawstyle() != "default":
+        return False
+    x = np.asarray(line.get_xdata(orig=False), dtype=float)
+    y = np.asarray(line.get_ydata(orig=False), dtype=float)
+    if x.size <= 4 * n_pixels or x.size != y.size or np.any(np.diff(x) < 0):
+        return False
+    ax = line.axes
+    transform = ax.xaxis.get_transform()
+    x_view = transform.transform(np.asarray(ax.get_xlim(), dtype=float))
+    x_scaled = transform.transform(x)
+    # pixel column of each point, points outside the view go to two extra columns
+    columns = np.floor((x_scaled - x_view.min()) / np.ptp(x_view) * n_pixels)
+    columns = np.clip(np.nan_to_num(columns, nan=-1), -1, n_pixels).astype(np.int64)
+    keep = _minmax_indices(columns, y)
+    line.set_data(x[keep], y[keep])
+    return True
+
+
+def _minmax_indices(columns: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Return the indices of the first, last, minimum and maximum point of each column.
+
+    :param columns: The non-decreasing column of each point.
+    :type columns: np.ndarray
+    :param y: The values of the points.
+    :type y: np.ndarray
+    :return: The sorted indices of the points to keep, including the ends of NaN gaps.
+    :rtype: np.ndarray
+    """
+    n = y.size
+    starts = np.flatnonzero(np.diff(columns, prepend=columns[0] - 1))
+    counts = np.diff(np.append(starts, n))
+    nan = np.isnan(y)
+    y_low = np.where(nan, np.inf, y)
+    y_high = np.where(nan, -np.inf, y)
+    positions = np.arange(n)
+    mins = np.repeat(np.minimum.reduceat(y_low, starts), counts)
+    maxs = np.repeat(np.maximum.reduceat(y_high, starts), counts)
+    argmins = np.minimum.reduceat(np.where(y_low == mins, positions, n), starts)
+    argmaxs = np.minimum.reduceat(np.where(y_high == maxs, positions, n), starts)
+    # keep the points where the line is interrupted by NaN values and where it resumes
+    previous_nan = np.concatenate([[False], nan[:-1]])
+    gaps = np.flatnonzero(nan != previous_nan)
+    keep = np.unique(np.concatenate([starts, starts + counts - 1, argmins, argmaxs, gaps]))
+    return keep[keep < n]
+
+
+@contextmanager
+def _rasterized_dense_artists(fig: Figure, threshold: int) -> Iterator[None]:
+    """
+    Temporarily rasterize the lines and collections with at least threshold elements.
+
+    In vector outputs these artists are then embedded as images at the save dpi, while
+    axes, texts and legends stay vector.
+
+    :param fig: The figure.
+    :type fig: Figure
+    :param threshold: Minimum number of points, segments or paths of a rasterized artist.
+    :type threshold: int
+    """
+    axes = list(fig.axes)
+    for ax in axes:
+        axes.extend(a for a in ax.child_axes if a not in axes)
+    dense = [
+        artist
+        for ax in axes
+        for artist in [*ax.lines, *ax.collections]
+        if not artist.get_rasterized() and _count_elements(artist) >= threshold
+    ]
+    for artist in dense:
+        artist.set_rasterized(True)
+    try:
+        yield
+    finally:
+        for artist in dense:
+            artist.set_rasterized(False)
+
+
+def _count_elements(artist: Any) -> int:
+    """
+    Return the number of points (lines), cells (meshes) or offsets/paths (collections).
+    """
+    from matplotlib.collections import QuadMesh
+    from matplotlib.lines import Line2D
+
+    if isinstance(artist, Line2D):
+        return len(artist.get_xdata(orig=True))
+    if isinstance(artist, QuadMesh):
+        return int(np.prod(artist.get_coordinates().shape[:2]))
+    return max(len(artist.get_offsets()), len(artist.get_paths()))
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_style_rc(
+    color_palette: Any, n_colors: int | None, sns_style: str, text_font: str, font_size: float
+) -> Mapping[str, Any]:
+    from cycler import cycler
+
+    sns = _import_seaborn()
+    rc = dict(sns.axes_style(sns_style, {"font.family": text_font}))
+    rc["axes.prop_cycle"] = cycler("color", sns.color_palette(color_palette, n_colors))
+    rc["font.size"] = font_size
+    return MappingProxyType(rc)
+
+
+def _get_style_rc(
+    color_palette: Any, n_colors: int | None, sns_style: str, text_font: str, font_size: float
+) -> Mapping[str, Any]:
+    """
+    Return the rcParams of a figure style, computed once per unique style.
+
+    The result is what sns.set_palette, sns.set_style and the font size would set globally.
+
+    :param color_palette: The seaborn palette name or a list of colors.
+    :type color_palette: Any
+    :param n_colors: Number of colors of the palette.
+    :type n_colors: int | None
+    :param sns_style: The seaborn style.
+    :type sns_style: str
+    :param text_font: The font family.
+    :type text_font: str
+    :param font_size: The font size.
+    :type font_size: float
+    :return: The rcParams of the style.
+    :rtype: Mapping[str, Any]
+    """
+    if isinstance(color_palette, (list, np.ndarray)):
+        color_palette = tuple(tuple(c) if not isinstance(c, str) else c for c in color_palette)
+    return _cached_style_rc(color_palette, n_colors, sns_style, text_font, font_size)
+
+
+def _create_first_ticks(ax: Axes) -> None:
+    """
+    Create the first major and minor tick of each axis, so that they get the current style.
+
+    Ticks are created lazily, and those created later copy the properties of the first one.
+    """
+    for axis in (ax.xaxis, ax.yaxis):
+        axis.majorTicks[0]  # pylint: disable=pointless-statement
+        axis.minorTicks[0]  # pylint: disable=pointless-statement
@@ -0,0 +1,142 @@
+"""
+Stream many figures into a single multi-page PDF and a zip of PNG images.
+
+Each figure is exported as soon as it is added and then closed, so memory does not grow
+with the number of figures, and the fonts are embedded once for the whole PDF:
+
+.. code-block:: python
+
+    with FigureReport(out_path / "report.pdf", png_zip_path=out_path / "report.zip") as report:
+        for name, frame in results.items():
+            myfig = MyFigure(filename=name, use_pyplot=False, x_lab="x", y_lab="y")
+            frame.plot(ax=myfig.axs[0])
+            report.add(myfig)  # one PDF page and name.png in the zip, then the figure is closed
+"""
+
+from __future__ import annotations
+import pathlib as plib
+import zipfile
+from typing import TYPE_CHECKING, Any, Mapping
+
+if TYPE_CHECKING:
+    from myfigure.myfigure import MyFigure
+
+
+class FigureReport:
+    """
+    A multi-page PDF and/or a zip of PNG images, written one figure at a time.
+
+    :ivar pdf_path: The path of the PDF, or None.
+    :type pdf_path: pathlib.Path | None
+    :ivar png_zip_path: The path of the zip of PNG images, or None.
+    :type png_zip_path: pathlib.Path | None
+    :ivar n_pages: Number of figures added so far.
+    :type n_pages: int
+    """
+
+    def __init__(
+        self,
+        pdf_path: plib.Path | str | None = None,
+        png_zip_path: plib.Path | str | None = None,
+        dpi: int = 300,
+        tight_layout: bool = True,
+        close_figures: bool = True,
+        metadata: Mapping[str, Any] | None = None,
+    ) -> None:
+        """
+        Open the report outputs.
+
+        :param pdf_path: The path of the multi-page PDF, or None for no PDF.
+        :type pdf_path: pathlib.Path | str | None
+        :param png_zip_path: The path of the zip of PNG images, or None for no zip.
+        :type png_zip_path: pathlib.Path | str | None
+        :param dpi: Resolution of the PNG images and of rasterized artists in the PDF.
+        :type dpi: int
+        :param tight_layout: Crop each page and image to the tight bounding box.
+        :type tight_layout: bool
+        :param close_figures: Close each figure once added, to release its memory.
+        :type close_figures: bool
+        :param metadata: PDF metadata (e.g. Title, Author), see matplotlib PdfPages.
+        :type metadata: Mapping[str, Any] | None
+        :raises ValueError: If neither pdf_path nor png_zip_path is given.
+        """
+        if pdf_path is None and png_zip_path is None:
+            raise ValueError("At least one of pdf_path and png_zip_path must be given.")
+        self.pdf_path = plib.Path(pdf_path) if pdf_path is not None else None
+        self.png_zip_path = plib.Path(png_zip_path) if png_zip_path is not None else None
+        self.dpi = dpi
+        self.tight_layout = tight_layout
+        self.close_figures = close_figures
+        self.n_pages = 0
+        self._pdf = None
+        self._zip = None
+        self._names: set[str] = set()
+        if self.pdf_path is not None:
+            from matplotlib.backends.backend_pdf import PdfPages
+
+            self._pdf = PdfPages(self.pdf_path, metadata=dict(metadata or {}))
+        if self.png_zip_path is not None:
+            # PNG images are already compressed, store them as they are
+            self._zip = zipfile.ZipFile(self.png_zip_path, "w", zipfile.ZIP_STORED)
+
+    def __enter__(self) -> FigureReport:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def add(
+        self, myfig: MyFigure, name: str | None = None, update_all_axis_props: bool = True
+    ) -> None:
+        """
+        Add a figure as a new PDF page and a PNG image in the zip, then close it (unless
+        close_figures is False).
+
+        :param myfig: The figure to add.
+        :type myfig: MyFigure
+        :param name: The name of the PNG image in the zip, defaults to the filename of the
+            figure or to the page number. A suffix is added to repeated names.
+        :type name: str | None
+        :param update_all_axis_props: Apply the post-data updates before exporting.
+        :type update_all_axis_props: bool
+        """
+        if self._pdf is None and self._zip is None:
+            raise ValueError("The report is closed.")
+        buffers = {"pdf": self._pdf} if self._pdf is not None else {}
+        formats = ["png"] if self._zip is not None else []
+        images = myfig.save_figure_to_bytes(
+            formats,
+            buffers=buffers,
+            tight_layout=self.tight_layout,
+            dpi=self.dpi,
+            update_all_axis_props=update_all_axis_props,
+        )
+        if self._zip is not None:
+            self._zip.writestr(f"{self._unique_name(myfig, name)}.png", images["png"])
+        self.n_pages += 1
+        if self.close_figures:
+            myfig.close()
+
+    def close(self) -> None:
+        """
+        Finish the PDF (writing the shared fonts) and the zip. Closing twice is harmless.
+        """
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    def _unique_name(self, myfig: MyFigure, name: str | None) -> str:
+        """
+        Return the name of the PNG image of a figure, unique within the zip.
+        """
+        if name is None:
+            name = myfig.kwargs.get("filename") or f"page_{self.n_pages + 1:04d}"
+        unique, i = name, 1
+        while unique in self._names:
+            i += 1
+            unique = f"{name}_{i}"
+        self._names.add(unique)
+        return unique
@@ -0,0 +1,449 @@
+"""
+A long-lived local render server, with worker processes that keep matplotlib, seaborn and
+myfigure imported and the fonts loaded, and a client to send it figure specs.
+
+Short-lived scripts then pay a round trip of a few milliseconds instead of the interpreter
+start, the imports and the font loading of each new process. Start the server once:
+
+.. code-block:: bash
+
+    python -m myfigure.server --workers 4
+
+and render from any script with a client, using the specs of myfigure.batch:
+
+.. code-block:: python
+
+    with RenderClient() as client:
+        spec = {
+            "kwargs": {"x_lab": "x", "y_lab": "y"},
+            "plots": [{"method": "plot", "data": ["x", "y"]}],
+            "bytes": ["png"],  # return the content instead of saving files
+        }
+        result = client.render(spec, data={"x": x, "y": y})
+        png = result.data["png"]
+
+Large numpy arrays in the data are put in shared memory by the client and read there by the
+worker, so only their names, shapes and dtypes go through the server; the other data is
+pickled and relayed by the server to the worker.
+
+By default the server listens on a Unix socket in a directory private to the current user
+(``$XDG_RUNTIME_DIR``, or a 0700 directory in the temporary directory), and clients refuse
+sockets owned by another user. On platforms without Unix sockets the server listens on
+localhost with a mandatory authkey. The specs, data and results are pickled, so only trusted
+clients and servers must be able to connect.
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import AuthenticationError, resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+from typing import Any, Mapping
+
+import numpy as np
+
+from myfigure.batch import RenderResult, _init_worker, render_spec
+
+_DEFAULT_PORT = 6230
+
+# arrays from this size on are passed to the workers in shared memory instead of pickled
+_SHARED_MIN_BYTES = 1 << 16
+
+
+def default_address() -> str | tuple[str, int]:
+    """
+    Return the default address of the server: a Unix socket in ``$XDG_RUNTIME_DIR`` or in
+    a private directory of the temporary directory, or localhost:6230 without Unix sockets.
+
+    :raises PermissionError: If the private directory is owned by another user or can be
+        accessed by other users.
+    :return: The socket path or the (host, port) pair.
+    :rtype: str | tuple[str, int]
+    """
+    if sys.platform == "win32":
+        return ("127.0.0.1", _DEFAULT_PORT)
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        directory = runtime_dir
+    else:
+        directory = os.path.join(tempfile.gettempdir(), f"myfigure-{os.getuid()}")
+        try:
+            os.mkdir(directory, 0o700)
+        except FileExistsError:
+            pass
+    _check_private(directory, directory_mode=True)
+    return os.path.join(directory, "myfigure.sock")
+
+
+class RenderServer:
+    """
+    A render server with a pool of warm worker processes.
+
+    :ivar address: The address the server listens on.
+    :type address: str | tuple[str, int]
+    :ivar n_requests: Number of specs rendered so far.
+    :type n_requests: int
+    """
+
+    def __init__(
+        self,
+        address: str | tuple[str, int] | None = None,
+        authkey: bytes | None = None,
+        n_workers: int | None = None,
+        warm_up: Mapping[str, Any] | None = None,
+        data: Mapping[str, Any] | None = None,
+    ) -> None:
+        """
+        Create the worker processes and start listening.
+
+        :param address: A Unix socket path or a (host, port) pair, see default_address.
+        :type address: str | tuple[str, int] | None
+        :param authkey: Key that clients must share, required for TCP addresses.
+        :type authkey: bytes | None
+        :param n_workers: Number of worker processes, defaults to the number of CPUs.
+        :type n_workers: int | None
+        :param warm_up: Keyword arguments of myfigure.warm_up, run by each worker at start.
+        :type warm_up: Mapping[str, Any] | None
+        :param data: Data shared by all the specs, sent once to each worker.
+        :type data: Mapping[str, Any] | None
+        """
+        self.address = address if address is not None else default_address()
+        unix = isinstance(self.address, str)
+        if not unix and authkey is None:
+            raise ValueError("An authkey is required to listen on a TCP address.")
+        if unix and os.path.exists(self.address):
+            _remove_stale_socket(self.address)
+        self._authkey = authkey
+        self._counter_lock = threading.Lock()
+        self._n_workers = n_workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(
+            max_workers=self._n_workers,
+            initializer=_init_worker,
+            initargs=(dict(data or {}), "Agg", warm_up),
+        )
+        # start all the workers now, so that the first requests find them warm
+        list(self._executor.map(time.sleep, [0.01] * self._n_workers))
+        # no authkey on the listener: the handshake runs on the client thread, so that a
+        # slow or unauthenticated client does not block the accept loop
+        if unix:
+            umask = os.umask(0o177)  # create the socket readable by the user only
+            try:
+                self._listener = Listener(self.address)
+            finally:
+                os.umask(umask)
+        else:
+            self._listener = Listener(self.address)
+        self._closed = threading.Event()
+        self._serving = False
+        self._close_lock = threading.Lock()
+        self.n_requests = 0
+
+    def __enter__(self) -> RenderServer:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown()
+
+    def serve_forever(self) -> None:
+        """
+        Accept clients until shutdown is called (or a client asks for it), each client is
+        served by its own thread.
+        """
+        self._serving = True
+        try:
+            while not self._closed.is_set():
+                try:
+                    connection = self._listener.accept()
+                except (OSError, EOFError):
+                    continue
+                if self._closed.is_set():
+                    connection.close()
+                    break
+                thread = threading.Thread(
+                    target=self._serve_client, args=(connection,), daemon=True
+                )
+                thread.start()
+        finally:
+            self._close()
+
+    def shutdown(self) -> None:
+        """
+        Stop accepting clients and stop the workers once the pending specs are rendered.
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if not self._serving:
+            self._close()
+            return
+        try:  # wake up the accept call of serve_forever, which then closes the server
+            Client(self.address).close()
+        except OSError:
+            self._close()
+
+    def render(self, spec: Mapping[str, Any]) -> RenderResult:
+        """
+        Render a spec on a worker process.
+
+        :param spec: The figure spec, see myfigure.batch.
+        :type spec: Mapping[str, Any]
+        :return: The result of the rendering.
+        :rtype: RenderResult
+        """
+        with self._counter_lock:
+            index = self.n_requests
+            self.n_requests += 1
+        return self._executor.submit(_render_shared, index, spec).result()
+
+    def _serve_client(self, connection: Any) -> None:
+        """
+        Authenticate a client and answer its requests until it disconnects.
+        """
+        with connection:
+            if self._authkey is not None:
+                try:
+                    deliver_challenge(connection, self._authkey)
+                    answer_challenge(connection, self._authkey)
+                except (AuthenticationError, EOFError, OSError):
+                    return
+            while True:
+                try:
+                    command, *args = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if command == "render":
+                        connection.send(("ok", self.render(*args)))
+                    elif command == "ping":
+                        connection.send(("ok", None))
+                    elif command == "shutdown":
+                        connection.send(("ok", None))
+                        self.shutdown()
+                        return
+                    else:
+                        connection.send(("error", f"Unknown command: {command!r}."))
+                except (EOFError, OSError):
+                    return
+                except Exception as error:  # pylint: disable=broad-except
+                    connection.send(("error", f"{type(error).__name__}: {error}"))
+
+    def _close(self) -> None:
+        with self._close_lock:
+            if self._listener is None:
+                return
+            self._listener.close()
+            self._listener = None
+            self._executor.shutdown()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.remove(self.address)
+
+
+class RenderClient:
+    """
+    A connection to a render server, reused for all the requests.
+    """
+
+    def __init__(
+        self,
+        address: str | tuple[str, int] | None = None,
+        authkey: bytes | None = None,
+        shared_memory: bool = True,
+    ) -> None:
+        """
+        Connect to a render server.
+
+        :param address: The address of the server, see default_address.
+        :type address: str | tuple[str, int] | None
+        :param authkey: The key of the server, if it has one.
+        :type authkey: bytes | None
+        :param shared_memory: Pass large arrays to the workers in shared memory, set it to
+            False for a server on another machine.
+        :type shared_memory: bool
+        :raises PermissionError: If the Unix socket is owned by another user.
+        """
+        address = address if address is not None else default_address()
+        if isinstance(address, str):
+            _check_private(address)
+        self._connection = Client(address, authkey=authkey)
+        self._shared_memory = shared_memory
+
+    def __enter__(self) -> RenderClient:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def render(
+        self, spec: Mapping[str, Any], data: Mapping[str, Any] | None = None
+    ) -> RenderResult:
+        """
+        Render a spec on the server.
+
+        :param spec: The figure spec, see myfigure.batch. Add ``"bytes": ["png"]`` to get
+            the file contents in the result instead of saving files on the server side.
+        :type spec: Mapping[str, Any]
+        :param data: Arrays and dataframes the plotting calls of the spec refer to.
+        :type data: Mapping[str, Any] | None
+        :return: The result of the rendering, with the error if it failed.
+        :rtype: RenderResult
+        """
+        spec = dict(spec)
+        if data:
+            spec["data"] = {**spec.get("data", {}), **data}
+        segments: list[shared_memory.SharedMemory] = []
+        try:
+            if self._shared_memory and spec.get("data"):
+                spec["data"] = {
+                    name: _share_array(value, segments) for name, value in spec["data"].items()
+                }
+            return self._request("render", spec)
+        finally:
+            # the worker has copied the arrays by the time the result arrives
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+
+    def ping(self) -> float:
+        """
+        Return the round trip time to the server, in seconds.
+        """
+        start = time.perf_counter()
+        self._request("ping")
+        return time.perf_counter() - start
+
+    def shutdown_server(self) -> None:
+        """
+        Ask the server to stop.
+        """
+        self._request("shutdown")
+
+    def close(self) -> None:
+        """
+        Close the connection.
+        """
+        self._connection.close()
+
+    def _request(self, command: str, *args: Any) -> Any:
+        self._connection.send((command, *args))
+        status, payload = self._connection.recv()
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+
+@dataclass(frozen=True)
+class _SharedArray:
+    """
+    The shared memory segment holding an array sent by a client.
+    """
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: np.dtype
+
+    def load(self) -> np.ndarray:
+        """
+        Copy the array out of the segment, so that the figure does not keep it mapped.
+        """
+        try:  # Python 3.13+, the segment is unlinked by the client
+            segment = shared_memory.SharedMemory(self.name, track=False)
+        except TypeError:
+            segment = shared_memory.SharedMemory(self.name)
+            if os.name == "posix":
+                resource_tracker.unregister(segment._name, "shared_memory")
+        try:
+            return np.ndarray(self.shape, self.dtype, buffer=segment.buf).copy()
+        finally:
+            segment.close()
+
+
+def _share_array(value: Any, segments: list[shared_memory.SharedMemory]) -> Any:
+    """
+    Put a large numpy array in a new shared memory segment, appended to segments, and return
+    its _SharedArray; return other values unchanged.
+    """
+    if (
+        not isinstance(value, np.ndarray)
+        or value.dtype.hasobject
+        or value.nbytes < _SHARED_MIN_BYTES
+    ):
+        return value
+    segment = shared_memory.SharedMemory(create=True, size=value.nbytes)
+    segments.append(segment)
+    np.ndarray(value.shape, value.dtype, buffer=segment.buf)[...] = value
+    return _SharedArray(segment.name, value.shape, value.dtype)
+
+
+def _render_shared(index: int, spec: Mapping[str, Any]) -> RenderResult:
+    """
+    Render a spec on a worker, after loading its shared arrays.
+    """
+    data = spec.get("data")
+    if data and any(isinstance(value, _SharedArray) for value in data.values()):
+        data = {
+            name: value.load() if isinstance(value, _SharedArray) else value
+            for name, value in data.items()
+        }
+        spec = {**spec, "data": data}
+    return render_spec(index, spec)
+
+
+def _check_private(path: str, directory_mode: bool = False) -> None:
+    """
+    Raise PermissionError if a socket (or, with directory_mode, a directory that must not be
+    accessible to other users) is owned by another user.
+    """
+    stat = os.stat(path)
+    if stat.st_uid != os.getuid():
+        raise PermissionError(f"'{path}' is owned by another user.")
+    if directory_mode and stat.st_mode & 0o077:
+        raise PermissionError(f"'{path}' can be accessed by other users.")
+
+
+def _remove_stale_socket(path: str) -> None:
+    """
+    Remove the socket file of a server that is not running anymore.
+    """
+    _check_private(path)
+    try:
+        Client(path).close()
+    except OSError:
+        os.remove(path)
+        return
+    raise RuntimeError(f"A server is already listening on {path}.")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a local myfigure render server.")
+    parser.add_argument("--address", help="Unix socket path, or host:port for TCP")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--dpi", type=int, default=300, help="dpi to warm up the workers for")
+    args = parser.parse_args(argv)
+
+    address = args.address
+    if address is not None and ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        address = (host, int(port))
+    authkey = os.environ.get("MYFIGURE_AUTHKEY")
+    server = RenderServer(
+        address,
+        authkey=authkey.encode() if authkey else None,
+        n_workers=args.workers,
+        warm_up={"dpi": args.dpi},
+    )
+    print(f"myfigure render server listening on {server.address}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
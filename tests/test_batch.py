@@ -0,0 +1,72 @@
+# %%
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+from myfigure.batch import render_many, RenderResult
+
+
+def _add_title(myfig, data):
+    myfig.axs[0].set_title(f"{len(data['x0'])} points")
+
+
+def _specs(out_path):
+    return [
+        {
+            "kwargs": {"filename": "line", "out_path": out_path, "twinx": True},
+            "plots": [
+                {"method": "plot", "data": ["x0", "y0"], "kwargs": {"label": "y0"}},
+                {
+                    "method": "scatter",
+                    "twinx": True,
+                    "data": ["x0", "y1"],
+                    "kwargs": {"label": "y1"},
+                },
+            ],
+        },
+        {
+            "kwargs": {"filename": "bars", "out_path": out_path},
+            "plots": [
+                {
+                    "method": "dataframe",
+                    "data": ["df_ave"],
+                    "data_kwargs": {"yerr": "df_std"},
+                    "kwargs": {"kind": "bar", "capsize": 2},
+                }
+            ],
+            "save": {"save_as_pdf": True},
+        },
+        {"kwargs": {"filename": "broken", "out_path": out_path, "invalid_arg": 1}},
+    ]
+
+
+def _data():
+    return {
+        "x0": np.linspace(0, 10, 10),
+        "y0": np.linspace(0, 10, 10),
+        "y1": np.linspace(15, 5, 10),
+        "df_ave": pd.DataFrame([[1, 2], [3, 4]], columns=["a", "b"]),
+        "df_std": pd.DataFrame([[0.1, 0.2], [0.3, 0.4]], columns=["a", "b"]),
+    }
+
+
+def test_render_many_process_pool(tmp_path):
+    results = render_many(_specs(tmp_path), _data(), n_workers=2)
+    assert [r.index for r in results] == [0, 1, 2]
+    assert all(isinstance(r, RenderResult) for r in results)
+    assert results[0].ok and results[1].ok
+    assert (tmp_path / "line.png").exists()
+    assert (tmp_path / "bars.pdf").exists()
+    assert results[1].paths == [str(tmp_path / "bars.png"), str(tmp_path / "bars.pdf")]
+    # errors are reported per figure
+    assert not results[2].ok
+    assert "invalid_arg" in results[2].error
+
+
+def test_render_many_in_process_with_callable(tmp_path):
+    spec = _specs(tmp_path)[0]
+    spec["plot"] = _add_title
+    warm_up = {"dpi": 50, "x_lab": r"x$\int^1_2$", "filename": "ignored"}
+    (result,) = render_many([spec], _data(), n_workers=1, warm_up=warm_up)
+    assert result.ok
+    assert result.filename == "line"
+    assert result.duration > 0
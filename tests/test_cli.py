@@ -0,0 +1,86 @@
+from __future__ import annotations
+import json
+import os
+import numpy as np
+import pandas as pd
+from myfigure.cli import is_up_to_date, main, read_spec_file
+
+
+def test_cli_render(tmp_path, capsys):
+    frame = pd.DataFrame({"t": np.arange(20.0), "a": np.arange(20.0) ** 2, "b": np.ones(20)})
+    frame.to_parquet(tmp_path / "run.parquet")
+    frame.to_csv(tmp_path / "run.csv", index=False)
+    np.save(tmp_path / "run.npy", frame.to_numpy())
+    (tmp_path / "lines.toml").write_text(
+        """
+[kwargs]
+x_lab = "t"
+y_lab = "a"
+
+[sources.t]
+path = "run.parquet"
+column = "t"
+
+[sources.a]
+path = "run.npy"
+column = 1
+
+[[plots]]
+method = "plot"
+data = ["t", "a"]
+
+[save]
+dpi = 50
+save_as_pdf = true
+""",
+        encoding="utf-8",
+    )
+    spec = {
+        "kwargs": {"out_path": "out"},
+        "sources": {"frame": {"path": "run.csv", "columns": ["a", "b"]}},
+        "plots": [{"method": "dataframe", "data": ["frame"]}],
+        "save": {"dpi": 50},
+        "figures": [{}, {"kwargs": {"filename": "second", "y_lab": "b"}}],
+    }
+    (tmp_path / "frames.json").write_text(json.dumps(spec), encoding="utf-8")
+    specs = read_spec_file(tmp_path / "frames.json")
+    assert [s["kwargs"]["filename"] for s in specs] == ["frames_0", "second"]
+    assert specs[1]["kwargs"]["y_lab"] == "b" and specs[1]["kwargs"]["out_path"] == tmp_path / "out"
+
+    spec_files = [str(tmp_path / "lines.toml"), str(tmp_path / "frames.json")]
+    assert main(["render", *spec_files, "-j", "2"]) == 0
+    assert "3 rendered, 0 up to date, 0 failed" in capsys.readouterr().out
+    for path in ("lines.png", "lines.pdf", "out/frames_0.png", "out/second.png"):
+        assert (tmp_path / path).exists()
+
+    # the outputs are newer than the specs and data, only the touched data is rendered again
+    os.utime(tmp_path / "run.csv", (1e10, 1e10))
+    assert main(["render", *spec_files, "-j", "1", "-q"]) == 0
+    assert "2 rendered, 1 up to date, 0 failed" in capsys.readouterr().out
+    assert main(["render", *spec_files, "-j", "1", "--force"]) == 0
+    assert "3 rendered, 0 up to date" in capsys.readouterr().out
+
+    (tmp_path / "broken.json").write_text('{"kwargs": {"invalid_arg": 1}}', encoding="utf-8")
+    assert main(["render", str(tmp_path / "broken.json"), str(tmp_path / "missing.json")]) == 1
+    captured = capsys.readouterr()
+    assert "0 rendered, 0 up to date, 1 failed" in captured.out
+    assert "invalid_arg" in captured.err and "missing.json" in captured.err
+
+
+def test_cli_render_from_another_directory(tmp_path, monkeypatch):
+    np.save(tmp_path / "y.npy", np.arange(10.0))
+    spec = {
+        "sources": {"y": {"path": "y.npy"}},
+        "plots": [{"method": "plot", "data": ["y"]}],
+        "save": {"dpi": 50, "out_path": "figures", "filename": "saved"},
+    }
+    (tmp_path / "spec.json").write_text(json.dumps(spec), encoding="utf-8")
+    (tmp_path / "elsewhere").mkdir()
+    monkeypatch.chdir(tmp_path / "elsewhere")
+    (spec,) = read_spec_file("../spec.json")
+    assert spec["save"]["out_path"].resolve() == tmp_path / "figures"
+    assert main(["render", "../spec.json", "-j", "1"]) == 0
+    assert (tmp_path / "figures" / "saved.png").exists()
+    assert not (tmp_path / "elsewhere" / "figures").exists()
+    assert main(["render", "../spec.json", "-j", "1"]) == 0
+    assert is_up_to_date(spec, "../spec.json")
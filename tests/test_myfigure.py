@@ -1,8 +1,18 @@
 # %%
 from __future__ import annotations
+import gc
+import os
+import re
+import subprocess
+import sys
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
 import pytest
-from myfigure.myfigure import MyFigure
+from matplotlib.ticker import MultipleLocator
+from myfigure.myfigure import MyFigure, FigurePool, _minmax_indices
 
 
 def test_myfigure_initialization_with_defaults():
@@ -86,3 +96,724 @@ def test_invalid_kwargs():
 
 
 # %%
+
+
+def test_save_figure_single_draw(tmp_path):
+    fig = MyFigure(filename="single", out_path=tmp_path, twinx=True, x_lab="x")
+    fig.axs[0].plot([0, 1, 2], [0, 1, 4], label="a")
+    fig.axts[0].plot([0, 1, 2], [4, 1, 0], label="b")
+    fig.save_figure(save_as_pdf=True, save_as_svg=True, save_as_tif=True, single_draw=True)
+    for fmt in ["png", "pdf", "svg", "tif"]:
+        assert (tmp_path / f"single.{fmt}").stat().st_size > 0
+    # the png has the same size as the one saved with one draw per format
+    fig.save_figure(filename="multi", update_all_axis_props=False)
+    single = plt.imread(tmp_path / "single.png")
+    multi = plt.imread(tmp_path / "multi.png")
+    assert single.shape == multi.shape
+
+
+@pytest.mark.parametrize("dpi", [50, 150])
+def test_save_figure_single_draw_matches_savefig(tmp_path, dpi):
+    fig = MyFigure(filename="single", out_path=tmp_path, rows=2, cols=2, width=5.3, height=4.1)
+    for ax in fig.axs:
+        ax.plot(np.arange(10), np.arange(10) ** 1.5, label="a")
+    fig.save_figure(dpi=dpi, single_draw=True)
+    fig.save_figure(filename="multi", dpi=dpi, update_all_axis_props=False)
+    single = plt.imread(tmp_path / "single.png")
+    multi = plt.imread(tmp_path / "multi.png")
+    # the crop is aligned with savefig, only the antialiased edges differ (savefig draws the
+    # cropped figure with a sub-pixel offset)
+    assert single.shape == multi.shape
+    assert (np.abs(single - multi).max(axis=2) > 0.05).mean() < 0.03
+
+
+def test_save_figure_single_draw_transparency(tmp_path):
+    fig = MyFigure(filename="transparent", out_path=tmp_path)
+    fig.save_figure(png_transparency=True, single_draw=True)
+    assert plt.imread(tmp_path / "transparent.png")[0, 0, 3] == 0
+    # the background of the figure is restored after saving
+    assert fig.fig.get_facecolor()[3] == 1
+
+
+def test_import_is_lazy():
+    # importing the module must not load the plotting stack
+    code = (
+        "import sys\n"
+        "import myfigure.myfigure\n"
+        "print(' '.join(m for m in ['matplotlib', 'seaborn', 'pandas'] if m in sys.modules))\n"
+        "from myfigure.myfigure import colors\n"
+        "print(len(colors), 'seaborn' in sys.modules)\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+    loaded_modules, palette = out
+    assert loaded_modules == ""
+    assert palette == "30 True"
+    # the import costs little more than numpy, which it needs: the cumulative times of the same
+    # run are compared rather than wall-clock time, so a slow or busy machine does not flake
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import myfigure.myfigure"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    cumulative = {}
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if line.startswith("import time:") and fields[1].strip().isdigit():
+            cumulative[fields[2].strip()] = int(fields[1])
+    assert cumulative["myfigure.myfigure"] < 2 * cumulative["numpy"]
+
+
+def test_reset_keeps_axes_setup():
+    fig = MyFigure(rows=2, twinx=True, x_lab="x", y_lab=["a", "b"], y_lim=(0, 10))
+    fig.axs[0].plot([0, 1, 2], [0, 100, 4], label="a")
+    fig.axs[1].bar([0, 1], [1, 2])
+    fig.axts[1].scatter([0, 1], [3, 4])
+    fig.save_figure(filename="pooled", out_path=None, save_as_png=False)
+    fig.reset()
+    for ax in fig.axs + fig.axts:
+        assert not ax.lines and not ax.patches and not ax.collections and not ax.texts
+        assert ax.get_legend() is None
+    assert [ax.get_ylabel() for ax in fig.axs] == ["a", "b"]
+    assert fig.axs[0].get_ylim() == pytest.approx((-0.5, 10.5))
+    # autoscaling works again on axes without fixed limits
+    fig.axs[0].plot([0, 1], [0, 1])
+    assert fig.axs[0].get_xlim()[1] < 2
+
+
+def test_figure_pool_reuses_and_evicts():
+    pool = FigurePool(max_size=1)
+    fig = pool.acquire(filename="a", x_lab="x")
+    fig.axs[0].plot([0, 1], [0, 1])
+    pool.release(fig)
+    reused = pool.acquire(filename="b", x_lab="x")
+    assert reused is fig
+    assert reused.kwargs["filename"] == "b"
+    assert not reused.axs[0].lines
+    assert (pool.hits, pool.misses) == (1, 1)
+    other = pool.acquire(x_lab="y")
+    assert other is not fig and pool.misses == 2
+    pool.release(reused)
+    pool.release(other)  # the pool is full, the least recently used figure is closed
+    assert len(pool) == 1
+    assert pool.acquire(x_lab="y") is other
+    with pytest.raises(ValueError):
+        pool.release(MyFigure())
+    # a figure closed before being released is dropped from the pool
+    closed = pool.acquire(x_lab="z")
+    closed.close()
+    pool.release(closed)
+    assert len(pool) == 0
+    with pytest.raises(ValueError):
+        pool.release(closed)
+
+
+def test_figure_pool_ownership():
+    pool, other_pool = FigurePool(), FigurePool()
+    fig = pool.acquire(x_lab="x")
+    # the owner is stored on the figure, not looked up by id
+    with pytest.raises(ValueError):
+        other_pool.release(fig)
+    pool.release(fig)
+    with pytest.raises(ValueError):
+        pool.release(fig)
+    assert len(pool) == 1
+    pool.clear()
+    with pytest.raises(ValueError):
+        pool.release(fig)
+
+
+def test_figure_pool_threads():
+    pool = FigurePool(max_size=4)
+
+    def work(i):
+        for _ in range(5):
+            fig = pool.acquire(x_lab="x")
+            fig.axs[0].plot([0, 1], [0, i])
+            pool.release(fig)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(work, range(4)))
+    assert pool.hits + pool.misses == 20
+    assert pool.misses <= 4 and len(pool) == pool.misses
+    assert len({id(fig) for figs in pool._idle.values() for fig in figs}) == len(pool)
+
+
+def test_annotate_outliers():
+    df_ave = pd.DataFrame([[1, 2, 3, 4, 5], [6, 5, 4, 3, 2]], columns=["1", "2", "3", "4", "5a"])
+    df_std = pd.DataFrame(
+        [[0.1, 0.2, 0.3, 0.4, 0.5], [0.6, 0.65, 0.4, 0.3, 0.2]], columns=df_ave.columns
+    )
+    fig = MyFigure(y_lim=[-3, 0], annotate_outliers=True, legend=False)
+    df_ave.mul(-1).plot(ax=fig.axs[0], kind="bar", yerr=df_std, capsize=2)
+    fig.update_axes_props_post_data()
+    texts = [(t.get_text(), t.xy[0], t.xyann[1]) for t in fig.axs[0].texts]
+    expected = [
+        ("-4.00$\\pm$0.40", 0.1, 0.02),
+        ("-5.00$\\pm$0.50", 0.2, 0.06),
+        ("-6.00$\\pm$0.60", 0.8, 0.02),
+        ("-5.00$\\pm$0.65", 0.9, 0.10),
+        ("-4.00$\\pm$0.40", 1.0, 0.06),
+    ]
+    assert [t[0] for t in texts] == [e[0] for e in expected]
+    positions = [coord for t in texts for coord in t[1:]]
+    assert positions == pytest.approx([coord for e in expected for coord in e[1:]])
+
+
+def test_bar_index_shared_and_refreshed():
+    df_ave = pd.DataFrame([[1, 2, 3], [6, 5, 4]], columns=["a", "b", "c"])
+    fig = MyFigure(y_lim=[0, 4], annotate_outliers=True, mask_insignificant_data=True)
+    df_ave.plot(ax=fig.axs[0], kind="bar", yerr=df_ave * 0.5)
+    ax = fig.axs[0]
+    fig.update_axes_props_post_data()
+    bar_index = fig._get_bar_index(ax, 0)
+    assert bar_index is fig._bar_indexes[ax]
+    assert bar_index.series_ids.tolist() == [0, 0, 1, 1, 2, 2]
+    assert bar_index.group_ids.tolist() == [0, 1, 0, 1, 0, 1]
+    assert bar_index.std == pytest.approx(bar_index.heights * 0.5)
+    # the index is reused while the artists do not change
+    fig.update_axes_props_post_data()
+    assert fig._get_bar_index(ax, 0) is bar_index
+    ax.bar([2], [1])
+    assert fig._get_bar_index(ax, 0) is not bar_index
+    # bars moved or resized in place are read again
+    bar_index = fig._get_bar_index(ax, 0)
+    ax.patches[0].set_height(9)
+    refreshed = fig._get_bar_index(ax, 0)
+    assert refreshed is not bar_index and refreshed.heights[0] == 9
+    ax.patches[1].set_x(5)
+    assert fig._get_bar_index(ax, 0) is not refreshed
+    # removed artists are not kept alive by the index
+    bar_index = fig._get_bar_index(ax, 0)
+    removed = weakref.ref(ax.containers[-1].patches[0])
+    ax.containers[-1].remove()
+    del bar_index, refreshed
+    fig._get_bar_index(ax, 0)
+    gc.collect()
+    assert removed() is None
+
+
+def test_minmax_indices():
+    columns = np.array([0, 0, 0, 0, 0, 1, 1, 1, 2])
+    y = np.array([3.0, 1.0, 5.0, 2.0, 4.0, np.nan, 7.0, 6.0, 0.0])
+    # first, min, max and last of each column, plus where the NaN gap starts and ends
+    assert _minmax_indices(columns, y).tolist() == [0, 1, 2, 4, 5, 6, 7, 8]
+
+
+def test_decimate_lines_while_saving(tmp_path):
+    x = np.linspace(0, 10, 50_000)
+    y = np.sin(x) + np.random.default_rng(0).normal(0, 0.1, x.size)
+    fig = MyFigure(filename="decimated", out_path=tmp_path, decimate_lines=[True, False], rows=2)
+    line = fig.axs[0].plot(x, y)[0]
+    other = fig.axs[1].plot(x, y)[0]
+    with fig._decimated_lines(dpi=100):
+        x_dec, y_dec = line.get_xdata(), line.get_ydata()
+        assert len(x_dec) < 4 * 600
+        assert y_dec.min() == y.min() and y_dec.max() == y.max()
+        assert len(other.get_xdata()) == x.size
+    fig.save_figure(dpi=100)
+    # the original data are restored after saving
+    assert len(line.get_xdata()) == x.size
+    assert (tmp_path / "decimated.png").exists()
+
+
+def test_rasterize_dense_artists_in_vector_output(tmp_path):
+    rng = np.random.default_rng(0)
+    fig = MyFigure(filename="dense", out_path=tmp_path, rasterize_threshold=1000)
+    dense = fig.axs[0].scatter(rng.normal(size=5000), rng.normal(size=5000), s=1)
+    sparse = fig.axs[0].plot([0, 1], [0, 1])[0]
+    fig.save_figure(save_as_png=False, save_as_svg=True)
+    svg = (tmp_path / "dense.svg").read_text()
+    assert svg.count("<image") == 1  # only the scatter is embedded as an image
+    assert not dense.get_rasterized() and not sparse.get_rasterized()
+    with pytest.raises(ValueError):
+        MyFigure(rasterize_threshold=0)
+
+
+def test_scoped_style_leaves_rcparams_untouched():
+    before = dict(plt.rcParams)
+    fig = MyFigure(scoped_style=True, text_font_size=17, sns_style="whitegrid")
+    assert dict(plt.rcParams) == before
+    assert fig.axs[0].xaxis.get_label().get_fontsize() == 17
+    with fig.style_context():
+        assert plt.rcParams["font.size"] == 17
+    assert plt.rcParams["font.size"] == before["font.size"]
+
+
+def test_scoped_style_in_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    from matplotlib.colors import to_hex
+
+    palettes = {"deep": "#4c72b0", "muted": "#4878d0", "dark": "#001c7f"}
+
+    def first_color(palette):
+        fig = MyFigure(scoped_style=True, color_palette=palette)
+        with fig.style_context():
+            line = fig.axs[0].plot([0, 1], [0, 1])[0]
+        plt.close(fig.fig)
+        return to_hex(line.get_color())
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        colors = list(executor.map(first_color, list(palettes) * 4))
+    assert colors == list(palettes.values()) * 4
+
+
+def test_style_context_is_shared_by_threads_with_the_same_style():
+    import threading
+
+    figs = [MyFigure(scoped_style=True, text_font_size=13, use_pyplot=False) for _ in range(2)]
+    other = MyFigure(scoped_style=True, text_font_size=7, use_pyplot=False)
+    barrier = threading.Barrier(2, timeout=10)
+
+    def inside(fig):
+        with fig.style_context():
+            barrier.wait()  # both threads are in their context at the same time
+            with other.style_context():  # nested once the other thread has left
+                assert plt.rcParams["font.size"] == 7
+            return plt.rcParams["font.size"]
+
+    before = plt.rcParams["font.size"]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert list(executor.map(inside, figs)) == [13, 13]
+    assert plt.rcParams["font.size"] == before
+
+
+def test_pyplot_free_figure_is_released(tmp_path):
+    import gc
+    import weakref
+
+    fignums = plt.get_fignums()
+    with MyFigure(filename="nopyplot", out_path=tmp_path, use_pyplot=False, rows=2) as fig:
+        fig.axs[1].plot([0, 1], [0, 1])
+        assert plt.get_fignums() == fignums
+        fig.save_figure()
+        ref = weakref.ref(fig.fig)
+    assert fig.fig is None
+    fig.close()  # closing again has no effect
+    gc.collect()
+    assert ref() is None
+    assert (tmp_path / "nopyplot.png").exists()
+
+    fig = MyFigure(filename="pyplot", out_path=tmp_path)
+    assert fig.fig.number in plt.get_fignums()
+    fig.save_figure(close=True)
+    assert plt.get_fignums() == fignums
+
+
+def test_save_figure_async(tmp_path):
+    from myfigure.myfigure import wait_all
+
+    futures = []
+    for i in range(4):
+        fig = MyFigure(filename=f"async{i}", out_path=tmp_path, use_pyplot=False)
+        fig.axs[0].plot([0, 1], [0, i])
+        futures.append(fig.save_figure_async(save_as_pdf=True, dpi=50, close=i % 2 == 0))
+        if i % 2:
+            fig.reset()  # the figure can be reused while it is being written
+            fig.axs[0].plot([0, 1], [1, 0])
+            fig.close()
+    wait_all()
+    for i, future in enumerate(futures):
+        assert future.result() == [tmp_path / f"async{i}.png", tmp_path / f"async{i}.pdf"]
+        assert (tmp_path / f"async{i}.pdf").read_bytes().startswith(b"%PDF")
+    sync = MyFigure(filename="sync", out_path=tmp_path, use_pyplot=False)
+    sync.axs[0].plot([0, 1], [0, 3])
+    sync.save_figure(dpi=50, single_draw=True)
+    assert (tmp_path / "sync.png").read_bytes() == (tmp_path / "async3.png").read_bytes()
+
+
+def test_save_figure_to_bytes(tmp_path):
+    import io
+
+    fig = MyFigure(filename="mem", out_path=tmp_path, use_pyplot=False)
+    fig.axs[0].plot([0, 1], [0, 1])
+    fig.save_figure(save_as_svg=True, dpi=50, single_draw=True)
+    buffer = io.BytesIO()
+    images = fig.save_figure_to_bytes(["png", "svg"], buffers={"pdf": buffer}, dpi=50)
+    assert set(images) == {"png", "svg"}
+    assert bytes(images["png"]) == (tmp_path / "mem.png").read_bytes()
+    assert bytes(images["svg"]).startswith(b"<?xml")
+    assert buffer.getvalue().startswith(b"%PDF")
+    with pytest.raises(ValueError):
+        fig.save_figure_to_bytes("jpg")
+
+
+def test_live_update_with_blitting():
+    fig = MyFigure(rows=2, twinx=True, legend=False, use_pyplot=False, width=4, height=4)
+    x = np.arange(100.0)
+    line = fig.axs[0].plot(x, np.sin(x / 10))[0]
+    points = fig.axts[1].scatter(x, np.cos(x / 10))
+    fig.start_live({"line": line, "points": points})
+    assert line.get_animated() and points.get_animated()
+    fig.update("line", x, np.cos(x / 10), redraw=False)
+    fig.update("points", x, np.sin(x / 10))
+    assert np.array_equal(line.get_ydata(), np.cos(x / 10))
+    blitted = np.asarray(fig.fig.canvas.buffer_rgba()).copy()
+    fig.redraw(full=True)
+    assert np.array_equal(blitted, np.asarray(fig.fig.canvas.buffer_rgba()))
+    fig.update("line", x, 10 * np.cos(x / 10), rescale=True)
+    assert fig.axs[0].get_ylim()[1] > 9
+    with pytest.raises(KeyError):
+        fig.update("missing", x, x)
+    fig.stop_live()
+    assert not line.get_animated()
+    fig.close()
+
+
+def test_live_mode_survives_exports(tmp_path):
+    fig = MyFigure(filename="live", out_path=tmp_path, legend=False, use_pyplot=False)
+    x = np.arange(100.0)
+    line = fig.axs[0].plot(x, np.sin(x / 10))[0]
+    fig.start_live({"line": line})
+    fig.save_figure(save_as_pdf=True, save_as_svg=True, dpi=50)
+    fig.save_figure(save_as_pdf=True, dpi=50, single_draw=True)
+    # the exports include the live series and the background is kept at the canvas dpi
+    assert (tmp_path / "live.svg").read_bytes().count(b"<path") > 1
+    assert line.get_animated() and fig.fig.dpi == 100
+    fig.update("line", x, np.cos(x / 10))
+    blitted = np.asarray(fig.fig.canvas.buffer_rgba()).copy()
+    fig.redraw(full=True)
+    assert np.array_equal(blitted, np.asarray(fig.fig.canvas.buffer_rgba()))
+    single = fig.save_figure_to_bytes(["png"], dpi=50)["png"]
+    fig.stop_live()
+    assert fig.save_figure_to_bytes(["png"], dpi=50)["png"] == single
+    fig.close()
+
+
+def test_stats_and_hooks(tmp_path):
+    from myfigure.myfigure import add_stats_hook, remove_stats_hook
+
+    assert MyFigure(use_pyplot=False).stats is None
+    events = []
+    hook = add_stats_hook(lambda myfig, metric, value: events.append((metric, value)))
+    try:
+        fig = MyFigure(filename="stats", out_path=tmp_path, use_pyplot=False, collect_stats=True)
+        pd.DataFrame([[1, 2], [3, 4]]).plot(ax=fig.axs[0], kind="bar")
+        fig.save_figure(save_as_pdf=True, dpi=50)
+        png_sizes = [(tmp_path / "stats.png").stat().st_size]
+        fig.save_figure(save_as_pdf=True, dpi=50, single_draw=True)
+        png_sizes.append((tmp_path / "stats.png").stat().st_size)
+    finally:
+        remove_stats_hook(hook)
+    stats = fig.stats
+    for stage in ["create_figure", "update_axes_props_post_data", "hatches", "legend"]:
+        assert stats.times[stage] > 0
+    assert stats.calls["save_figure"] == 2
+    assert stats.calls["savefig.png"] == stats.calls["savefig.pdf"] == 1
+    assert stats.calls["render"] == stats.calls["write"] == 1
+    # savefig draws twice per format (layout pass and output), the single draw once per format
+    assert stats.draws == 4 + 2
+    assert stats.bytes_written["png"] == sum(png_sizes)
+    assert [value for metric, value in events if metric == "bytes.png"] == png_sizes
+    assert sum(value for metric, value in events if metric == "draws") == stats.draws
+    assert stats.as_dict()["draws"] == stats.draws
+
+
+def test_single_draw_vector_only(tmp_path):
+    fig = MyFigure(filename="vector", out_path=tmp_path, twinx=True, collect_stats=True)
+    fig.axs[0].plot([0, 1, 2], [0, 1, 4], label="a")
+    fig.save_figure(save_as_png=False, save_as_pdf=True, save_as_svg=True, single_draw=True)
+    # one draw without output for the layout and the tight box, then one per format
+    assert fig.stats.draws == 1 + 2
+    fig.save_figure(
+        filename="multi", save_as_png=False, save_as_svg=True, update_all_axis_props=False
+    )
+    assert fig.stats.draws == 3 + 2
+    sizes = [
+        re.search(rb'width="[\d.]+pt" height="[\d.]+pt"', (tmp_path / f"{name}.svg").read_bytes())
+        for name in ("vector", "multi")
+    ]
+    assert sizes[0].group() == sizes[1].group()
+
+
+def test_large_grid(tmp_path):
+    fig = MyFigure(
+        filename="grid",
+        out_path=tmp_path,
+        rows=3,
+        cols=3,
+        twinx=True,
+        large_grid=True,
+        use_pyplot=False,
+        collect_stats=True,
+        x_lab="x",
+        y_lab="y",
+    )
+    assert fig.fig.get_layout_engine() is None
+    for i, ax in enumerate(fig.axs):
+        ax.plot([0, 1 + i], [0, i], label="a")
+        fig.axts[i].plot([0, 1], [0, -i], label="b")
+    fig.save_figure(dpi=50)
+    assert fig.axs[4].get_xlabel() == "" and fig.axs[6].get_xlabel() == "x"
+    assert fig.axs[4].get_ylabel() == "" and fig.axs[3].get_ylabel() == "y"
+    assert len({ax.get_xlim() for ax in fig.axs}) == 1
+    assert len({ax.get_ylim() for ax in fig.axts}) == 1
+    assert list(fig.axs[0].get_xticks()) == list(fig.axs[8].get_xticks())
+    assert all(ax.get_legend() is None for ax in fig.axs)
+    assert [t.get_text() for t in fig.fig.legends[0].get_texts()] == ["a", "b"]
+    assert "align_labels" not in fig.stats.times and fig.stats.draws == 1
+
+
+def test_large_grid_keeps_labels_of_different_limits():
+    fig = MyFigure(
+        rows=2,
+        cols=2,
+        large_grid=True,
+        use_pyplot=False,
+        x_lab="x",
+        y_lab="y",
+        y_lim=[(0, 1), (0, 2), (0, 3), (0, 4)],
+    )
+    for i, ax in enumerate(fig.axs):
+        ax.plot([0, 1 + i], [0, 1])
+    fig.save_figure(filename="grid", out_path=None, save_as_png=False)
+    # the x limits are shared, the y limits differ so every axes keeps its y labels
+    assert [ax.get_xlabel() for ax in fig.axs] == ["", "", "x", "x"]
+    assert len({ax.get_xlim() for ax in fig.axs}) == 1
+    assert [ax.get_ylabel() for ax in fig.axs] == ["y"] * 4
+    assert [ax.get_ylim() for ax in fig.axs] == [
+        pytest.approx(lims) for lims in [(-0.05, 1.05), (-0.1, 2.1), (-0.15, 3.15), (-0.2, 4.2)]
+    ]
+    assert all(ax.yaxis.get_tick_params()["labelleft"] for ax in fig.axs)
+    assert not fig.axs[0].xaxis.get_tick_params()["labelbottom"]
+
+
+def test_figure_spec(tmp_path):
+    import pickle
+    from myfigure.myfigure import FigureSpec
+
+    spec = FigureSpec(rows=2, x_lab=["a", "b"], x_lim=[0, 1], use_pyplot=False)
+    assert spec == FigureSpec(rows=2, x_lab=("a", "b"), x_lim=(0, 1), use_pyplot=False)
+    assert hash(spec) == hash(pickle.loads(pickle.dumps(spec)))
+    assert spec.kwargs["x_lim"] == (0, 1) and spec.broad_props["x_lab"] == ("a", "b")
+    with pytest.raises(AttributeError):
+        spec.kwargs = {}
+    with pytest.raises(TypeError):
+        spec.kwargs["rows"] = 3
+    with pytest.raises(ValueError):
+        FigureSpec(rows=2, x_lab=["a"])
+
+    fig = MyFigure(spec, filename="spec", out_path=tmp_path)
+    reference = MyFigure(rows=2, x_lab=["a", "b"], x_lim=[0, 1], use_pyplot=False)
+    assert fig.kwargs["out_path"] == tmp_path and fig.kwargs["filename"] == "spec"
+    assert [ax.get_xlabel() for ax in fig.axs] == ["a", "b"]
+    assert fig.axs[1].get_xlim() == reference.axs[1].get_xlim()
+    assert MyFigure(spec, twinx=True).axts is not None  # other options replace the spec ones
+    assert "rows=2" in repr(spec) and "cols" not in repr(spec)
+
+    pool = FigurePool()
+    first = pool.acquire(spec, filename="a")
+    pool.release(first)
+    assert pool.acquire(spec.replace(), filename="b") is first and pool.hits == 1
+
+
+def test_render_cache(tmp_path, monkeypatch):
+    import myfigure.cache
+    from myfigure.cache import RenderCache
+
+    cache = RenderCache(tmp_path / "cache")
+
+    def make(y, filename):
+        myfig = MyFigure(filename=filename, out_path=tmp_path, use_pyplot=False, x_lab="x")
+        myfig.axs[0].plot([0, 1, 2], y, label="y")
+        return myfig
+
+    first = make([0, 1, 0], "a").save_figure(save_as_pdf=True, dpi=50, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+    second = make([0, 1, 0], "b").save_figure(save_as_pdf=True, dpi=50, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert [p.read_bytes() for p in first] == [p.read_bytes() for p in second]
+    make([0, 2, 0], "c").save_figure(dpi=50, cache=cache)  # the data changed
+    make([0, 1, 0], "d").save_figure(dpi=60, cache=cache)  # the options changed
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    # an entry evicted between the lookup and the copy is a miss, and the figure is drawn
+    def evicted_before_copy(source, target, link):
+        monkeypatch.undo()
+        os.remove(source)
+        replace_file(source, target, link)
+
+    replace_file = myfigure.cache._replace_file
+    monkeypatch.setattr(myfigure.cache, "_replace_file", evicted_before_copy)
+    (path,) = make([0, 1, 0], "e").save_figure(dpi=60, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 4)
+    assert path.read_bytes() == (tmp_path / "d.png").read_bytes()
+
+    newest = max(cache.directory.iterdir(), key=lambda p: p.stat().st_mtime_ns)
+    small = RenderCache(cache.directory, max_bytes=newest.stat().st_size)
+    small.evict()
+    assert list(small.directory.iterdir()) == [newest]
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda ax: ax.tick_params(labelsize=20),
+        lambda ax: ax.spines["top"].set_visible(False),
+        lambda ax: ax.xaxis.set_major_locator(MultipleLocator(0.25)),
+        lambda ax: ax.grid(True),
+        lambda ax: ax.minorticks_on(),
+        lambda ax: ax.set_aspect("equal"),
+    ],
+)
+def test_render_cache_key_changes(tmp_path, change):
+    from myfigure.cache import RenderCache
+
+    cache = RenderCache(tmp_path)
+
+    def key(changed):
+        myfig = MyFigure(use_pyplot=False)
+        ax = myfig.axs[0]
+        ax.plot([0, 1, 2], [0, 1, 0])
+        ax.xaxis.set_major_locator(MultipleLocator(0.5))
+        if changed:
+            change(ax)
+        return cache.key(myfig)
+
+    assert key(False) == key(False)
+    assert key(True) != key(False)
+    # drawing the figure (layout, tick locations of the formatters) does not change the key
+    myfig = MyFigure(use_pyplot=False, rows=2)
+    myfig.axs[0].plot([1, 2, 3], [1, 10, 100])
+    change(myfig.axs[0])
+    before = cache.key(myfig)
+    myfig.save_figure_to_bytes(["png"], dpi=30, update_all_axis_props=False)
+    assert cache.key(myfig) == before
+
+
+def test_render_cache_evicts_without_scanning_each_store(tmp_path, monkeypatch):
+    from myfigure.cache import RenderCache
+
+    cache = RenderCache(tmp_path / "cache", max_bytes=2500)
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda *args: scans.append(1) or evict(*args))
+    for i in range(10):
+        path = tmp_path / f"{i}.png"
+        path.write_bytes(bytes(1000))
+        cache.store(f"key{i}", {"png": path})
+    # the first store scans the directory, then the stores that exceed max_bytes reduce the
+    # cache to 3/4 of it, which leaves room for the next store
+    assert len(scans) == 5
+    assert sum(p.stat().st_size for p in cache.directory.iterdir()) <= 2500
+
+
+def test_native_bar():
+    ave = pd.DataFrame({"a": [1.0, 5.0, 0.5], "b": [0.2, 0.4, 0.6]}, index=["x", "y", "z"])
+    std = pd.DataFrame({"a": [0.1, 0.2, 0.1], "b": [0.3, 0.1, 0.7]}, index=ave.index)
+    props = dict(use_pyplot=False, y_lim=(0, 2), annotate_outliers=True)
+    props.update(mask_insignificant_data=True)
+
+    native = MyFigure(**props)
+    native.bar(0, ave, std)
+    native.update_axes_props_post_data()
+    reference = MyFigure(**props)
+    ave.plot(ax=reference.axs[0], kind="bar", yerr=std, capsize=2)
+    reference.update_axes_props_post_data()
+
+    def summary(myfig):
+        ax = myfig.axs[0]
+        return (
+            [(round(b.get_x() + b.get_width() / 2, 6), b.get_height()) for b in ax.patches],
+            [(b.get_hatch(), b.get_alpha()) for b in ax.patches],
+            [t.get_text() for t in ax.texts],
+            [t.get_text() for t in ax.get_xticklabels()],
+        )
+
+    assert summary(native) == summary(reference)
+    bar_index = native._bar_indexes[native.axs[0]]
+    assert list(bar_index.std) == [0.1, 0.2, 0.1, 0.3, 0.1, 0.7]
+
+    native.bar(0, [0.1, 0.2, 0.3], labels=["c"])
+    bar_index = native._get_bar_index(native.axs[0], 0)
+    assert bar_index.n_series == 3 and bar_index.heights[-1] == 0.3
+    with pytest.raises(ValueError):
+        native.bar(0, ave, std.iloc[:2])
+
+
+def test_figure_report(tmp_path):
+    import zipfile
+    from myfigure.report import FigureReport
+
+    with FigureReport(tmp_path / "report.pdf", png_zip_path=tmp_path / "report.zip", dpi=50) as r:
+        for i in range(3):
+            myfig = MyFigure(filename="fig", use_pyplot=False, x_lab=r"$\int^1_2$")
+            myfig.axs[0].plot([0, 1], [0, i])
+            r.add(myfig)
+            assert myfig.fig is None
+    pdf = (tmp_path / "report.pdf").read_bytes()
+    assert pdf.count(b"/Type /Page") - pdf.count(b"/Type /Pages") == 3
+    with zipfile.ZipFile(tmp_path / "report.zip") as bundle:
+        assert bundle.namelist() == ["fig.png", "fig_2.png", "fig_3.png"]
+        assert bundle.read("fig.png").startswith(b"\x89PNG")
+    with pytest.raises(ValueError):
+        r.add(MyFigure(use_pyplot=False))
+
+
+def test_warm_up():
+    from myfigure.myfigure import warm_up
+
+    open_figures = plt.get_fignums()
+    spent = warm_up(dpi=[50, 60], texts=[r"$\alpha$"], rows=2, x_lab=r"x$\int^1_2$", filename="f")
+    assert spent > 0 and plt.get_fignums() == open_figures
+
+
+def test_raster_encoding(tmp_path):
+    import io
+    from PIL import Image
+
+    myfig = MyFigure(use_pyplot=False)
+    myfig.axs[0].plot(np.linspace(0, 1, 50), np.random.default_rng(0).random(50))
+    fast = myfig.save_figure_to_bytes("png", dpi=80, png_compress_level=1)["png"]
+    small = myfig.save_figure_to_bytes("png", dpi=80, png_compress_level=9)["png"]
+    parallel = myfig.save_figure_to_bytes("png", dpi=80, encode_workers=3)["png"]
+    assert len(fast) > len(small)
+    pixels = np.asarray(Image.open(io.BytesIO(small)))
+    with Image.open(io.BytesIO(parallel)) as image:
+        assert image.info["dpi"][0] == pytest.approx(80, abs=0.1)
+        assert np.array_equal(np.asarray(image), pixels)
+
+    raw, lzw = (
+        myfig.save_figure_to_bytes("tif", dpi=80, tif_compression=c)["tif"] for c in (None, "lzw")
+    )
+    assert len(lzw) < len(raw)
+    (path,) = myfig.save_figure(
+        filename="q", out_path=tmp_path, dpi=80, quantize_colors=16, png_compress_level=9
+    )
+    with Image.open(path) as image:
+        assert image.mode == "P" and len(path.read_bytes()) < len(small)
+    with pytest.raises(ValueError):
+        myfig.save_figure_to_bytes("tif", tif_compression="jpeg2000")
+
+
+def test_plot_columns(tmp_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    n = 200_000
+    x = np.linspace(0, 10, n)
+    y = np.sin(x) + np.random.default_rng(0).normal(0, 0.1, n)
+    y[1000] = 5  # a spike that must survive the reduction
+    table = pa.table({"x": x, "y": y, "z": -y})
+    pq.write_table(table, tmp_path / "data.parquet", row_group_size=n // 4)
+    np.save(tmp_path / "data.npy", np.column_stack([x, y]))
+
+    myfig = MyFigure(use_pyplot=False)
+    lines = myfig.plot_columns(0, tmp_path / "data.parquet", ["y", "z"], x="x", chunk_rows=30_000)
+    lines += myfig.plot_columns(0, tmp_path / "data.npy", 1, x=0, dpi=100, label="npy")
+    lines += myfig.plot_columns(0, {"y": y}, "y", chunk_rows=50_000)
+    assert [line.get_label() for line in lines] == ["y", "z", "npy", "y"]
+    for line, sign in zip(lines, [1, -1, 1, 1]):
+        ys = line.get_ydata()
+        assert ys.size < n // 10
+        assert ys.max() == (y * sign).max() and ys.min() == (y * sign).min()
+    assert lines[0].get_xdata()[0] == 0 and lines[0].get_xdata()[-1] == 10
+    assert lines[3].get_xdata()[-1] == n - 1
+    # numpy integers are accepted as column indices
+    (line,) = myfig.plot_columns(0, tmp_path / "data.npy", np.int64(1), x=np.int64(0), dpi=100)
+    assert line.get_label() == "1"
+    assert np.array_equal(line.get_xydata(), lines[2].get_xydata())
+    with pytest.raises(ValueError):
+        myfig.plot_columns(0, {"x": x[::-1], "y": y}, "y", x="x")
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import os
+import socket
+import tempfile
+import threading
+from multiprocessing import AuthenticationError, shared_memory
+import numpy as np
+import pytest
+from myfigure.server import RenderClient, RenderServer, default_address
+
+
+def test_render_server(tmp_path):
+    address = str(tmp_path / "myfigure.sock")
+    server = RenderServer(address, n_workers=1, warm_up={"dpi": 50})
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with RenderClient(address) as client:
+            assert client.ping() < 1
+            spec = {
+                "kwargs": {"x_lab": "x"},
+                "plots": [{"method": "plot", "data": ["x", "y"]}],
+                "save": {"dpi": 50},
+                "bytes": ["png", "svg"],
+            }
+            result = client.render(spec, data={"x": np.arange(10), "y": np.arange(10) ** 2})
+            assert result.ok, result.error
+            assert result.data["png"].startswith(b"\x89PNG") and b"<svg" in result.data["svg"]
+
+            spec = {"kwargs": {"filename": "f", "out_path": tmp_path}, "save": {"dpi": 50}}
+            assert client.render(spec).paths == [str(tmp_path / "f.png")]
+            assert not client.render({"kwargs": {"invalid_arg": 1}}).ok
+            with pytest.raises(RuntimeError):
+                client._request("unknown")
+            client.shutdown_server()
+        thread.join(timeout=30)
+        assert not thread.is_alive()
+        assert not (tmp_path / "myfigure.sock").exists()
+    finally:
+        server.shutdown()
+
+
+def test_render_server_shares_large_arrays(tmp_path, monkeypatch):
+    address = str(tmp_path / "myfigure.sock")
+    relayed = []
+    render = RenderServer.render
+
+    def spy(self, spec):
+        relayed.append(spec["data"])
+        return render(self, spec)
+
+    monkeypatch.setattr(RenderServer, "render", spy)
+    server = RenderServer(address, n_workers=1, warm_up={"dpi": 50})
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        x = np.linspace(0, 1, 100_000)
+        spec = {
+            "plots": [{"method": "plot", "data": ["x", "y"]}],
+            "save": {"dpi": 50},
+            "bytes": ["png"],
+        }
+        data = {"x": x, "y": np.sin(x)[::-1], "small": np.arange(3)}
+        with RenderClient(address) as client:
+            shared = client.render(spec, data=data)
+        with RenderClient(address, shared_memory=False) as client:
+            pickled = client.render(spec, data=data)
+            client.shutdown_server()
+        assert shared.ok, shared.error
+        assert shared.data["png"] == pickled.data["png"]
+        # only the names of the segments of the large arrays went through the server
+        assert not isinstance(relayed[0]["x"], np.ndarray)
+        assert not isinstance(relayed[0]["y"], np.ndarray)
+        assert isinstance(relayed[0]["small"], np.ndarray)
+        assert isinstance(relayed[1]["x"], np.ndarray)
+        # and the client removed the segments
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(relayed[0]["x"].name)
+        thread.join(timeout=30)
+    finally:
+        server.shutdown()
+
+
+def test_render_server_authkey(tmp_path):
+    address = str(tmp_path / "myfigure.sock")
+    server = RenderServer(address, authkey=b"secret", n_workers=1)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        assert os.stat(address).st_mode & 0o777 == 0o600
+        # a client that never authenticates does not block the others
+        idle = socket.socket(socket.AF_UNIX)
+        idle.connect(address)
+        with pytest.raises(AuthenticationError):
+            RenderClient(address, authkey=b"wrong")
+        with RenderClient(address, authkey=b"secret") as client:
+            assert client.ping() < 1
+            client.shutdown_server()
+        idle.close()
+        thread.join(timeout=30)
+        assert not thread.is_alive()
+    finally:
+        server.shutdown()
+
+
+def test_default_address_is_private(tmp_path, monkeypatch):
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    address = default_address()
+    directory = os.path.dirname(address)
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    os.chmod(directory, 0o755)
+    with pytest.raises(PermissionError):
+        default_address()